@@ -68,6 +68,26 @@ class ActorUpdateAction(Action, defs.Serializable):
             return ActorUpdateAction(**data)
 
 
+@dataclass
+class CompactInventoryUpdateAction(Action, defs.Serializable):
+    """Same as `InventoryUpdateAction`, but the entries reference prototypes, which have to be sent
+    earlier with `PrototypeDefinitionAction`."""
+
+    SERIALIZATION_NAME = "compact_inventory_update"
+
+    owner_id: defs.ActorId
+    inventory: inventory.Inventory
+
+    class Schema(marshmallow.Schema):
+        owner_id = mf.Integer()
+        # Dumps share the cached payload of the inventory, they must not be modified in place.
+        inventory = inventory.CachedNested(inventory.Inventory.CompactSchema)
+
+        @marshmallow.post_load
+        def make(self, data, **kwargs) -> Action:
+            return CompactInventoryUpdateAction(**data)
+
+
 @dataclass
 class ConfigurationAction(Action, defs.Serializable):
     SERIALIZATION_NAME = "configuration"
@@ -237,7 +257,8 @@ class InventoryUpdateAction(Action, defs.Serializable):
 
     class Schema(marshmallow.Schema):
         owner_id = mf.Integer()
-        inventory = mf.Nested(inventory.Inventory.Schema)
+        # Dumps share the cached payload of the inventory, they must not be modified in place.
+        inventory = inventory.CachedNested(inventory.Inventory.Schema)
 
         @marshmallow.post_load
         def make(self, data, **kwargs) -> Action:
@@ -310,6 +331,31 @@ class PickEndAction(Action, defs.Serializable):
             return PickEndAction(**data)
 
 
+@dataclass
+class PrototypeDefinitionAction(Action, defs.Serializable):
+    """Defines prototypes of entities referenced by `CompactInventoryUpdateAction`s."""
+
+    SERIALIZATION_NAME = "prototype_definition"
+
+    prototypes: List[inventory.Prototype]
+
+    class Schema(marshmallow.Schema):
+        prototypes = mf.List(mf.Nested(inventory.Prototype.Schema))
+
+        @marshmallow.post_load
+        def make(self, data, **kwargs) -> Action:
+            return PrototypeDefinitionAction(**data)
+
+    def register(self, table: Optional[inventory.PrototypeTable] = None) -> None:
+        """Defines the prototypes in the given table (`inventory.PROTOTYPES` by default). Has to be
+        called when handling the action, before the compact updates referencing them are
+        deserialised."""
+
+        table = table if table is not None else inventory.PROTOTYPES
+        for prototype in self.prototypes:
+            table.define(prototype)
+
+
 @dataclass
 class StatUpdateAction(Action, defs.Serializable):
     SERIALIZATION_NAME = "stat_update"
@@ -332,6 +378,7 @@ _ACTIONS = cast(
         ActorCreationAction,
         ActorDeletionAction,
         ActorUpdateAction,
+        CompactInventoryUpdateAction,
         ConfigurationAction,
         CraftBeginAction,
         CraftEndAction,
@@ -346,6 +393,7 @@ _ACTIONS = cast(
         MotionAction,
         PickBeginAction,
         PickEndAction,
+        PrototypeDefinitionAction,
         StatUpdateAction,
     ),
 )
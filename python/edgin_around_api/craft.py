@@ -6,11 +6,15 @@ import marshmallow
 from marshmallow import fields as mf
 from marshmallow_enum import EnumField
 
-from typing import Dict, Iterable, List, Optional, Set
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 from . import defs
 
 
+if TYPE_CHECKING:
+    from . import inventory, store
+
+
 @unique
 class Essence(Enum):
     """Represents a general category of an item/entity."""
@@ -52,6 +56,11 @@ class Essence(Enum):
     def get_image_name(self) -> str:
         return self.value
 
+    def get_bit(self) -> int:
+        """Returns the bit representing this essence in essence masks."""
+
+        return _ESSENCE_BITS[self]
+
 
 _ESSENCE_DESCRIPTIONS: Dict[Essence, str] = {
     Essence.ROCKS: "Rocks",
@@ -92,6 +101,11 @@ class Material(Enum):
         else:
             return "[Unknown]"
 
+    def get_mask(self) -> int:
+        """Returns the mask of all the essences matching this material."""
+
+        return _MATERIAL_MASKS[self]
+
 
 _MATERIAL_DESCRIPTIONS: Dict[Material, str] = {
     Material.FABRIC: "Fabric",
@@ -128,6 +142,22 @@ _MATCHES = {
     Match(Material.WOOD, Essence.LOGS),
 }
 
+# `_MATCHES` compiled into bit masks once at import: every essence gets its own bit and every
+# material a mask of the essences matching it.
+_ESSENCE_BITS: Dict[Essence, int] = {essence: 1 << i for i, essence in enumerate(Essence)}
+_MATERIAL_MASKS: Dict[Material, int] = {material: 0 for material in Material}
+for _match in _MATCHES:
+    _MATERIAL_MASKS[_match.material] |= _ESSENCE_BITS[_match.essence]
+
+
+def essence_mask(essences: Iterable[Essence]) -> int:
+    """Returns the mask of the given essences."""
+
+    mask = 0
+    for essence in essences:
+        mask |= _ESSENCE_BITS[essence]
+    return mask
+
 
 class Item:
     """Represents an item that can be used as an ingredient in a recipe."""
@@ -180,17 +210,19 @@ class Ingredient:
     def match_essence(self, essence: Essence) -> bool:
         """Checks if an item with the given essence can be used as this recipe ingredient."""
 
-        return Match(self.material, essence) in _MATCHES
+        return _MATERIAL_MASKS[self.material] & _ESSENCE_BITS[essence] != 0
+
+    def match_mask(self, mask: int) -> bool:
+        """Checks if any of the essences in the given mask can be used as this recipe ingredient."""
+
+        return _MATERIAL_MASKS[self.material] & mask != 0
 
     def filter_items(self, items: Iterable[Item]) -> Set[Item]:
         """Filters the passed iterable leaving only such items that can be used as this recipe
         ingredient."""
 
-        result: Set[Item] = set()
-        for item in items:
-            if self.match_essence(item.essence):
-                result.add(item)
-        return result
+        mask = _MATERIAL_MASKS[self.material]
+        return {item for item in items if mask & _ESSENCE_BITS[item.essence]}
 
     def __repr__(self) -> str:
         optional = "optional" if self.optional else "required"
@@ -279,6 +311,178 @@ class Assembly:
         )
 
 
+class IndexedAssembly:
+    """
+    Alternative representation of `Assembly` with items indexed by actor ID and running totals of
+    quantities per ingredient. Looking up and updating items and checking completeness take
+    constant time.
+
+    Serialises to the same format as `Assembly`. Completeness can be checked only if the recipe is
+    known, i.e. when created with `from_recipe` or after calling `bind`.
+    """
+
+    class Schema(Assembly.Schema):
+        @marshmallow.post_load
+        def make(self, data, **kwargs):
+            return IndexedAssembly(**data)
+
+    def __init__(self, recipe_codename: str, sources: List[List[Item]]) -> None:
+        self.recipe_codename = recipe_codename
+        self._slots: List[Dict[defs.ActorId, Item]] = [dict() for _ in sources]
+        self._index: Dict[defs.ActorId, Dict[int, Item]] = dict()
+        self._used: Dict[defs.ActorId, int] = dict()
+        self._totals: List[int] = [0 for _ in sources]
+        self._mismatched: List[int] = [0 for _ in sources]
+        self._ingredients: Optional[List[Ingredient]] = None
+        self._satisfied = 0
+
+        for index, items in enumerate(sources):
+            for item in items:
+                self.update_item(index, item, item.quantity)
+
+    @staticmethod
+    def from_assembly(assembly: Assembly, recipe: Optional["Recipe"] = None) -> "IndexedAssembly":
+        result = IndexedAssembly(assembly.recipe_codename, assembly.sources)
+        if recipe is not None:
+            result.bind(recipe)
+        return result
+
+    @staticmethod
+    def from_recipe(recipe: "Recipe") -> "IndexedAssembly":
+        """Returns an empty assembly bound to the given recipe."""
+
+        result = IndexedAssembly(recipe.get_codename(), [list() for _ in recipe.get_ingredients()])
+        result.bind(recipe)
+        return result
+
+    def to_assembly(self) -> Assembly:
+        return Assembly(self.recipe_codename, self.sources)
+
+    @property
+    def sources(self) -> List[List[Item]]:
+        """Copies of the items per ingredient, as in `Assembly.sources`."""
+
+        return [
+            [Item(item.actor_id, item.essence, item.quantity) for item in slot.values()]
+            for slot in self._slots
+        ]
+
+    def bind(self, recipe: "Recipe") -> None:
+        """Sets the recipe used for checking completeness."""
+
+        ingredients = recipe.get_ingredients()
+        self._ingredients = ingredients
+        for index, slot in enumerate(self._slots):
+            if index < len(ingredients):
+                ingredient = ingredients[index]
+                self._mismatched[index] = sum(
+                    not ingredient.match_essence(item.essence) for item in slot.values()
+                )
+        self._satisfied = sum(self._is_satisfied(index) for index in range(len(self._slots)))
+
+    def is_complete(self) -> bool:
+        """Same as `Recipe.validate_assembly` for the bound recipe."""
+
+        return (
+            self._ingredients is not None
+            and len(self._ingredients) == len(self._slots)
+            and self._satisfied == len(self._slots)
+        )
+
+    def get_total(self, index: int) -> int:
+        """Returns the total quantity of items used for the given ingredient."""
+
+        return self._totals[index]
+
+    def get_used_quantity(self, actor_id: defs.ActorId) -> int:
+        """Returns the quantity of the entity used for all the ingredients."""
+
+        return self._used.get(actor_id, 0)
+
+    def find_item(self, actor_id: defs.ActorId, index: Optional[int]) -> Optional[Item]:
+        """Same as `Assembly.find_item`."""
+
+        entries = self._index.get(actor_id, None)
+        if entries is None:
+            return None
+        elif index is None:
+            return next(iter(entries.values()))
+        else:
+            return entries.get(index, None)
+
+    def update_item(self, index: int, template: Item, change: int) -> bool:
+        """Same as `Assembly.update_item`, but items not matching the ingredient are rejected if the
+        recipe is bound."""
+
+        if index < 0 or len(self._slots) <= index:
+            return False
+
+        slot = self._slots[index]
+        item = slot.get(template.actor_id, None)
+        if item is not None:
+            if item.quantity + change < 0:
+                return False
+        elif 0 < change:
+            ingredients = self._ingredients
+            if ingredients is not None and not ingredients[index].match_essence(template.essence):
+                return False
+            item = Item(template.actor_id, template.essence, 0)
+            slot[template.actor_id] = item
+            self._index.setdefault(template.actor_id, dict())[index] = item
+        else:
+            return False
+
+        satisfied = self._is_satisfied(index)
+        item.quantity += change
+        self._totals[index] += change
+        self._used[item.actor_id] = self._used.get(item.actor_id, 0) + change
+
+        if item.quantity == 0:
+            del slot[item.actor_id]
+            entries = self._index[item.actor_id]
+            del entries[index]
+            if len(entries) == 0:
+                del self._index[item.actor_id]
+                del self._used[item.actor_id]
+            ingredients = self._ingredients
+            if ingredients is not None and index < len(ingredients):
+                self._mismatched[index] -= not ingredients[index].match_essence(item.essence)
+
+        self._satisfied += self._is_satisfied(index) - satisfied
+        return True
+
+    def filter_items(self, items: Iterable[Item]) -> Set[Item]:
+        """Same as `Assembly.filter_items`, but returns new items instead of modifying the passed
+        ones."""
+
+        result: Set[Item] = set()
+        for item in items:
+            quantity = item.quantity - self._used.get(item.actor_id, 0)
+            if quantity > 0:
+                result.add(Item(item.actor_id, item.essence, quantity))
+        return result
+
+    def _is_satisfied(self, index: int) -> bool:
+        if self._ingredients is None or len(self._ingredients) <= index:
+            return False
+
+        # Items not matching the ingredient are rejected by `update_item` once the recipe is bound,
+        # but may have been added before.
+        return (
+            self._mismatched[index] == 0 and self._totals[index] == self._ingredients[index].value
+        )
+
+    def __repr__(self) -> str:
+        return f"IndexedAssembly({self.recipe_codename}, {self.sources})"
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, IndexedAssembly)
+            and self.recipe_codename == other.recipe_codename
+            and self._slots == other._slots
+        )
+
+
 class Recipe:
     """Represents a recipe to craft items in the game."""
 
@@ -287,6 +491,34 @@ class Recipe:
         self._description = description
         self._ingredients = ingredients
 
+        # For every essence indices of the ingredients it matches.
+        self._slots: Dict[Essence, List[int]] = {
+            essence: [i for i, ing in enumerate(ingredients) if ing.match_essence(essence)]
+            for essence in Essence
+        }
+
+        # Total value of the ingredients for every subset of their materials together with the
+        # mask of essences matching any material in the subset. Items can be split between
+        # ingredients, so by Hall's theorem the recipe can be satisfied iff no subset requires more
+        # than the quantity of the matching essences. As in `validate_assembly` optional
+        # ingredients have to be filled too.
+        demands: Dict[Material, int] = dict()
+        for ingredient in ingredients:
+            if ingredient.value > 0:
+                demands[ingredient.material] = (
+                    demands.get(ingredient.material, 0) + ingredient.value
+                )
+        self._materials = set(demands.keys())
+        self._requirements: List[Tuple[int, int]] = list()
+        materials = list(demands.keys())
+        for subset in range(1, 1 << len(materials)):
+            mask, demand = 0, 0
+            for i, material in enumerate(materials):
+                if subset & (1 << i):
+                    mask |= _MATERIAL_MASKS[material]
+                    demand += demands[material]
+            self._requirements.append((mask, demand))
+
     def get_codename(self) -> str:
         return self._codename
 
@@ -296,6 +528,33 @@ class Recipe:
     def get_ingredients(self) -> List[Ingredient]:
         return list(self._ingredients)
 
+    def get_required_materials(self) -> Set[Material]:
+        return set(self._materials)
+
+    def is_satisfiable(self, histogram: Dict[Essence, int]) -> bool:
+        """Checks if items with the given total quantities per essence are enough to fill all the
+        ingredients."""
+
+        for mask, demand in self._requirements:
+            supply = 0
+            for essence, quantity in histogram.items():
+                if mask & _ESSENCE_BITS[essence]:
+                    supply += quantity
+            if supply < demand:
+                return False
+        return True
+
+    def filter_items(self, items: Iterable[Item]) -> List[Set[Item]]:
+        """Filters the passed items for all the ingredients at once. Returns a set of matching
+        items for every ingredient."""
+
+        result: List[Set[Item]] = [set() for _ in self._ingredients]
+        slots = self._slots
+        for item in items:
+            for index in slots[item.essence]:
+                result[index].add(item)
+        return result
+
     def make_assembly(self) -> Assembly:
         """Returns and empty `Assembly` corresponding to this recipe."""
 
@@ -304,12 +563,13 @@ class Recipe:
     def validate_assembly(self, assembly: Assembly) -> bool:
         """Checks if the passed `Assembly` satisfies the recipes requirements."""
 
-        if len(self.get_ingredients()) != len(assembly.sources):
+        if len(self._ingredients) != len(assembly.sources):
             return False
 
-        for ingredient, sources in zip(self.get_ingredients(), assembly.sources):
+        for ingredient, sources in zip(self._ingredients, assembly.sources):
+            mask = _MATERIAL_MASKS[ingredient.material]
             for source in sources:
-                if not ingredient.match_essence(source.essence):
+                if not mask & _ESSENCE_BITS[source.essence]:
                     return False
 
             total_quantity = sum(source.quantity for source in sources)
@@ -317,3 +577,431 @@ class Recipe:
                 return False
 
         return True
+
+
+class _EssenceFlow:
+    """
+    Flow of item quantities from essences to the materials they match. Every essence supplies up to
+    its total quantity, every material demands a given quantity and matches have unbounded capacity.
+    """
+
+    def __init__(self, supply: Dict[Essence, int]) -> None:
+        self.supply = supply
+        self.demand: Dict[Material, int] = dict()
+        self.flow: Dict[Essence, Dict[Material, int]] = {essence: dict() for essence in supply}
+        self.used: Dict[Essence, int] = {essence: 0 for essence in supply}
+        self.delivered: Dict[Material, int] = dict()
+
+    def add_demand(self, material: Material, value: int) -> None:
+        self.demand[material] = self.demand.get(material, 0) + value
+        self.delivered.setdefault(material, 0)
+
+    def saturate(self) -> bool:
+        """Augments the flow until it is maximal. Returns `True` if all the demands are met."""
+
+        while self._augment():
+            pass
+        return all(self.delivered[material] == demand for material, demand in self.demand.items())
+
+    def _augment(self) -> bool:
+        # Breadth-first search for a path alternating between essences and materials. Forward
+        # edges (essence to matching material) are unbounded, backward edges (material to essence)
+        # are bounded by the current flow.
+        parents: Dict[Essence, Optional[Material]] = dict()
+        reached: Dict[Material, Essence] = dict()
+        queue: List[Essence] = list()
+        for essence, quantity in self.supply.items():
+            if self.used[essence] < quantity:
+                parents[essence] = None
+                queue.append(essence)
+
+        end: Optional[Material] = None
+        for essence in queue:
+            mask = _ESSENCE_BITS[essence]
+            for material in self.demand:
+                if material in reached or not _MATERIAL_MASKS[material] & mask:
+                    continue
+
+                reached[material] = essence
+                if self.delivered[material] < self.demand[material]:
+                    end = material
+                    break
+
+                for other, targets in self.flow.items():
+                    if other not in parents and targets.get(material, 0) > 0:
+                        parents[other] = material
+                        queue.append(other)
+
+            if end is not None:
+                break
+
+        if end is None:
+            return False
+
+        # Find the bottleneck and push the flow along the path.
+        path: List[Tuple[Essence, Material]] = list()
+        amount = self.demand[end] - self.delivered[end]
+        material = end
+        while True:
+            essence = reached[material]
+            path.append((essence, material))
+            previous = parents[essence]
+            if previous is None:
+                amount = min(amount, self.supply[essence] - self.used[essence])
+                break
+            amount = min(amount, self.flow[essence][previous])
+            material = previous
+
+        for essence, material in path:
+            self.flow[essence][material] = self.flow[essence].get(material, 0) + amount
+            previous = parents[essence]
+            if previous is not None:
+                self.flow[essence][previous] -= amount
+        self.used[path[-1][0]] += amount
+        self.delivered[end] += amount
+        return True
+
+
+def solve_assembly(recipe: Recipe, items: Iterable[Item]) -> Optional[Assembly]:
+    """
+    Returns an `Assembly` of the recipe filled with the given items or `None` if no valid assembly
+    exists. As in `Recipe.validate_assembly` all the ingredients, including optional ones, are
+    filled with exactly their value.
+
+    Quantities are allocated by a maximum flow from essences to materials, which is then split
+    between the ingredients and the items. Items may be split between ingredients.
+    """
+
+    items = [item for item in items if item.quantity > 0]
+    histogram = essence_histogram(items)
+    if not recipe.is_satisfiable(histogram):
+        return None
+
+    ingredients = recipe.get_ingredients()
+    flow = _EssenceFlow(histogram)
+    for ingredient in ingredients:
+        if ingredient.value > 0:
+            flow.add_demand(ingredient.material, ingredient.value)
+    if not flow.saturate():
+        return None
+
+    # Quantities of essences flowing to every material and quantities left in every item.
+    allotments: Dict[Material, List[Tuple[Essence, int]]] = dict()
+    for essence, targets in flow.flow.items():
+        for material, amount in targets.items():
+            if amount > 0:
+                allotments.setdefault(material, list()).append((essence, amount))
+    pools: Dict[Essence, List[Tuple[Item, int]]] = dict()
+    for item in items:
+        pools.setdefault(item.essence, list()).append((item, item.quantity))
+
+    assembly = recipe.make_assembly()
+    for ingredient, sources in zip(ingredients, assembly.sources):
+        if ingredient.value <= 0:
+            continue
+
+        needed = ingredient.value
+        allotment = allotments[ingredient.material]
+        while needed > 0:
+            essence, amount = allotment.pop()
+            take = min(amount, needed)
+            needed -= take
+            if take < amount:
+                allotment.append((essence, amount - take))
+
+            pool = pools[essence]
+            while take > 0:
+                item, left = pool.pop()
+                part = min(left, take)
+                take -= part
+                sources.append(Item(item.actor_id, essence, part))
+                if part < left:
+                    pool.append((item, left - part))
+
+    return assembly
+
+
+class RecipeBook:
+    """
+    Collection of recipes indexed by the materials of their required ingredients.
+
+    Craftability queries look only at recipes whose required materials are all present in the
+    inventory, so their cost depends on the number of relevant recipes and not on all of them.
+    """
+
+    def __init__(self, recipes: Iterable[Recipe] = ()) -> None:
+        self._recipes: Dict[str, Recipe] = dict()
+        self._by_material: Dict[Material, List[Recipe]] = {
+            material: list() for material in Material
+        }
+        self._unconditional: List[Recipe] = list()
+        self._material_counts: Dict[str, int] = dict()
+        for recipe in recipes:
+            self.add(recipe)
+
+    def add(self, recipe: Recipe) -> None:
+        """Adds a recipe replacing the one with the same codename if present."""
+
+        if recipe.get_codename() in self._recipes:
+            self.remove(recipe.get_codename())
+
+        self._recipes[recipe.get_codename()] = recipe
+        materials = recipe.get_required_materials()
+        self._material_counts[recipe.get_codename()] = len(materials)
+        for material in materials:
+            self._by_material[material].append(recipe)
+        if len(materials) == 0:
+            self._unconditional.append(recipe)
+
+    def remove(self, codename: str) -> None:
+        recipe = self._recipes.pop(codename, None)
+        if recipe is None:
+            return
+
+        del self._material_counts[codename]
+        for material in recipe.get_required_materials():
+            self._by_material[material].remove(recipe)
+        if recipe in self._unconditional:
+            self._unconditional.remove(recipe)
+
+    def get_recipe(self, codename: str) -> Optional[Recipe]:
+        return self._recipes.get(codename, None)
+
+    def get_recipes(self) -> List[Recipe]:
+        return list(self._recipes.values())
+
+    def get_recipes_using(self, material: Material) -> List[Recipe]:
+        """Returns recipes requiring the given material."""
+
+        return list(self._by_material[material])
+
+    def find_craftable(self, source: "ItemSource") -> List[Recipe]:
+        """
+        Returns all the recipes that can be satisfied with items from the given inventory, item
+        collection or essence histogram (see `essence_histogram`).
+        """
+
+        histogram = _to_histogram(source)
+        available = 0
+        for essence, quantity in histogram.items():
+            if quantity > 0:
+                available |= _ESSENCE_BITS[essence]
+
+        # Count for every recipe how many of its required materials are available.
+        counts: Dict[str, int] = dict()
+        candidates: List[Recipe] = list(self._unconditional)
+        for material, recipes in self._by_material.items():
+            if _MATERIAL_MASKS[material] & available:
+                for recipe in recipes:
+                    codename = recipe.get_codename()
+                    count = counts.get(codename, 0) + 1
+                    counts[codename] = count
+                    if count == self._material_counts[codename]:
+                        candidates.append(recipe)
+
+        return [recipe for recipe in candidates if recipe.is_satisfiable(histogram)]
+
+
+ItemSource = Union[Iterable[Item], "inventory.Inventory", "store.InventoryView", Dict[Essence, int]]
+
+
+def essence_histogram(items: Iterable[Item]) -> Dict[Essence, int]:
+    """Returns the total quantity of the given items per essence."""
+
+    result: Dict[Essence, int] = dict()
+    for item in items:
+        result[item.essence] = result.get(item.essence, 0) + item.quantity
+    return result
+
+
+def _to_histogram(source: ItemSource) -> Dict[Essence, int]:
+    if isinstance(source, dict):
+        return source
+    elif hasattr(source, "get_essence_histogram"):
+        return source.get_essence_histogram()
+    elif hasattr(source, "to_items"):
+        return essence_histogram(source.to_items())
+    else:
+        return essence_histogram(source)
+
+
+class RecipeCycleError(Exception):
+    """Raised when recipes depend on their own products."""
+
+
+class RecipeGraph:
+    """
+    Dependencies between recipes producing items and recipes using them as ingredients.
+
+    An essence is raw if no recipe produces it. Materials matched by a raw essence are gathered, the
+    other ones are crafted with the recipe requiring the least raw materials in total. Raw totals
+    of every recipe are computed once and memoized until a recipe is added.
+    """
+
+    def __init__(self) -> None:
+        self._recipes: Dict[str, Recipe] = dict()
+        self._products: Dict[str, Tuple[Essence, int]] = dict()
+        self._producers: Dict[Essence, List[str]] = dict()
+        self._totals: Dict[str, Dict[Material, int]] = dict()
+
+    def add(self, recipe: Recipe, product: Essence, quantity: int = 1) -> None:
+        """
+        Adds a recipe producing `quantity` of items of the given essence, replacing the one with
+        the same codename if present. Raises `RecipeCycleError` if crafting the product would
+        require the product itself and `ValueError` if the quantity is not positive. The graph is
+        left unchanged if the recipe is rejected.
+        """
+
+        if quantity <= 0:
+            raise ValueError(f"Recipe '{recipe.get_codename()}' has to produce at least one item")
+
+        # The graph is restored from these copies if the new recipe is rejected. Adding recomputes
+        # the totals of all the recipes anyway, so copying does not change the complexity.
+        recipes = dict(self._recipes)
+        products = dict(self._products)
+        producers = {essence: list(codenames) for essence, codenames in self._producers.items()}
+        totals = dict(self._totals)
+
+        codename = recipe.get_codename()
+        if codename in self._recipes:
+            self._remove(codename)
+
+        self._recipes[codename] = recipe
+        self._products[codename] = (product, quantity)
+        self._producers.setdefault(product, list()).append(codename)
+        self._totals.clear()
+
+        try:
+            for other in self._recipes:
+                self.get_raw_totals(other)
+        except Exception:
+            self._recipes, self._products, self._producers = recipes, products, producers
+            self._totals = totals
+            raise
+
+    def get_recipe(self, codename: str) -> Optional[Recipe]:
+        return self._recipes.get(codename, None)
+
+    def get_product(self, codename: str) -> Optional[Tuple[Essence, int]]:
+        """Returns the essence and quantity produced by the recipe."""
+
+        return self._products.get(codename, None)
+
+    def is_raw(self, material: Material) -> bool:
+        """Checks if the material is matched by any raw essence."""
+
+        mask = _MATERIAL_MASKS[material]
+        return any(
+            mask & bit and essence not in self._producers for essence, bit in _ESSENCE_BITS.items()
+        )
+
+    def get_raw_totals(self, codename: str) -> Dict[Material, int]:
+        """Returns the quantities of raw materials needed to craft the recipe once, including all
+        the intermediate products."""
+
+        return dict(self._get_totals(codename, set()))
+
+    def how_many(self, codename: str, source: ItemSource) -> int:
+        """
+        Returns how many times the recipe can be crafted from the given inventory, item collection
+        or essence histogram. Held items matching an ingredient are used first, including the
+        intermediate products, and only the missing quantities are crafted. Items are assigned to
+        the ingredients greedily, in the order of the ingredients.
+        """
+
+        if not any(self._get_totals(codename, set()).values()):
+            return 0
+
+        histogram = {essence: q for essence, q in _to_histogram(source).items() if q > 0}
+
+        # Consumption grows with the number of crafts, so doubling eventually finds a count that
+        # can not be crafted. The exact count is then bisected below it.
+        low, high = 0, 1
+        while self._consume(codename, high, dict(histogram)):
+            low, high = high, 2 * high
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self._consume(codename, middle, dict(histogram)):
+                low = middle
+            else:
+                high = middle
+        return low
+
+    def _consume(self, codename: str, crafts: int, available: Dict[Essence, int]) -> bool:
+        """Removes the items needed to craft the recipe `crafts` times from `available`. Returns
+        `False` if there are not enough of them."""
+
+        for ingredient in self._recipes[codename].get_ingredients():
+            material = ingredient.material
+            mask = _MATERIAL_MASKS[material]
+            needed = ingredient.value * crafts
+            for essence, quantity in available.items():
+                if needed == 0:
+                    break
+                if mask & _ESSENCE_BITS[essence]:
+                    taken = min(quantity, needed)
+                    available[essence] = quantity - taken
+                    needed -= taken
+
+            if needed == 0:
+                continue
+            if self.is_raw(material):
+                return False
+            cheapest = self._get_cheapest(material, needed, set())
+            if cheapest is None or not self._consume(cheapest[0], cheapest[1], available):
+                return False
+        return True
+
+    def _get_cheapest(
+        self, material: Material, value: int, visiting: Set[str]
+    ) -> Optional[Tuple[str, int, Dict[Material, int]]]:
+        """Returns the recipe producing `value` items of the material with the least raw materials,
+        how many times it has to be crafted and the raw totals, or `None` if nothing produces it."""
+
+        cheapest: Optional[Tuple[str, int, Dict[Material, int]]] = None
+        for essence in self._producers:
+            if not _MATERIAL_MASKS[material] & _ESSENCE_BITS[essence]:
+                continue
+            for producer in self._producers[essence]:
+                product_totals = self._get_totals(producer, visiting)
+                crafts = -(-value // self._products[producer][1])
+                candidate = {m: q * crafts for m, q in product_totals.items()}
+                if cheapest is None or sum(candidate.values()) < sum(cheapest[2].values()):
+                    cheapest = (producer, crafts, candidate)
+        return cheapest
+
+    def _get_totals(self, codename: str, visiting: Set[str]) -> Dict[Material, int]:
+        totals = self._totals.get(codename, None)
+        if totals is not None:
+            return totals
+
+        if codename in visiting:
+            raise RecipeCycleError(f"Recipe '{codename}' depends on its own product")
+        visiting.add(codename)
+
+        totals = dict()
+        for ingredient in self._recipes[codename].get_ingredients():
+            material = ingredient.material
+            if self.is_raw(material):
+                totals[material] = totals.get(material, 0) + ingredient.value
+                continue
+
+            cheapest = self._get_cheapest(material, ingredient.value, visiting)
+            if cheapest is None:
+                # Nothing matches the material, so it can only be counted as a raw one.
+                raw = {material: ingredient.value}
+            else:
+                raw = cheapest[2]
+            for m, q in raw.items():
+                totals[m] = totals.get(m, 0) + q
+
+        visiting.remove(codename)
+        self._totals[codename] = totals
+        return totals
+
+    def _remove(self, codename: str) -> None:
+        del self._recipes[codename]
+        product, _ = self._products.pop(codename)
+        self._producers[product].remove(codename)
+        if len(self._producers[product]) == 0:
+            del self._producers[product]
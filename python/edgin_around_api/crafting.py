@@ -0,0 +1,261 @@
+# This file provides server-side validation of crafting requests.
+
+from collections import OrderedDict
+from enum import unique, auto, Enum
+
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from . import craft, defs, inventory
+
+
+@unique
+class Verdict(Enum):
+    """Result of validating a single crafting request."""
+
+    VALID = auto()
+    RECIPE_MISMATCH = auto()
+    INGREDIENT_COUNT = auto()
+    ESSENCE_MISMATCH = auto()
+    WRONG_QUANTITY = auto()
+    MISSING_ITEM = auto()
+    FORGED_ESSENCE = auto()
+    INSUFFICIENT_QUANTITY = auto()
+
+    def is_valid(self) -> bool:
+        return self == Verdict.VALID
+
+
+CraftRequest = Tuple[craft.Recipe, craft.Assembly, inventory.Inventory]
+
+
+def validate_crafts(requests: Iterable[CraftRequest]) -> List[Verdict]:
+    """
+    Validates many crafting requests, e.g. all the `CraftMove`s received in one tick, at once.
+
+    For every request checks that the assembly satisfies the recipe and that the owner holds the
+    referenced entities with the claimed essences. Quantities used by valid requests are reserved,
+    so requests of the same owner in one batch can not use the same items twice. Returns a verdict
+    for every request, in order.
+    """
+
+    # Keeping the requests alive guarantees that the IDs of the inventories stay unique.
+    requests = list(requests)
+
+    # Quantities still available in every inventory of the batch, filled lazily.
+    available: Dict[int, Dict[defs.ActorId, int]] = dict()
+
+    result: List[Verdict] = list()
+    for recipe, assembly, owner in requests:
+        reserved = available.setdefault(id(owner), dict())
+        verdict, usage = _validate(recipe, assembly, owner, reserved)
+        if verdict == Verdict.VALID:
+            reserved.update(usage)
+        result.append(verdict)
+    return result
+
+
+def _validate(
+    recipe: craft.Recipe,
+    assembly: craft.Assembly,
+    owner: inventory.Inventory,
+    available: Dict[defs.ActorId, int],
+) -> Tuple[Verdict, Dict[defs.ActorId, int]]:
+    """Returns the verdict and, for a valid request, the quantities left after it."""
+
+    if assembly.recipe_codename != recipe.get_codename():
+        return Verdict.RECIPE_MISMATCH, dict()
+
+    ingredients = recipe.get_ingredients()
+    if len(ingredients) != len(assembly.sources):
+        return Verdict.INGREDIENT_COUNT, dict()
+
+    usage: Dict[defs.ActorId, int] = dict()
+    for ingredient, sources in zip(ingredients, assembly.sources):
+        mask = ingredient.material.get_mask()
+        total = 0
+        for source in sources:
+            if not mask & source.essence.get_bit():
+                return Verdict.ESSENCE_MISMATCH, dict()
+
+            entry = owner.find_entity_with_entity_id(source.actor_id)
+            if entry is None:
+                return Verdict.MISSING_ITEM, dict()
+            if entry.essence != source.essence:
+                return Verdict.FORGED_ESSENCE, dict()
+
+            if source.quantity <= 0:
+                return Verdict.WRONG_QUANTITY, dict()
+            left = usage.get(
+                source.actor_id, available.get(source.actor_id, entry.current_quantity)
+            )
+            if left < source.quantity:
+                return Verdict.INSUFFICIENT_QUANTITY, dict()
+            usage[source.actor_id] = left - source.quantity
+            total += source.quantity
+
+        if total != ingredient.value:
+            return Verdict.WRONG_QUANTITY, dict()
+
+    return Verdict.VALID, usage
+
+
+class CraftableCache:
+    """
+    Memoizes craftability of recipes from a `RecipeBook` and assemblies suggested by
+    `craft.solve_assembly` for inventories.
+
+    Results are keyed by `Inventory.get_fingerprint`, so they become stale as soon as the content
+    of the inventory changes and are shared between inventories with the same content. Up to `size`
+    results of each kind are kept, the least recently used ones are evicted. The cache has to be
+    cleared after changing the recipe book.
+    """
+
+    def __init__(self, book: craft.RecipeBook, size: int = 1024) -> None:
+        self.book = book
+        self.size = size
+        self._craftable: "OrderedDict[int, List[craft.Recipe]]" = OrderedDict()
+        self._assemblies: "OrderedDict[Tuple[int, str], Optional[craft.Assembly]]" = OrderedDict()
+
+    def find_craftable(self, owner: inventory.Inventory) -> List[craft.Recipe]:
+        """Same as `RecipeBook.find_craftable`."""
+
+        key = owner.get_fingerprint()
+        recipes = self._craftable.get(key, None)
+        if recipes is None:
+            recipes = self.book.find_craftable(owner)
+            self._craftable[key] = recipes
+            if len(self._craftable) > self.size:
+                self._craftable.popitem(last=False)
+        else:
+            self._craftable.move_to_end(key)
+        return list(recipes)
+
+    def suggest_assembly(
+        self, owner: inventory.Inventory, recipe: craft.Recipe
+    ) -> Optional[craft.Assembly]:
+        """Same as `craft.solve_assembly` for the items of the inventory."""
+
+        key = (owner.get_fingerprint(), recipe.get_codename())
+        if key in self._assemblies:
+            self._assemblies.move_to_end(key)
+            assembly = self._assemblies[key]
+        else:
+            assembly = craft.solve_assembly(recipe, owner.to_items())
+            self._assemblies[key] = assembly
+            if len(self._assemblies) > self.size:
+                self._assemblies.popitem(last=False)
+
+        if assembly is None:
+            return None
+
+        # The assembly may be modified by the caller.
+        return craft.Assembly(
+            assembly.recipe_codename,
+            [
+                [craft.Item(item.actor_id, item.essence, item.quantity) for item in sources]
+                for sources in assembly.sources
+            ],
+        )
+
+    def clear(self) -> None:
+        self._craftable.clear()
+        self._assemblies.clear()
+
+
+class AssemblyCandidates:
+    """
+    Tracks, while an assembly is being filled, which items of the owner can still be added to
+    every ingredient and in what quantity.
+
+    Updates of the assembly and changes of the inventory are applied incrementally, with the cost
+    proportional to the number of the changed items (times the number of ingredients), not to the
+    size of the inventory. Changes of the inventory are received through a listener registered in
+    the constructor, which has to be removed with `detach` when the candidates are no longer needed.
+    """
+
+    def __init__(
+        self,
+        recipe: craft.Recipe,
+        owner: inventory.Inventory,
+        assembly: Optional[craft.IndexedAssembly] = None,
+    ) -> None:
+        self.recipe = recipe
+        self.owner = owner
+        self.assembly = (
+            assembly if assembly is not None else craft.IndexedAssembly.from_recipe(recipe)
+        )
+        self.assembly.bind(recipe)
+        self._ingredients = recipe.get_ingredients()
+        self._held: Dict[defs.ActorId, Tuple[craft.Essence, int]] = dict()
+        self._remaining: List[Dict[defs.ActorId, int]] = [dict() for _ in self._ingredients]
+
+        for item in owner.to_items():
+            self._held[item.actor_id] = (item.essence, item.quantity)
+            self._refresh(item.actor_id)
+        owner.add_listener(self._on_slot_change)
+
+    def detach(self) -> None:
+        """Stops following the changes of the owner's inventory."""
+
+        self.owner.remove_listener(self._on_slot_change)
+
+    def get_remaining(self, index: int) -> Mapping[defs.ActorId, int]:
+        """Returns quantities of the items that can still be added to the ingredient."""
+
+        return self._remaining[index]
+
+    def get_items(self, index: int) -> Set[craft.Item]:
+        """Same as `get_remaining`, but in the form of `Item`s."""
+
+        return {
+            craft.Item(actor_id, self._held[actor_id][0], quantity)
+            for actor_id, quantity in self._remaining[index].items()
+        }
+
+    def update_item(self, index: int, template: craft.Item, change: int) -> bool:
+        """
+        Same as `IndexedAssembly.update_item`, but additionally rejects items that are not held by
+        the owner or not in the sufficient quantity.
+        """
+
+        if index < 0 or len(self._remaining) <= index:
+            return False
+
+        if change > 0 and self._remaining[index].get(template.actor_id, 0) < change:
+            return False
+
+        if not self.assembly.update_item(index, template, change):
+            return False
+
+        self._refresh(template.actor_id)
+        return True
+
+    def _on_slot_change(
+        self,
+        slot: inventory.Slot,
+        previous: Optional[inventory.EntityInfo],
+        entry: Optional[inventory.EntityInfo],
+    ) -> None:
+        if previous is not None and (entry is None or previous.id != entry.id):
+            self._update_held(previous.id)
+        if entry is not None:
+            self._update_held(entry.id)
+
+    def _update_held(self, entity_id: defs.ActorId) -> None:
+        # While swapping an entity may be missing from the inventory for a moment, so the
+        # inventory is asked instead of following the entries passed to the listener.
+        entry = self.owner.find_entity_with_entity_id(entity_id)
+        if entry is not None:
+            self._held[entity_id] = (entry.essence, entry.current_quantity)
+        else:
+            self._held.pop(entity_id, None)
+        self._refresh(entity_id)
+
+    def _refresh(self, actor_id: defs.ActorId) -> None:
+        held = self._held.get(actor_id, None)
+        quantity = held[1] - self.assembly.get_used_quantity(actor_id) if held is not None else 0
+        for ingredient, remaining in zip(self._ingredients, self._remaining):
+            if held is not None and quantity > 0 and ingredient.match_essence(held[0]):
+                remaining[actor_id] = quantity
+            else:
+                remaining.pop(actor_id, None)
@@ -1,12 +1,12 @@
 import abc, enum
 from dataclasses import dataclass
-from math import asin, atan2, cos, degrees, pi, radians, sin, sqrt
+from math import asin, atan2, cos, degrees, floor, pi, radians, sin, sqrt
 
 import marshmallow
 from marshmallow import fields as mf
 from marshmallow_oneofschema import OneOfSchema
 
-from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple, cast
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, cast
 
 
 class Coordinates:
@@ -55,6 +55,48 @@ class Coordinates:
     def geographical_degrees_to_spherical(r, lat, lon):
         return Coordinates.geographical_radians_to_spherical(r, radians(lat), radians(lon))
 
+    @staticmethod
+    def cube_to_cartesian(face, u, v):
+        """Converts a position on a face of the cube-sphere (with `u` and `v` in range [-1, 1]) to
+        a unit vector."""
+
+        n, a, b = _CUBE_FACES[face]
+        x = n[0] + a[0] * u + b[0] * v
+        y = n[1] + a[1] * u + b[1] * v
+        z = n[2] + a[2] * u + b[2] * v
+        length = sqrt(x * x + y * y + z * z)
+        return x / length, y / length, z / length
+
+    @staticmethod
+    def cartesian_to_cube(x, y, z):
+        """Converts a vector to a face of the cube-sphere and a position on that face."""
+
+        ax, ay, az = abs(x), abs(y), abs(z)
+        if ax >= ay and ax >= az:
+            face = 0 if x > 0 else 1
+        elif ay >= az:
+            face = 2 if y > 0 else 3
+        else:
+            face = 4 if z > 0 else 5
+
+        n, a, b = _CUBE_FACES[face]
+        dn = x * n[0] + y * n[1] + z * n[2]
+        u = (x * a[0] + y * a[1] + z * a[2]) / dn
+        v = (x * b[0] + y * b[1] + z * b[2]) / dn
+        return face, u, v
+
+
+# Faces of the cube-sphere as triples of the face normal and the two axes spanning the face.
+_CUBE_FACES = (
+    ((1, 0, 0), (0, 0, -1), (0, 1, 0)),
+    ((-1, 0, 0), (0, 0, 1), (0, 1, 0)),
+    ((0, 1, 0), (1, 0, 0), (0, 0, -1)),
+    ((0, -1, 0), (1, 0, 0), (0, 0, 1)),
+    ((0, 0, 1), (1, 0, 0), (0, 1, 0)),
+    ((0, 0, -1), (-1, 0, 0), (0, 1, 0)),
+)
+CUBE_FACE_COUNT = len(_CUBE_FACES)
+
 
 class Coordinate:
     """Position expressed in geographical coordinates with radians."""
@@ -139,17 +181,34 @@ class _Terrains(enum.Enum):
     HILLS = "hills"
     RANGES = "ranges"
     CONTINENTS = "continents"
+    PEAK = "peak"
 
 
 class _TerrainInfo(abc.ABC):
-    def evaluate(self, pos: Point, radius: float) -> float:
-        pass
+    @abc.abstractmethod
+    def evaluate(self, pos: Point, radius: float) -> float: ...
 
-    def get_name(self) -> str:
-        ...
+    @abc.abstractmethod
+    def evaluate_with_gradient(self, pos: Point, radius: float) -> Tuple[float, float, float]:
+        """Returns the value together with its partial derivatives in `theta` and `phi`."""
 
-    def get_origin(self) -> Point:
-        ...
+    def gradient(self, pos: Point, radius: float) -> Tuple[float, float]:
+        """Returns partial derivatives of the value in `theta` and `phi`."""
+
+        value, d_theta, d_phi = self.evaluate_with_gradient(pos, radius)
+        return d_theta, d_phi
+
+    @abc.abstractmethod
+    def get_name(self) -> str: ...
+
+    @abc.abstractmethod
+    def get_origin(self) -> Point: ...
+
+    def get_extent(self) -> Optional[float]:
+        """Returns the distance from the origin beyond which the terrain is flat or `None` if the
+        terrain spans the whole world."""
+
+        return None
 
 
 @dataclass
@@ -173,6 +232,20 @@ class Hills(_TerrainInfo):
             * sin(50 * pos.theta)
         )
 
+    def evaluate_with_gradient(self, pos: Point, radius: float) -> Tuple[float, float, float]:
+        amplitude = 0.006 * radius
+        a = pos.theta / pi - 1
+        b = pos.theta / pi - 2
+        sin_phi = sin(50 * pos.phi)
+        cos_phi = cos(50 * pos.phi)
+        sin_theta = sin(50 * pos.theta)
+        cos_theta = cos(50 * pos.theta)
+        return (
+            amplitude * a * b * sin_phi * sin_theta,
+            amplitude * sin_phi * ((a + b) / pi * sin_theta + 50 * a * b * cos_theta),
+            amplitude * a * b * sin_theta * 50 * cos_phi,
+        )
+
     def get_name(self) -> str:
         return _Terrains.HILLS.value
 
@@ -194,6 +267,18 @@ class Ranges(_TerrainInfo):
     def evaluate(self, pos: Point, radius: float) -> float:
         return 0.012 * radius * cos(10 * pos.theta + pi) * cos(10 * pos.phi)
 
+    def evaluate_with_gradient(self, pos: Point, radius: float) -> Tuple[float, float, float]:
+        amplitude = 0.012 * radius
+        cos_theta = cos(10 * pos.theta + pi)
+        sin_theta = sin(10 * pos.theta + pi)
+        cos_phi = cos(10 * pos.phi)
+        sin_phi = sin(10 * pos.phi)
+        return (
+            amplitude * cos_theta * cos_phi,
+            -10 * amplitude * sin_theta * cos_phi,
+            -10 * amplitude * cos_theta * sin_phi,
+        )
+
     def get_name(self) -> str:
         return _Terrains.RANGES.value
 
@@ -215,6 +300,18 @@ class Continents(_TerrainInfo):
     def evaluate(self, pos: Point, radius: float) -> float:
         return 0.018 * radius * sin(pos.theta) * sin(pos.phi)
 
+    def evaluate_with_gradient(self, pos: Point, radius: float) -> Tuple[float, float, float]:
+        amplitude = 0.018 * radius
+        sin_theta = sin(pos.theta)
+        cos_theta = cos(pos.theta)
+        sin_phi = sin(pos.phi)
+        cos_phi = cos(pos.phi)
+        return (
+            amplitude * sin_theta * sin_phi,
+            amplitude * cos_theta * sin_phi,
+            amplitude * sin_theta * cos_phi,
+        )
+
     def get_name(self) -> str:
         return _Terrains.CONTINENTS.value
 
@@ -222,17 +319,87 @@ class Continents(_TerrainInfo):
         return self.origin
 
 
+@dataclass
+class Peak(_TerrainInfo):
+    """A local bump (or a basin if `height` is negative) around `origin`. It is flat farther than
+    `extent` from the origin."""
+
+    origin: Point
+    extent: float
+    height: float
+
+    class Schema(marshmallow.Schema):
+        origin = mf.Nested(Point.Schema)
+        extent = mf.Float()
+        height = mf.Float()
+
+        @marshmallow.post_load
+        def make(self, data, **kwargs):
+            return Peak(**data)
+
+    def __post_init__(self) -> None:
+        self._center = Coordinates.spherical_to_cartesian(1.0, self.origin.theta, self.origin.phi)
+
+    def evaluate(self, pos: Point, radius: float) -> float:
+        # The shape `(1 - q)^2` with `q` being the squared chord relative to the extent is smooth
+        # and does not need any inverse trigonometric functions.
+        q = self._relative_chord_sq(_to_unit_vector(pos), radius)
+        return self.height * (1.0 - q) * (1.0 - q) if q < 1.0 else 0.0
+
+    def evaluate_with_gradient(self, pos: Point, radius: float) -> Tuple[float, float, float]:
+        sin_theta = sin(pos.theta)
+        cos_theta = cos(pos.theta)
+        sin_phi = sin(pos.phi)
+        cos_phi = cos(pos.phi)
+        vector = (sin_theta * sin_phi, cos_theta, sin_theta * cos_phi)
+        q = self._relative_chord_sq(vector, radius)
+        if q >= 1.0:
+            return 0.0, 0.0, 0.0
+
+        # Squared chord is `2 - 2 * dot(u, c)` so its derivatives are `-2 * dot(du, c)`
+        cx, cy, cz = self._center
+        dq_scale = -2.0 / self._extent_chord_sq(radius)
+        dq_theta = dq_scale * (cos_theta * sin_phi * cx - sin_theta * cy + cos_theta * cos_phi * cz)
+        dq_phi = dq_scale * (sin_theta * cos_phi * cx - sin_theta * sin_phi * cz)
+        factor = -2.0 * self.height * (1.0 - q)
+        return self.height * (1.0 - q) * (1.0 - q), factor * dq_theta, factor * dq_phi
+
+    def get_name(self) -> str:
+        return _Terrains.PEAK.value
+
+    def get_origin(self) -> Point:
+        return self.origin
+
+    def get_extent(self) -> Optional[float]:
+        return self.extent
+
+    def _extent_chord_sq(self, radius: float) -> float:
+        chord = 2.0 * sin(0.5 * min(self.extent / radius, pi))
+        return chord * chord
+
+    def _relative_chord_sq(self, vector: Tuple[float, float, float], radius: float) -> float:
+        cx, cy, cz = self._center
+        chord_sq = (vector[0] - cx) ** 2 + (vector[1] - cy) ** 2 + (vector[2] - cz) ** 2
+        return chord_sq / self._extent_chord_sq(radius)
+
+
+def _to_unit_vector(point: Point) -> Tuple[float, float, float]:
+    return Coordinates.spherical_to_cartesian(1.0, point.theta, point.phi)
+
+
 class _TerrainSchema(OneOfSchema):
     type_schemas = {
         _Terrains.HILLS.value: Hills.Schema,
         _Terrains.RANGES.value: Ranges.Schema,
         _Terrains.CONTINENTS.value: Continents.Schema,
+        _Terrains.PEAK.value: Peak.Schema,
     }
 
     type_names = {
         Hills: _Terrains.HILLS.value,
         Ranges: _Terrains.RANGES.value,
         Continents: _Terrains.CONTINENTS.value,
+        Peak: _Terrains.PEAK.value,
     }
 
     def get_obj_type(self, obj):
@@ -243,6 +410,72 @@ class _TerrainSchema(OneOfSchema):
             raise Exception("Unknown object type: {}".format(obj.__class__.__name__))
 
 
+# Limit of cells a bounded terrain may be assigned to in `_TerrainIndex`.
+_MAX_CELLS_PER_TERRAIN = 64
+
+
+class _TerrainIndex:
+    """
+    Grid over unit vectors assigning to every cell the terrains that may be non-flat in it.
+
+    Terrains spanning the whole world are assigned to every cell. Bounded terrains are assigned to
+    cells overlapping the bounding box of their extent, so evaluating the elevation at a point
+    involves only the terrains close enough to influence it. The index is built for the given
+    version of the terrains and has to be rebuilt when they change.
+    """
+
+    def __init__(self, terrain: List[_TerrainInfo], radius: float, version: int) -> None:
+        self.version = version
+        self.unbounded: List[_TerrainInfo] = list()
+        self.cells: Dict[Tuple[int, int, int], List[_TerrainInfo]] = dict()
+
+        bounded: List[Tuple[Tuple[float, float, float], float, _TerrainInfo]] = list()
+        for info in terrain:
+            extent = info.get_extent()
+            if extent is None:
+                self.unbounded.append(info)
+            else:
+                center = _to_unit_vector(info.get_origin())
+                bounded.append((center, 2.0 * sin(0.5 * min(extent / radius, pi)), info))
+
+        if len(bounded) == 0:
+            self.cell_size = 2.0
+            return
+
+        # The median is not skewed by a few very large terrains. Terrains that would cover too many
+        # cells of that size are treated as unbounded instead.
+        chords = sorted(chord for _, chord, _ in bounded)
+        self.cell_size = max(chords[len(chords) // 2], 1e-6)
+        ranges: List[Tuple[List[int], List[int], _TerrainInfo]] = list()
+        for center, chord, info in bounded:
+            low = [floor((c - chord) / self.cell_size) for c in center]
+            high = [floor((c + chord) / self.cell_size) for c in center]
+            span = (high[0] - low[0] + 1) * (high[1] - low[1] + 1) * (high[2] - low[2] + 1)
+            if span > _MAX_CELLS_PER_TERRAIN:
+                self.unbounded.append(info)
+            else:
+                ranges.append((low, high, info))
+
+        for low, high, info in ranges:
+            for x in range(low[0], high[0] + 1):
+                for y in range(low[1], high[1] + 1):
+                    for z in range(low[2], high[2] + 1):
+                        cell = self.cells.get((x, y, z), None)
+                        if cell is None:
+                            cell = list(self.unbounded)
+                            self.cells[(x, y, z)] = cell
+                        cell.append(info)
+
+    def lookup(self, position: Point) -> List[_TerrainInfo]:
+        if len(self.cells) == 0:
+            return self.unbounded
+
+        size = self.cell_size
+        x, y, z = _to_unit_vector(position)
+        cell = (floor(x / size), floor(y / size), floor(z / size))
+        return self.cells.get(cell, self.unbounded)
+
+
 class Elevation:
     class Schema(marshmallow.Schema):
         radius = mf.Float()
@@ -250,23 +483,172 @@ class Elevation:
 
         @marshmallow.post_load
         def make(self, data, **kwargs):
-            schema = _TerrainSchema()
             ef = Elevation(data["radius"])
-            ef.terrain = data["terrain"]
+            for terrain in data["terrain"]:
+                ef.add(terrain)
             return ef
 
     def __init__(self, radius: float) -> None:
         self.radius = radius
-        self.terrain: List[_TerrainInfo] = list()
+        self._terrain: List[_TerrainInfo] = list()
+        self._version = 0
+        self._index: Optional[_TerrainIndex] = None
+
+    @property
+    def terrain(self) -> Tuple[_TerrainInfo, ...]:
+        """Read-only, terrains are changed with `add`, `replace` or by assigning all of them, so
+        that the index used by `get_terrain_at` is rebuilt."""
+
+        return tuple(self._terrain)
+
+    @terrain.setter
+    def terrain(self, terrain: Iterable[_TerrainInfo]) -> None:
+        self._terrain = list(terrain)
+        self._version += 1
 
     def add(self, terrain: _TerrainInfo) -> None:
-        self.terrain.append(terrain)
+        self._terrain.append(terrain)
+        self._version += 1
+
+    def replace(self, index: int, terrain: _TerrainInfo) -> None:
+        """Replaces the terrain at the given index."""
+
+        self._terrain[index] = terrain
+        self._version += 1
 
     def get_radius(self) -> float:
         return self.radius
 
+    def get_terrain_at(self, position: Point) -> List[_TerrainInfo]:
+        """Returns terrains that may influence the elevation at the given position."""
+
+        index = self._index
+        if index is None or index.version != self._version:
+            index = _TerrainIndex(self._terrain, self.radius, self._version)
+            self._index = index
+        return index.lookup(position)
+
     def evaluate_without_radius(self, position: Point) -> float:
-        return sum(terrain.evaluate(position, self.radius) for terrain in self.terrain)
+        return sum(
+            terrain.evaluate(position, self.radius) for terrain in self.get_terrain_at(position)
+        )
 
     def evaluate_with_radius(self, position: Point) -> float:
         return self.radius + self.evaluate_without_radius(position)
+
+    def evaluate_gradient(self, position: Point) -> Tuple[float, float]:
+        """Returns partial derivatives of the elevation in `theta` and `phi`."""
+
+        value, d_theta, d_phi = self.evaluate_with_gradient(position)
+        return d_theta, d_phi
+
+    def evaluate_with_gradient(self, position: Point) -> Tuple[float, float, float]:
+        """Returns the elevation (without the radius) and its partial derivatives in `theta` and
+        `phi`."""
+
+        value, d_theta, d_phi = 0.0, 0.0, 0.0
+        for terrain in self.get_terrain_at(position):
+            v, dt, dp = terrain.evaluate_with_gradient(position, self.radius)
+            value += v
+            d_theta += dt
+            d_phi += dp
+        return value, d_theta, d_phi
+
+    def evaluate_with_gradients(
+        self, positions: Iterable[Point]
+    ) -> List[Tuple[float, float, float]]:
+        """Batched version of `evaluate_with_gradient`."""
+
+        return [self.evaluate_with_gradient(position) for position in positions]
+
+    def evaluate_normal(self, position: Point) -> Tuple[float, float, float]:
+        """Returns the unit normal of the terrain surface in cartesian coordinates."""
+
+        value, d_theta, d_phi = self.evaluate_with_gradient(position)
+        return _surface_normal(position, self.radius + value, d_theta, d_phi)
+
+    def evaluate_normals(self, positions: Iterable[Point]) -> List[Tuple[float, float, float]]:
+        """Batched version of `evaluate_normal`."""
+
+        return [self.evaluate_normal(position) for position in positions]
+
+
+def _surface_normal(
+    position: Point, r: float, d_theta: float, d_phi: float
+) -> Tuple[float, float, float]:
+    """Returns the unit normal of the surface `r(theta, phi)` given its partial derivatives."""
+
+    sin_theta = sin(position.theta)
+    cos_theta = cos(position.theta)
+    sin_phi = sin(position.phi)
+    cos_phi = cos(position.phi)
+
+    # Normal is `r_hat - d_theta / r * theta_hat - d_phi / (r * sin(theta)) * phi_hat`
+    t = d_theta / r
+    p = d_phi / (r * sin_theta) if abs(sin_theta) > 1e-12 else 0.0
+    x = sin_theta * sin_phi - t * cos_theta * sin_phi - p * cos_phi
+    y = cos_theta + t * sin_theta
+    z = sin_theta * cos_phi - t * cos_theta * cos_phi + p * sin_phi
+    length = sqrt(x * x + y * y + z * z)
+    return x / length, y / length, z / length
+
+
+class Heightmap:
+    """
+    Elevation function sampled on a regular grid of spherical coordinates.
+
+    Rows are spread evenly in `theta` from pole to pole (both included) and columns in `phi` over
+    the full circle. Values between samples are interpolated bilinearly, which is much cheaper than
+    evaluating all the terrains of an `Elevation`.
+    """
+
+    def __init__(self, radius: float, rows: int, columns: int, heights: List[float]) -> None:
+        assert rows > 1 and columns > 0 and len(heights) == rows * columns
+        self.radius = radius
+        self.rows = rows
+        self.columns = columns
+        self.heights = heights
+        self.max_height = max(heights)
+        self.min_height = min(heights)
+
+    @staticmethod
+    def from_elevation(elevation: Elevation, rows: int, columns: int) -> "Heightmap":
+        heights = list()
+        for row in range(rows):
+            theta = pi * row / (rows - 1)
+            for column in range(columns):
+                phi = 2.0 * pi * column / columns
+                heights.append(elevation.evaluate_without_radius(Point(theta, phi)))
+        return Heightmap(elevation.get_radius(), rows, columns, heights)
+
+    def get_radius(self) -> float:
+        return self.radius
+
+    def get_height(self, row: int, column: int) -> float:
+        return self.heights[row * self.columns + column % self.columns]
+
+    def evaluate_without_radius(self, position: Point) -> float:
+        return self.evaluate_spherical(position.theta, position.phi)
+
+    def evaluate_with_radius(self, position: Point) -> float:
+        return self.radius + self.evaluate_spherical(position.theta, position.phi)
+
+    def evaluate_spherical(self, theta: float, phi: float) -> float:
+        """Returns the interpolated height (without the radius) at the given spherical angles."""
+
+        y = min(max(theta, 0.0), pi) * (self.rows - 1) / pi
+        x = (phi % (2.0 * pi)) * self.columns / (2.0 * pi)
+        row = min(int(y), self.rows - 2)
+        column = int(x)
+        fy = y - row
+        fx = x - column
+
+        columns = self.columns
+        heights = self.heights
+        top = row * columns
+        bottom = top + columns
+        left = column % columns
+        right = (column + 1) % columns
+        upper = heights[top + left] + fx * (heights[top + right] - heights[top + left])
+        lower = heights[bottom + left] + fx * (heights[bottom + right] - heights[bottom + left])
+        return upper + fy * (lower - upper)
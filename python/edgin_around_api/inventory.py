@@ -4,22 +4,117 @@ import marshmallow
 from marshmallow import fields as mf
 from marshmallow_enum import EnumField
 
-from typing import Iterable, List, Optional, Set
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
 
 from . import craft, defs
 
 
-@dataclass
-class EntityInfo:
-    """Displayable info about an entity."""
+Slot = Union[defs.Hand, int]
+SlotListener = Callable[[Slot, Optional["EntityInfo"], Optional["EntityInfo"]], None]
 
-    id: defs.ActorId
+_StackKind = Tuple[str, craft.Essence, int, int]
+_PrototypeKey = Tuple[craft.Essence, int, int, str]
+_PayloadKey = Tuple[type, Optional[FrozenSet[str]], FrozenSet[str], bool]
+
+_FINGERPRINT_MASK = (1 << 64) - 1
+
+
+@dataclass(frozen=True)
+class Prototype:
+    """Properties shared by all the entities of the same kind."""
+
+    id: int
     essence: craft.Essence
-    current_quantity: int
     item_volume: int
     max_volume: int
     codename: str
 
+    class Schema(marshmallow.Schema):
+        id = mf.Integer()
+        essence = EnumField(craft.Essence)
+        item_volume = mf.Integer()
+        max_volume = mf.Integer()
+        codename = mf.Str()
+
+        @marshmallow.post_load
+        def make(self, data, **kwargs):
+            return Prototype(**data)
+
+    def get_key(self) -> _PrototypeKey:
+        return (self.essence, self.item_volume, self.max_volume, self.codename)
+
+
+class PrototypeTable:
+    """
+    Interns prototypes of entities and assigns them IDs used in the compact wire format.
+
+    On the server the IDs are assigned by `intern`. On the client they are set by `define` when
+    handling the prototype definitions sent by the server (see
+    `PrototypeDefinitionAction.register`).
+    """
+
+    def __init__(self) -> None:
+        self._by_id: Dict[int, Prototype] = dict()
+        self._by_key: Dict[_PrototypeKey, Prototype] = dict()
+
+    def intern(
+        self, essence: craft.Essence, item_volume: int, max_volume: int, codename: str
+    ) -> Prototype:
+        key = (essence, item_volume, max_volume, codename)
+        prototype = self._by_key.get(key, None)
+        if prototype is None:
+            id = max(self._by_id.keys()) + 1 if len(self._by_id) > 0 else 0
+            prototype = Prototype(id, essence, item_volume, max_volume, codename)
+            self._by_id[id] = prototype
+            self._by_key[key] = prototype
+        return prototype
+
+    def define(self, prototype: Prototype) -> Prototype:
+        """
+        Registers the prototype under its ID, replacing the previous definition with the same ID
+        and the one with the same properties, so that every ID and every kind of entities
+        correspond to exactly one prototype. Entities referencing the replaced prototypes are not
+        affected.
+        """
+
+        previous = self._by_id.get(prototype.id, None)
+        if previous is not None and self._by_key.get(previous.get_key(), None) is previous:
+            del self._by_key[previous.get_key()]
+
+        key = prototype.get_key()
+        same = self._by_key.get(key, None)
+        if same is not None and self._by_id.get(same.id, None) is same:
+            del self._by_id[same.id]
+
+        self._by_id[prototype.id] = prototype
+        self._by_key[key] = prototype
+        return prototype
+
+    def get(self, id: int) -> Optional[Prototype]:
+        return self._by_id.get(id, None)
+
+    def get_all(self) -> List[Prototype]:
+        return list(self._by_id.values())
+
+
+PROTOTYPES = PrototypeTable()
+
+
+class EntityInfo:
+    """
+    Displayable info about an entity.
+
+    Only the ID and the quantity are stored per entity, the other properties come from an interned
+    `Prototype`. Immutable: the quantity of an entity in an inventory is changed with
+    `Inventory.update_quantity`, which replaces the entry.
+    """
+
+    __slots__ = ("id", "prototype", "current_quantity")
+
+    id: defs.ActorId
+    prototype: Prototype
+    current_quantity: int
+
     class Schema(marshmallow.Schema):
         id = mf.Integer()
         essence = EnumField(craft.Essence)
@@ -28,17 +123,148 @@ class EntityInfo:
         max_volume = mf.Integer()
         codename = mf.Str()
 
+    class CompactSchema(marshmallow.Schema):
+        """Serialises the entity with a reference to its prototype (see `PrototypeDefinitionAction`)."""
+
+        id = mf.Integer()
+        prototype_id = mf.Integer()
+        current_quantity = mf.Integer()
+
+        @marshmallow.post_load
+        def make(self, data, **kwargs):
+            prototype = PROTOTYPES.get(data["prototype_id"])
+            if prototype is None:
+                raise marshmallow.ValidationError(f"Unknown prototype: {data['prototype_id']}")
+            return EntityInfo.from_prototype(data["id"], prototype, data["current_quantity"])
+
+    def __init__(
+        self,
+        id: defs.ActorId,
+        essence: craft.Essence,
+        current_quantity: int,
+        item_volume: int,
+        max_volume: int,
+        codename: str,
+    ) -> None:
+        object.__setattr__(self, "id", id)
+        object.__setattr__(
+            self, "prototype", PROTOTYPES.intern(essence, item_volume, max_volume, codename)
+        )
+        object.__setattr__(self, "current_quantity", current_quantity)
+
+    @staticmethod
+    def from_prototype(
+        id: defs.ActorId, prototype: Prototype, current_quantity: int
+    ) -> "EntityInfo":
+        result = EntityInfo.__new__(EntityInfo)
+        object.__setattr__(result, "id", id)
+        object.__setattr__(result, "prototype", prototype)
+        object.__setattr__(result, "current_quantity", current_quantity)
+        return result
+
+    @property
+    def essence(self) -> craft.Essence:
+        return self.prototype.essence
+
+    @property
+    def item_volume(self) -> int:
+        return self.prototype.item_volume
+
+    @property
+    def max_volume(self) -> int:
+        return self.prototype.max_volume
+
+    @property
+    def codename(self) -> str:
+        return self.prototype.codename
+
+    @property
+    def prototype_id(self) -> int:
+        return self.prototype.id
+
     def to_item(self) -> craft.Item:
         return craft.Item(self.id, self.essence, self.current_quantity)
 
-    def set_quantity(self, quantity: int) -> None:
-        self.current_quantity = quantity
-
     def calc_max_quantity_for_item_volume(self, volume: int):
         return self.max_volume // volume
 
+    def set_quantity(self, quantity: int) -> None:
+        """Kept only to point old callers to `Inventory.update_quantity`. Entries are immutable."""
+
+        raise AttributeError(
+            "EntityInfo.set_quantity was removed, use Inventory.update_quantity instead"
+        )
+
+    def __reduce__(self):
+        # Attributes can not be set, so copies and unpickled entries are built from the prototype.
+        return (EntityInfo.from_prototype, (self.id, self.prototype, self.current_quantity))
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("EntityInfo is immutable, use Inventory.update_quantity")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("EntityInfo is immutable")
+
+    def __repr__(self) -> str:
+        return (
+            f"EntityInfo(id={self.id}, essence={self.essence}, "
+            f"current_quantity={self.current_quantity}, item_volume={self.item_volume}, "
+            f"max_volume={self.max_volume}, codename={self.codename!r})"
+        )
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, EntityInfo)
+            and self.id == other.id
+            and self.current_quantity == other.current_quantity
+            and self.essence == other.essence
+            and self.item_volume == other.item_volume
+            and self.max_volume == other.max_volume
+            and self.codename == other.codename
+        )
+
+
+def _with_quantity(entry: EntityInfo, quantity: int) -> EntityInfo:
+    """Returns a copy of the entry with a different quantity. Entries are replaced instead of being
+    modified, so that snapshots and views sharing them stay intact."""
+
+    return EntityInfo.from_prototype(entry.id, entry.prototype, quantity)
+
+
+def can_stack(first: EntityInfo, second: EntityInfo) -> bool:
+    """Checks if the entries are stacks of the same kind of items, which can be merged."""
+
+    return _stack_kind(first) == _stack_kind(second)
+
+
+def _stack_kind(entry: EntityInfo) -> _StackKind:
+    return (entry.codename, entry.essence, entry.item_volume, entry.max_volume)
+
+
+def _capacity(entry: EntityInfo) -> int:
+    """Returns the maximal number of items in the stack."""
+
+    if entry.item_volume <= 0:
+        return entry.current_quantity
+    return entry.calc_max_quantity_for_item_volume(entry.item_volume)
+
+
+def _entry_hash(entry: Optional[EntityInfo]) -> int:
+    if entry is None:
+        return 0
+    return hash((entry.id, entry.essence, entry.current_quantity)) & _FINGERPRINT_MASK
+
 
 class Inventory:
+    """
+    Contents of the hands and pockets of an actor.
+
+    All the changes go through `store_entry`, `insert_entry`, `swap`, `update_quantity` and
+    `remove_with_entity_id` (or assignment to the hands), which keep track of a version counter, a
+    fingerprint of the content and an index of slots by entity ID, and notify listeners. Entries
+    are immutable, so they can not be changed behind the inventory's back.
+    """
+
     class Schema(marshmallow.Schema):
         left_hand = mf.Nested(EntityInfo.Schema, allow_none=True)
         right_hand = mf.Nested(EntityInfo.Schema, allow_none=True)
@@ -68,16 +294,154 @@ class Inventory:
 
             return inv
 
+    class CompactSchema(marshmallow.Schema):
+        """Same as `Schema`, but entries reference their prototypes."""
+
+        left_hand = mf.Nested(EntityInfo.CompactSchema, allow_none=True)
+        right_hand = mf.Nested(EntityInfo.CompactSchema, allow_none=True)
+        entries = mf.List(mf.Nested(EntityInfo.CompactSchema, allow_none=True))
+
+        @marshmallow.post_load
+        def make(self, data, **kwargs):
+            inv = Inventory()
+            inv.store_entry(defs.Hand.LEFT, data["left_hand"])
+            inv.store_entry(defs.Hand.RIGHT, data["right_hand"])
+            for i, entry in enumerate(data["entries"]):
+                inv.insert_entry(i, entry)
+            return inv
+
     def __init__(self) -> None:
-        self.left_hand: Optional[EntityInfo] = None
-        self.right_hand: Optional[EntityInfo] = None
-        self.entries: List[Optional[EntityInfo]] = [None for i in range(defs.INVENTORY_SIZE)]
+        self._left_hand: Optional[EntityInfo] = None
+        self._right_hand: Optional[EntityInfo] = None
+        self._entries: List[Optional[EntityInfo]] = [None for i in range(defs.INVENTORY_SIZE)]
+        self._fingerprint = 0
+        self._version = 0
+        self._slots: Dict[defs.ActorId, Slot] = dict()
+        self._listeners: List[SlotListener] = list()
+        self._histogram: Dict[craft.Essence, int] = dict()
+
+        # Cached projections together with the versions they were built from and their own
+        # versions at that time.
+        self._hands_version = 0
+        self._public: Optional[Inventory] = None
+        self._public_source = 0
+        self._public_version = 0
+        self._private: Optional[Inventory] = None
+        self._private_source = 0
+        self._private_version = 0
+        self._payloads: Dict[_PayloadKey, Tuple[int, Dict]] = dict()
+
+    @property
+    def left_hand(self) -> Optional[EntityInfo]:
+        return self._left_hand
+
+    @left_hand.setter
+    def left_hand(self, entry: Optional[EntityInfo]) -> None:
+        self._set_slot(defs.Hand.LEFT, entry)
+
+    @property
+    def right_hand(self) -> Optional[EntityInfo]:
+        return self._right_hand
+
+    @right_hand.setter
+    def right_hand(self, entry: Optional[EntityInfo]) -> None:
+        self._set_slot(defs.Hand.RIGHT, entry)
+
+    @property
+    def entries(self) -> Tuple[Optional[EntityInfo], ...]:
+        """Entries of the pockets. Read-only, pockets are changed with `insert_entry`."""
+
+        return tuple(self._entries)
+
+    def get_fingerprint(self) -> int:
+        """
+        Returns a hash of the multiset of IDs, essences and quantities of all the entries. It does
+        not depend on the placement of the entries, so e.g. swapping does not change it. Maintained
+        incrementally.
+        """
+
+        return self._fingerprint
+
+    def get_version(self) -> int:
+        """Returns a number increased on every change of the inventory."""
+
+        return self._version
+
+    def add_listener(self, listener: SlotListener) -> None:
+        """Registers a function called with the slot, the previous and the new entry after every
+        change of a slot."""
+
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: SlotListener) -> None:
+        self._listeners.remove(listener)
+
+    def get_slot(self, entity_id: defs.ActorId) -> Optional[Slot]:
+        """Returns the hand or the pocket index holding the entity."""
+
+        return self._slots.get(entity_id, None)
 
     def public(self) -> "Inventory":
-        inventory = Inventory()
-        inventory.left_hand = self.left_hand
-        inventory.left_hand = self.left_hand
-        return inventory
+        """
+        Returns the part of the inventory visible to other actors: the hands only.
+
+        The returned view shares the entries and is cached until the hands change, so it should be
+        treated as read-only. If it gets modified anyway, a fresh view is built the next time.
+        """
+
+        view = self._public
+        if (
+            view is None
+            or self._public_source != self._hands_version
+            or view._version != self._public_version
+        ):
+            view = Inventory()
+            view.store_entry(defs.Hand.LEFT, self._left_hand)
+            view.store_entry(defs.Hand.RIGHT, self._right_hand)
+            self._public = view
+            self._public_source = self._hands_version
+            self._public_version = view._version
+        return view
+
+    def private(self) -> "Inventory":
+        """Same as `public`, but returns a copy of the whole inventory, cached until any change."""
+
+        view = self._private
+        if (
+            view is None
+            or self._private_source != self._version
+            or view._version != self._private_version
+        ):
+            view = Inventory()
+            for slot in self._slots.values():
+                view._set_slot(slot, self._get_slot(slot))
+            self._private = view
+            self._private_source = self._version
+            self._private_version = view._version
+        return view
+
+    def get_payload(self, schema: marshmallow.Schema) -> Dict:
+        """
+        Returns the inventory serialised with the given schema. The result is cached per schema
+        type and its `only`, `exclude` and `many` options until the inventory changes.
+
+        The same dictionary is returned to every caller, so it must not be modified. Copy it if it
+        has to be changed.
+        """
+
+        key: _PayloadKey = (
+            type(schema),
+            frozenset(schema.only) if schema.only is not None else None,
+            frozenset(schema.exclude),
+            schema.many,
+        )
+        cached = self._payloads.get(key, None)
+        if cached is not None and cached[0] == self._version:
+            return cached[1]
+
+        payload = schema.dump(self)
+        self._payloads[key] = (self._version, payload)
+        return payload
 
     def get_hand(self, hand: defs.Hand) -> Optional[defs.ActorId]:
         if hand == defs.Hand.LEFT:
@@ -95,29 +459,38 @@ class Inventory:
 
     def get_pocket(self, index: int) -> Optional[defs.ActorId]:
         if self.is_index_valid(index):
-            entry = self.entries[index]
+            entry = self._entries[index]
             return entry.id if entry is not None else None
         else:
             return None
 
     def get_pocket_entry(self, index: int) -> Optional[EntityInfo]:
-        return self.entries[index] if self.is_index_valid(index) else None
+        return self._entries[index] if self.is_index_valid(index) else None
 
-    def get_all_ids(self) -> List[defs.ActorId]:
-        result = list()
+    def get_essence_quantity(self, essence: craft.Essence) -> int:
+        """Returns the total quantity of the held entities with the given essence."""
 
-        if self.left_hand is not None:
-            result.append(self.left_hand.id)
+        return self._histogram.get(essence, 0)
 
-        if self.right_hand is not None:
-            result.append(self.right_hand.id)
+    def get_essence_histogram(self) -> Dict[craft.Essence, int]:
+        """Returns the total quantity of the held entities per essence. Maintained incrementally."""
 
-        for entry in self.entries:
-            if entry is not None:
-                result.append(entry.id)
+        return dict(self._histogram)
+
+    def get_prototypes(self) -> Set[Prototype]:
+        """Returns prototypes of all the entries, e.g. to send their definitions to a client before
+        a compact update."""
 
+        result: Set[Prototype] = set()
+        for slot in self._slots.values():
+            entry = self._get_slot(slot)
+            assert entry is not None
+            result.add(entry.prototype)
         return result
 
+    def get_all_ids(self) -> List[defs.ActorId]:
+        return list(self._slots.keys())
+
     def store(
         self,
         hand: defs.Hand,
@@ -132,10 +505,8 @@ class Inventory:
         self.store_entry(hand, entry)
 
     def store_entry(self, hand: defs.Hand, entry: Optional[EntityInfo]) -> None:
-        if hand == defs.Hand.LEFT:
-            self.left_hand = entry
-        elif hand == defs.Hand.RIGHT:
-            self.right_hand = entry
+        if hand == defs.Hand.LEFT or hand == defs.Hand.RIGHT:
+            self._set_slot(hand, entry)
 
     def insert(
         self,
@@ -152,17 +523,146 @@ class Inventory:
 
     def insert_entry(self, index: int, entry: Optional[EntityInfo]) -> None:
         if self.is_index_valid(index):
-            self.entries[index] = entry
+            self._set_slot(index, entry)
 
     def swap(self, hand: defs.Hand, index: int) -> None:
-        if self.is_index_valid(index):
-            entry = self.entries[index]
-            if hand == defs.Hand.LEFT:
-                self.entries[index] = self.left_hand
-                self.left_hand = entry
-            elif hand == defs.Hand.RIGHT:
-                self.entries[index] = self.right_hand
-                self.right_hand = entry
+        if self.is_index_valid(index) and (hand == defs.Hand.LEFT or hand == defs.Hand.RIGHT):
+            entry = self._entries[index]
+            self._set_slot(index, self._get_slot(hand))
+            self._set_slot(hand, entry)
+
+    def merge(self, hand: defs.Hand, index: int) -> bool:
+        """
+        Moves as many items from the hand to the pocket as fit into the stack in the pocket (see
+        `can_stack`). If the pocket is empty the whole stack is moved. Returns `False` if nothing
+        could be moved.
+        """
+
+        if not self.is_index_valid(index) or not (
+            hand == defs.Hand.LEFT or hand == defs.Hand.RIGHT
+        ):
+            return False
+
+        source = self._get_slot(hand)
+        target = self._entries[index]
+        if source is None:
+            return False
+        elif target is None:
+            self._set_slot(hand, None)
+            self._set_slot(index, source)
+            return True
+        else:
+            return self._move_items(hand, source, index, target)
+
+    def merge_into_hand(self, hand: defs.Hand, index: int) -> bool:
+        """Same as `merge`, but moves the items from the pocket to the hand."""
+
+        if not self.is_index_valid(index) or not (
+            hand == defs.Hand.LEFT or hand == defs.Hand.RIGHT
+        ):
+            return False
+
+        source = self._entries[index]
+        target = self._get_slot(hand)
+        if source is None:
+            return False
+        elif target is None:
+            self._set_slot(index, None)
+            self._set_slot(hand, source)
+            return True
+        else:
+            return self._move_items(index, source, hand, target)
+
+    def apply_update(self, hand: defs.Hand, index: int, variant: defs.UpdateVariant) -> bool:
+        """Performs the update requested by an `InventoryUpdateMove`. Returns `False` if nothing
+        changed."""
+
+        if variant == defs.UpdateVariant.SWAP:
+            if not self.is_index_valid(index):
+                return False
+            self.swap(hand, index)
+            return True
+        elif variant == defs.UpdateVariant.MERGE:
+            return self.merge(hand, index)
+        else:
+            return False
+
+    def compact(self) -> Tuple[Set[Slot], List[defs.ActorId]]:
+        """
+        Merges stacks of the same kind in the whole inventory, filling the earlier ones first: the
+        left hand, the right hand and then the pockets in order. Returns the changed slots and IDs
+        of the entities that were merged completely into other stacks and removed. Takes time
+        linear in the number of slots.
+        """
+
+        # Quantities are collected first and every changed slot is written only once.
+        slots: List[Slot] = [defs.Hand.LEFT, defs.Hand.RIGHT]
+        slots.extend(range(defs.INVENTORY_SIZE))
+        entries = [self._get_slot(slot) for slot in slots]
+        quantities: List[int] = [entry.current_quantity if entry else 0 for entry in entries]
+        open_stacks: Dict[_StackKind, int] = dict()
+        changed: Set[int] = set()
+        for i, entry in enumerate(entries):
+            if entry is None:
+                continue
+
+            kind = _stack_kind(entry)
+            capacity = _capacity(entry)
+            j = open_stacks.get(kind, None)
+            if j is not None:
+                amount = min(quantities[i], capacity - quantities[j])
+                if amount > 0:
+                    quantities[j] += amount
+                    quantities[i] -= amount
+                    changed.update((i, j))
+                if quantities[j] >= capacity:
+                    del open_stacks[kind]
+                    j = None
+
+            if j is None and 0 < quantities[i] < capacity:
+                open_stacks[kind] = i
+
+        removed: List[defs.ActorId] = list()
+        for i in sorted(changed):
+            entry = entries[i]
+            assert entry is not None
+            if quantities[i] == 0:
+                removed.append(entry.id)
+                self._set_slot(slots[i], None)
+            else:
+                self._set_slot(slots[i], _with_quantity(entry, quantities[i]))
+
+        return {slots[i] for i in changed}, removed
+
+    def _move_items(
+        self, source_slot: Slot, source: EntityInfo, target_slot: Slot, target: EntityInfo
+    ) -> bool:
+        if not can_stack(source, target) or source.id == target.id:
+            return False
+
+        amount = min(source.current_quantity, _capacity(target) - target.current_quantity)
+        if amount <= 0:
+            return False
+
+        self._set_slot(target_slot, _with_quantity(target, target.current_quantity + amount))
+        if amount == source.current_quantity:
+            self._set_slot(source_slot, None)
+        else:
+            self._set_slot(source_slot, _with_quantity(source, source.current_quantity - amount))
+        return True
+
+    def update_quantity(self, entity_id: defs.ActorId, quantity: int) -> bool:
+        """Changes the quantity of the entity with the given ID. Returns `False` if the entity is not
+        in the inventory."""
+
+        slot = self._slots.get(entity_id, None)
+        if slot is None:
+            return False
+
+        entry = self._get_slot(slot)
+        assert entry is not None
+        self._set_slot(slot, _with_quantity(entry, quantity))
+        return True
 
     def to_items(self) -> Set[craft.Item]:
         result: Set[craft.Item] = set()
@@ -173,7 +673,7 @@ class Inventory:
         if self.right_hand is not None:
             result.add(self.right_hand.to_item())
 
-        for entry in self.entries:
+        for entry in self._entries:
             if entry is not None:
                 result.add(entry.to_item())
 
@@ -188,31 +688,145 @@ class Inventory:
         return hand
 
     def find_entity_with_entity_id(self, entity_id: defs.ActorId) -> Optional[EntityInfo]:
-        if self.left_hand is not None and self.left_hand.id == entity_id:
-            return self.left_hand
+        slot = self._slots.get(entity_id, None)
+        return self._get_slot(slot) if slot is not None else None
 
-        if self.right_hand is not None and self.right_hand.id == entity_id:
-            return self.right_hand
+    def remove_with_entity_id(self, entity_id: defs.ActorId) -> None:
+        slot = self._slots.get(entity_id, None)
+        if slot is not None:
+            self._set_slot(slot, None)
+
+    def _get_slot(self, slot: Slot) -> Optional[EntityInfo]:
+        if slot == defs.Hand.LEFT:
+            return self._left_hand
+        elif slot == defs.Hand.RIGHT:
+            return self._right_hand
+        else:
+            return self._entries[slot]
 
-        for entry in self.entries:
-            if entry is not None and entry.id == entity_id:
-                return entry
+    def _set_slot(self, slot: Slot, entry: Optional[EntityInfo]) -> None:
+        """All the changes of the inventory go through here."""
 
-        return None
+        previous = self._get_slot(slot)
+        if slot == defs.Hand.LEFT:
+            self._left_hand = entry
+        elif slot == defs.Hand.RIGHT:
+            self._right_hand = entry
+        else:
+            self._entries[slot] = entry
+
+        # While swapping an entry may be present in two slots for a moment, so only the index
+        # pointing to this slot is removed.
+        if previous is not None and self._slots.get(previous.id, None) == slot:
+            del self._slots[previous.id]
+        if entry is not None:
+            self._slots[entry.id] = slot
+
+        self._fingerprint = (
+            self._fingerprint - _entry_hash(previous) + _entry_hash(entry)
+        ) & _FINGERPRINT_MASK
+        self._version += 1
+
+        # Empty stacks do not change the totals and only non-zero totals are kept.
+        histogram = self._histogram
+        if previous is not None and previous.current_quantity != 0:
+            quantity = histogram.get(previous.essence, 0) - previous.current_quantity
+            if quantity != 0:
+                histogram[previous.essence] = quantity
+            else:
+                del histogram[previous.essence]
+        if entry is not None and entry.current_quantity != 0:
+            quantity = histogram.get(entry.essence, 0) + entry.current_quantity
+            if quantity != 0:
+                histogram[entry.essence] = quantity
+            else:
+                del histogram[entry.essence]
+        if isinstance(slot, defs.Hand):
+            self._hands_version += 1
 
-    def remove_with_entity_id(self, entity_id: defs.ActorId) -> None:
-        if self.left_hand is not None and self.left_hand.id == entity_id:
-            self.left_hand = None
-            return
+        for listener in self._listeners:
+            listener(slot, previous, entry)
+
+    def is_index_valid(self, index: int) -> bool:
+        return -1 < index and index < defs.INVENTORY_SIZE
+
+
+class InventoryRegistry:
+    """
+    Index of the owners of all the entities held in the registered inventories. Kept up to date by
+    listening to changes of the inventories.
+    """
 
-        if self.right_hand is not None and self.right_hand.id == entity_id:
-            self.right_hand = None
+    def __init__(self) -> None:
+        self._inventories: Dict[defs.ActorId, Inventory] = dict()
+        self._listeners: Dict[defs.ActorId, SlotListener] = dict()
+        self._owners: Dict[defs.ActorId, defs.ActorId] = dict()
+
+    def register(self, owner_id: defs.ActorId, inventory: Inventory) -> None:
+        """Adds the inventory of the given owner replacing the previous one if present."""
+
+        self.unregister(owner_id)
+
+        def listener(
+            slot: Slot, previous: Optional[EntityInfo], entry: Optional[EntityInfo]
+        ) -> None:
+            if previous is not None and inventory.get_slot(previous.id) is None:
+                if self._owners.get(previous.id, None) == owner_id:
+                    del self._owners[previous.id]
+            if entry is not None:
+                self._owners[entry.id] = owner_id
+
+        self._inventories[owner_id] = inventory
+        self._listeners[owner_id] = listener
+        inventory.add_listener(listener)
+        for entity_id in inventory.get_all_ids():
+            self._owners[entity_id] = owner_id
+
+    def unregister(self, owner_id: defs.ActorId) -> None:
+        inventory = self._inventories.pop(owner_id, None)
+        if inventory is None:
             return
 
-        for i, entry in enumerate(self.entries):
-            if entry is not None and entry.id == entity_id:
-                self.entries[i] = None
-                return
+        inventory.remove_listener(self._listeners.pop(owner_id))
+        for entity_id in inventory.get_all_ids():
+            if self._owners.get(entity_id, None) == owner_id:
+                del self._owners[entity_id]
 
-    def is_index_valid(self, index: int) -> bool:
-        return -1 < index and index < defs.INVENTORY_SIZE
+    def get_inventory(self, owner_id: defs.ActorId) -> Optional[Inventory]:
+        return self._inventories.get(owner_id, None)
+
+    def find_owner(self, entity_id: defs.ActorId) -> Optional[defs.ActorId]:
+        """Returns the ID of the actor holding the entity."""
+
+        return self._owners.get(entity_id, None)
+
+    def find_entity(self, entity_id: defs.ActorId) -> Optional[EntityInfo]:
+        owner_id = self._owners.get(entity_id, None)
+        if owner_id is None:
+            return None
+        return self._inventories[owner_id].find_entity_with_entity_id(entity_id)
+
+
+def aggregate_essences(inventories: Iterable[Inventory]) -> Dict[craft.Essence, int]:
+    """Returns the total quantity per essence held in all the inventories, e.g. of a team."""
+
+    result: Dict[craft.Essence, int] = dict()
+    for inventory in inventories:
+        for essence, quantity in inventory.get_essence_histogram().items():
+            result[essence] = result.get(essence, 0) + quantity
+    return result
+
+
+class CachedNested(mf.Nested):
+    """
+    Nested field serialising inventories with `Inventory.get_payload`, so that an unchanged
+    inventory is serialised only once.
+
+    The serialised inventory is the cached dictionary itself, shared by all the dumps until the
+    inventory changes. Dumped data containing it must not be modified in place.
+    """
+
+    def _serialize(self, nested_obj, attr, obj, **kwargs):
+        if isinstance(nested_obj, Inventory):
+            return nested_obj.get_payload(self.schema)
+        return super()._serialize(nested_obj, attr, obj, **kwargs)
@@ -0,0 +1,328 @@
+# This file provides pathfinding over the terrain for NPCs.
+#
+# The sphere is covered with a cube-sphere grid (see `geometry.Coordinates.cube_to_cartesian`) with
+# `resolution x resolution` nodes on every face. Every node is connected with its eight neighbours,
+# also across the edges of the faces. Costs of the connections grow with the slope of the terrain.
+
+import heapq
+from collections import OrderedDict
+from math import asin, sqrt
+
+from typing import Dict, List, Optional, Tuple
+
+from . import geometry, regions
+
+
+Node = Tuple[int, int, int]
+_Vector = Tuple[float, float, float]
+
+_MAX_TRACKED_REQUESTS = 100000
+_OFFSETS = [(di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1) if di != 0 or dj != 0]
+
+
+class TerrainGrid:
+    """
+    Cube-sphere grid of nodes with travel costs derived from the elevation.
+
+    Moving between neighbouring nodes costs the great circle distance between them multiplied by
+    `1 + slope_weight * |slope|`, plus `climb_weight` times the height gained. Connections steeper
+    than `max_slope` are impassable. Heights and connections are evaluated lazily and cached.
+    """
+
+    def __init__(
+        self,
+        elevation: geometry.Elevation,
+        resolution: int,
+        slope_weight: float = 1.0,
+        climb_weight: float = 0.0,
+        max_slope: Optional[float] = None,
+    ) -> None:
+        self.elevation = elevation
+        self.radius = elevation.get_radius()
+        self.resolution = resolution
+        self.slope_weight = slope_weight
+        self.climb_weight = climb_weight
+        self.max_slope = max_slope
+        self._vectors: Dict[Node, _Vector] = dict()
+        self._heights: Dict[Node, float] = dict()
+        self._neighbours: Dict[Node, List[Tuple[Node, float]]] = dict()
+
+    def node_at(self, point: geometry.Point) -> Node:
+        """Returns the node closest to the given point."""
+
+        vector = geometry.Coordinates.spherical_to_cartesian(1.0, point.theta, point.phi)
+        return self._node_at_vector(*vector)
+
+    def point_of(self, node: Node) -> geometry.Point:
+        r, theta, phi = geometry.Coordinates.cartesian_to_spherical(*self.vector_of(node))
+        return geometry.Point(theta, phi)
+
+    def vector_of(self, node: Node) -> _Vector:
+        vector = self._vectors.get(node, None)
+        if vector is None:
+            face, i, j = node
+            vector = self._face_vector(face, i, j)
+            self._vectors[node] = vector
+        return vector
+
+    def height_of(self, node: Node) -> float:
+        height = self._heights.get(node, None)
+        if height is None:
+            height = self.elevation.evaluate_without_radius(self.point_of(node))
+            self._heights[node] = height
+        return height
+
+    def distance(self, first: Node, second: Node) -> float:
+        """Returns the great circle distance between the nodes."""
+
+        return _arc(self.vector_of(first), self.vector_of(second)) * self.radius
+
+    def cost(self, first: Node, second: Node) -> Optional[float]:
+        """Returns the cost of moving between neighbouring nodes or `None` if it is impassable."""
+
+        distance = self.distance(first, second)
+        climb = self.height_of(second) - self.height_of(first)
+        slope = abs(climb) / distance if distance > 0.0 else 0.0
+        if self.max_slope is not None and slope > self.max_slope:
+            return None
+        return distance * (1.0 + self.slope_weight * slope) + self.climb_weight * max(climb, 0.0)
+
+    def neighbours(self, node: Node) -> List[Tuple[Node, float]]:
+        """Returns passable neighbours of the node together with costs of moving to them."""
+
+        result = self._neighbours.get(node, None)
+        if result is not None:
+            return result
+
+        result = list()
+        for neighbour in self._adjacent(node):
+            cost = self.cost(node, neighbour)
+            if cost is not None:
+                result.append((neighbour, cost))
+        self._neighbours[node] = result
+        return result
+
+    def _adjacent(self, node: Node) -> List[Node]:
+        face, i, j = node
+        n = self.resolution
+        result: List[Node] = list()
+        for di, dj in _OFFSETS:
+            ni, nj = i + di, j + dj
+            if 0 <= ni < n and 0 <= nj < n:
+                neighbour = (face, ni, nj)
+            else:
+                # Past the edge of the face the grid continues on the extended plane of the face
+                # and is projected onto the neighbouring face.
+                neighbour = self._node_at_vector(*self._face_vector(face, ni, nj))
+            if neighbour != node and neighbour not in result:
+                result.append(neighbour)
+        return result
+
+    def _face_vector(self, face: int, i: int, j: int) -> _Vector:
+        step = 2.0 / self.resolution
+        return geometry.Coordinates.cube_to_cartesian(
+            face, -1.0 + (i + 0.5) * step, -1.0 + (j + 0.5) * step
+        )
+
+    def _node_at_vector(self, x: float, y: float, z: float) -> Node:
+        face, u, v = geometry.Coordinates.cartesian_to_cube(x, y, z)
+        n = self.resolution
+        i = min(max(int((u + 1.0) * 0.5 * n), 0), n - 1)
+        j = min(max(int((v + 1.0) * 0.5 * n), 0), n - 1)
+        return (face, i, j)
+
+
+def _arc(first: _Vector, second: _Vector) -> float:
+    """Returns the angle between two unit vectors."""
+
+    chord = sqrt(
+        (first[0] - second[0]) ** 2 + (first[1] - second[1]) ** 2 + (first[2] - second[2]) ** 2
+    )
+    return 2.0 * asin(min(0.5 * chord, 1.0))
+
+
+class Pathfinder:
+    """
+    Finds paths over a `TerrainGrid` with A* using the great circle distance as the heuristic.
+
+    Destinations requested at least `cache_threshold` times become popular. For a popular
+    destination the cheapest paths towards it from all the nodes closer than `cache_radius` (or
+    from the whole grid if it is `None`) are computed at once by a reverse Dijkstra search, after
+    which paths towards it are read off without any search. Up to `cache_size` popular destinations
+    are kept, the least recently used ones are evicted.
+
+    If `region_map` is given, goals in a different region than the start are rejected without any
+    search.
+    """
+
+    def __init__(
+        self,
+        grid: TerrainGrid,
+        cache_size: int = 16,
+        cache_threshold: int = 3,
+        cache_radius: Optional[float] = None,
+        max_expansions: int = 100000,
+        tolerance: float = 0.25,
+        region_map: Optional[regions.RegionMap] = None,
+    ) -> None:
+        """`tolerance` is the allowed deviation of the compacted path from the grid path, as
+        a fraction of the grid spacing."""
+
+        self.grid = grid
+        self.cache_size = cache_size
+        self.cache_threshold = cache_threshold
+        self.cache_radius = cache_radius
+        self.max_expansions = max_expansions
+        self.tolerance = tolerance
+        self.region_map = region_map
+        self._requests: Dict[Node, int] = dict()
+        self._trees: "OrderedDict[Node, Dict[Node, Node]]" = OrderedDict()
+
+    def find_path(
+        self, start: geometry.Point, goal: geometry.Point
+    ) -> Optional[List[geometry.Point]]:
+        """
+        Returns waypoints leading from `start` to `goal` (both included) or `None` if the goal is
+        unreachable. Only points where the path turns are returned.
+        """
+
+        if self.region_map is not None and not self.region_map.are_connected(start, goal):
+            return None
+
+        nodes = self.find_nodes(self.grid.node_at(start), self.grid.node_at(goal))
+        if nodes is None:
+            return None
+
+        waypoints = [start]
+        waypoints.extend(self.grid.point_of(node) for node in self._compact(nodes)[1:-1])
+        waypoints.append(goal)
+        return waypoints
+
+    def find_nodes(self, start: Node, goal: Node) -> Optional[List[Node]]:
+        """Returns all the grid nodes on the cheapest path from `start` to `goal`."""
+
+        tree = self._trees.get(goal, None)
+        if tree is None:
+            if len(self._requests) > _MAX_TRACKED_REQUESTS:
+                self._requests.clear()
+            count = self._requests.get(goal, 0) + 1
+            self._requests[goal] = count
+            if count >= self.cache_threshold:
+                tree = self._build_tree(goal)
+
+        if tree is not None:
+            self._trees.move_to_end(goal)
+            if start in tree or self.cache_radius is None:
+                return self._follow(tree, start, goal)
+
+        return self._search(start, goal)
+
+    def _search(self, start: Node, goal: Node) -> Optional[List[Node]]:
+        grid = self.grid
+        goal_vector = grid.vector_of(goal)
+        radius = grid.radius
+
+        costs: Dict[Node, float] = {start: 0.0}
+        parents: Dict[Node, Node] = dict()
+        queue: List[Tuple[float, float, Node]] = [(0.0, 0.0, start)]
+        expansions = 0
+        while len(queue) > 0:
+            _, cost, node = heapq.heappop(queue)
+            if node == goal:
+                return self._unwind(parents, start, goal)
+            if cost > costs[node]:
+                continue
+
+            expansions += 1
+            if expansions > self.max_expansions:
+                return None
+
+            for neighbour, step in grid.neighbours(node):
+                new_cost = cost + step
+                if new_cost < costs.get(neighbour, float("inf")):
+                    costs[neighbour] = new_cost
+                    parents[neighbour] = node
+                    estimate = new_cost + _arc(grid.vector_of(neighbour), goal_vector) * radius
+                    heapq.heappush(queue, (estimate, new_cost, neighbour))
+
+        return None
+
+    def _build_tree(self, goal: Node) -> Dict[Node, Node]:
+        """Computes for every node from which the goal is reachable the next node on the cheapest
+        path towards the goal."""
+
+        grid = self.grid
+        goal_vector = grid.vector_of(goal)
+        limit = self.cache_radius / grid.radius if self.cache_radius is not None else None
+        costs: Dict[Node, float] = {goal: 0.0}
+        tree: Dict[Node, Node] = {goal: goal}
+        queue: List[Tuple[float, Node]] = [(0.0, goal)]
+        while len(queue) > 0:
+            cost, node = heapq.heappop(queue)
+            if cost > costs[node]:
+                continue
+
+            for neighbour, _ in grid.neighbours(node):
+                if limit is not None and _arc(grid.vector_of(neighbour), goal_vector) > limit:
+                    continue
+
+                step = grid.cost(neighbour, node)
+                if step is None:
+                    continue
+
+                new_cost = cost + step
+                if new_cost < costs.get(neighbour, float("inf")):
+                    costs[neighbour] = new_cost
+                    tree[neighbour] = node
+                    heapq.heappush(queue, (new_cost, neighbour))
+
+        self._trees[goal] = tree
+        while len(self._trees) > self.cache_size:
+            evicted, _ = self._trees.popitem(last=False)
+            self._requests.pop(evicted, None)
+        return tree
+
+    @staticmethod
+    def _follow(tree: Dict[Node, Node], start: Node, goal: Node) -> Optional[List[Node]]:
+        if start not in tree:
+            return None
+
+        result = [start]
+        node = start
+        while node != goal:
+            node = tree[node]
+            result.append(node)
+        return result
+
+    @staticmethod
+    def _unwind(parents: Dict[Node, Node], start: Node, goal: Node) -> List[Node]:
+        result = [goal]
+        node = goal
+        while node != start:
+            node = parents[node]
+            result.append(node)
+        result.reverse()
+        return result
+
+    def _compact(self, nodes: List[Node]) -> List[Node]:
+        """Drops nodes lying, within the tolerance, on the great circle between the last kept
+        waypoint and the following node."""
+
+        if len(nodes) < 3:
+            return nodes
+
+        grid = self.grid
+        limit = self.tolerance * 2.0 / grid.resolution
+        result = [nodes[0]]
+        for k in range(1, len(nodes) - 1):
+            a = grid.vector_of(result[-1])
+            b = grid.vector_of(nodes[k])
+            c = grid.vector_of(nodes[k + 1])
+            nx = a[1] * c[2] - a[2] * c[1]
+            ny = a[2] * c[0] - a[0] * c[2]
+            nz = a[0] * c[1] - a[1] * c[0]
+            length = sqrt(nx * nx + ny * ny + nz * nz)
+            if length == 0.0 or abs(b[0] * nx + b[1] * ny + b[2] * nz) / length > limit:
+                result.append(nodes[k])
+        result.append(nodes[-1])
+        return result
@@ -0,0 +1,107 @@
+# This file provides dead reckoning - tracking of what clients predict about positions of moving
+# actors so that position updates are sent only when the prediction drifts too far from the truth.
+
+from dataclasses import dataclass
+
+from typing import Dict, List, Optional
+
+from . import actions, defs, geometry
+
+
+@dataclass
+class _Prediction:
+    """State from which a client extrapolates the position of a single actor.
+
+    The client is assumed to place the actor at `position` when it receives a `LocalizationAction`
+    and to move it with `speed` along `bearing` for `duration` seconds after it receives a
+    `MotionAction`."""
+
+    time: float
+    position: geometry.Point
+    start: float
+    speed: float
+    bearing: float
+    duration: float
+
+    def extrapolate(self, time: float, radius: float) -> geometry.Point:
+        """Returns the position the client displays at the given time."""
+
+        begin = max(self.time, self.start)
+        end = min(time, self.start + self.duration)
+        if self.speed == 0.0 or end <= begin:
+            return self.position
+        return self.position.moved_by(self.speed * (end - begin), self.bearing, radius)
+
+    def is_moving_like(self, time: float, speed: float, bearing: float) -> bool:
+        """Checks if the client still moves the actor with the given speed and bearing."""
+
+        active = self.start <= time < self.start + self.duration
+        client_speed = self.speed if active else 0.0
+        if client_speed == 0.0 or speed == 0.0:
+            return client_speed == speed
+        return client_speed == speed and self.bearing == bearing
+
+
+class DeadReckoning:
+    """
+    Models what a single client predicts about the positions of actors it was informed about.
+
+    The server should keep one instance per connected client and pass it the true state of every
+    visible actor on every tick. Actions are returned only when the position extrapolated by the
+    client from the last `LocalizationAction` and `MotionAction` differs from the true position by
+    more than `threshold`.
+    """
+
+    def __init__(self, radius: float, threshold: float, horizon: float = 1.0) -> None:
+        """
+        `radius` is the radius of the world, `threshold` the tolerated prediction error (in the
+        same units as the radius) and `horizon` the duration of the generated `MotionAction`s.
+        """
+
+        self.radius = radius
+        self.threshold = threshold
+        self.horizon = horizon
+        self.predictions: Dict[defs.ActorId, _Prediction] = dict()
+
+    def update(
+        self,
+        actor_id: defs.ActorId,
+        time: float,
+        position: geometry.Point,
+        speed: float = 0.0,
+        bearing: float = 0.0,
+    ) -> List[actions.Action]:
+        """
+        Informs about the true state of the actor at the given time. Returns actions that need to
+        be sent to the client to correct its prediction, possibly none.
+        """
+
+        prediction = self.predictions.get(actor_id, None)
+        if prediction is not None:
+            predicted = prediction.extrapolate(time, self.radius)
+            error = predicted.great_circle_distance_to(position, self.radius)
+            if error <= self.threshold:
+                return []
+
+        result: List[actions.Action] = [actions.LocalizationAction(actor_id, position)]
+        if prediction is None or not prediction.is_moving_like(time, speed, bearing):
+            duration = self.horizon if speed != 0.0 else 0.0
+            if prediction is not None or speed != 0.0:
+                result.append(actions.MotionAction(actor_id, speed, bearing, duration))
+            self.predictions[actor_id] = _Prediction(time, position, time, speed, bearing, duration)
+        else:
+            prediction.time = time
+            prediction.position = position
+
+        return result
+
+    def predict(self, actor_id: defs.ActorId, time: float) -> Optional[geometry.Point]:
+        """Returns the position of the actor as currently predicted by the client."""
+
+        prediction = self.predictions.get(actor_id, None)
+        return prediction.extrapolate(time, self.radius) if prediction is not None else None
+
+    def forget(self, actor_id: defs.ActorId) -> None:
+        """Drops the prediction for the actor, e.g. when it got deleted or left client's view."""
+
+        self.predictions.pop(actor_id, None)
@@ -0,0 +1,95 @@
+# This file provides labelling of connected land and water regions of the terrain.
+
+from array import array
+from collections import deque
+from math import pi
+
+from typing import List
+
+from . import geometry
+
+
+class RegionMap:
+    """
+    Splits the samples of a `Heightmap` into connected regions of land (at or above `level`) and
+    water (below `level`).
+
+    Samples are connected with their neighbours in the same row and column, rows wrap around in
+    `phi` and all the samples of the first and the last row (which lie on the poles) are connected
+    with each other. Looking up the region of a point costs the same as reading a single sample.
+    """
+
+    def __init__(self, heightmap: geometry.Heightmap, level: float) -> None:
+        self.heightmap = heightmap
+        self.level = level
+        self.labels = array("i", [-1] * (heightmap.rows * heightmap.columns))
+        self.water: List[bool] = list()
+        self.sizes: List[int] = list()
+        self._label()
+
+    def get_region_count(self) -> int:
+        return len(self.sizes)
+
+    def region_at(self, point: geometry.Point) -> int:
+        """Returns the ID of the region at the sample closest to the given point."""
+
+        heightmap = self.heightmap
+        row = int(round(min(max(point.theta, 0.0), pi) * (heightmap.rows - 1) / pi))
+        column = int(round((point.phi % (2.0 * pi)) * heightmap.columns / (2.0 * pi)))
+        return self.labels[row * heightmap.columns + column % heightmap.columns]
+
+    def is_water(self, point: geometry.Point) -> bool:
+        return self.water[self.region_at(point)]
+
+    def is_region_water(self, region: int) -> bool:
+        return self.water[region]
+
+    def get_region_size(self, region: int) -> int:
+        """Returns the number of samples in the region."""
+
+        return self.sizes[region]
+
+    def are_connected(self, first: geometry.Point, second: geometry.Point) -> bool:
+        """Checks if the points lie in the same region."""
+
+        return self.region_at(first) == self.region_at(second)
+
+    def _label(self) -> None:
+        heightmap = self.heightmap
+        rows, columns = heightmap.rows, heightmap.columns
+        heights = heightmap.heights
+        labels = self.labels
+        level = self.level
+
+        for seed in range(rows * columns):
+            if labels[seed] != -1:
+                continue
+
+            region = len(self.sizes)
+            water = heights[seed] < level
+            labels[seed] = region
+            size = 0
+            queue = deque([seed])
+            while len(queue) > 0:
+                index = queue.popleft()
+                size += 1
+                row, column = divmod(index, columns)
+
+                neighbours = [
+                    row * columns + (column + 1) % columns,
+                    row * columns + (column - 1) % columns,
+                ]
+                if row > 0:
+                    neighbours.append(index - columns)
+                if row < rows - 1:
+                    neighbours.append(index + columns)
+                if (row == 0 or row == rows - 1) and column == 0:
+                    neighbours.extend(range(row * columns, (row + 1) * columns))
+
+                for neighbour in neighbours:
+                    if labels[neighbour] == -1 and (heights[neighbour] < level) == water:
+                        labels[neighbour] = region
+                        queue.append(neighbour)
+
+            self.water.append(water)
+            self.sizes.append(size)
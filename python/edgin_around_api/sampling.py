@@ -0,0 +1,90 @@
+# This file provides sampling of well spaced points on the world sphere, e.g. for placing
+# resources and NPCs at world creation.
+
+import random
+from math import acos, cos, pi, sin, sqrt
+
+from typing import List, Optional
+
+from . import geometry, spatial
+
+
+_GOLDEN_ANGLE = pi * (3.0 - sqrt(5.0))
+
+
+def fibonacci_lattice(
+    count: int, jitter: float = 0.0, seed: Optional[int] = None
+) -> List[geometry.Point]:
+    """
+    Returns `count` points spread almost uniformly over the sphere along the Fibonacci spiral.
+
+    If `jitter` is non-zero every point is moved in a random direction by up to `jitter` times the
+    average spacing of the lattice, which hides the spiral pattern.
+    """
+
+    rng = random.Random(seed)
+    spacing = sqrt(4.0 * pi / count) if count > 0 else 0.0
+    result: List[geometry.Point] = list()
+    for i in range(count):
+        y = 1.0 - (2.0 * i + 1.0) / count
+        theta = acos(y)
+        phi = (_GOLDEN_ANGLE * i) % (2.0 * pi)
+        if jitter != 0.0:
+            # Offsets in angles are scaled so that the point moves by a similar arc in all
+            # directions.
+            distance = jitter * spacing * rng.random()
+            bearing = rng.uniform(0.0, 2.0 * pi)
+            theta = min(max(theta + distance * cos(bearing), 0.0), pi)
+            phi = (phi + distance * sin(bearing) / max(sin(theta), 1e-6)) % (2.0 * pi)
+        result.append(geometry.Point(theta, phi))
+    return result
+
+
+def sample_spawn_points(
+    elevation: geometry.Elevation,
+    count: int,
+    min_separation: float,
+    min_height: Optional[float] = None,
+    max_height: Optional[float] = None,
+    seed: Optional[int] = None,
+    oversampling: int = 4,
+) -> List[geometry.Point]:
+    """
+    Returns up to `count` points at least `min_separation` apart, with the elevation (without the
+    radius) within the optional `[min_height, max_height]` band.
+
+    Candidates come from a jittered Fibonacci lattice `oversampling` times denser than needed and
+    are visited in random order, so the result resembles a Poisson-disk sample. The separation is
+    checked with a spatial index so the cost is linear in the number of candidates. A non-positive
+    `min_separation` disables the check. Fewer points are returned if the constraints can not be
+    satisfied.
+    """
+
+    rng = random.Random(seed)
+    candidates = fibonacci_lattice(oversampling * count, jitter=0.5, seed=rng.randrange(1 << 32))
+    rng.shuffle(candidates)
+
+    # Without any separation there is nothing to check and the index could not be built.
+    radius = elevation.get_radius()
+    index = spatial.ActorIndex(radius, min_separation) if min_separation > 0.0 else None
+    result: List[geometry.Point] = list()
+    for candidate in candidates:
+        if len(result) == count:
+            break
+
+        if min_height is not None or max_height is not None:
+            height = elevation.evaluate_without_radius(candidate)
+            if (min_height is not None and height < min_height) or (
+                max_height is not None and height > max_height
+            ):
+                continue
+
+        if index is not None:
+            index.insert(len(result), candidate)
+            if len(index.neighbours(len(result))) > 0:
+                index.remove(len(result))
+                continue
+
+        result.append(candidate)
+
+    return result
@@ -0,0 +1,133 @@
+# This file provides line-of-sight queries over the terrain.
+
+from dataclasses import dataclass
+from math import atan2, ceil, sqrt
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from . import geometry
+
+
+_Terrain = Union[geometry.Elevation, geometry.Heightmap]
+_Vector = Tuple[float, float, float]
+
+
+@dataclass
+class SightQuery:
+    """Asks if `target` can be seen from `observer`. Heights are given above the ground."""
+
+    observer: geometry.Point
+    target: geometry.Point
+    observer_height: float = 0.0
+    target_height: float = 0.0
+
+
+def _marching_order(count: int) -> List[int]:
+    """Returns indices `1..count-1` ordered coarse to fine (middle first, then quarters, etc.) so
+    that obstacles in the middle of the ray, which are the most likely ones, are found early."""
+
+    order: List[int] = list()
+    stride = 1
+    while stride < count:
+        stride *= 2
+    while stride > 1:
+        half = stride // 2
+        order.extend(range(half, count, stride))
+        stride = half
+    return order
+
+
+class LineOfSight:
+    """
+    Answers line-of-sight queries by marching along straight rays between observers and targets.
+
+    Rays are sampled at steps of roughly `step` (in the units of the world radius) along the great
+    circle arc below them and marching stops at the first sample below the terrain. The terrain is
+    either the exact `Elevation` or a precomputed `Heightmap`. If the latter is used, rays staying
+    entirely above its highest point are accepted without marching.
+    """
+
+    def __init__(
+        self,
+        elevation: geometry.Elevation,
+        step: float,
+        heightmap: Optional[geometry.Heightmap] = None,
+    ) -> None:
+        self.radius = elevation.get_radius()
+        self.step = step
+        self.terrain: _Terrain = heightmap if heightmap is not None else elevation
+        self.ceiling = self.radius + heightmap.max_height if heightmap is not None else None
+        self._evaluate: Callable[[float, float], float] = (
+            heightmap.evaluate_spherical
+            if heightmap is not None
+            else lambda theta, phi: elevation.evaluate_without_radius(geometry.Point(theta, phi))
+        )
+        self._orders: Dict[int, List[int]] = dict()
+
+    def is_visible(self, query: SightQuery) -> bool:
+        return self.check([query])[0]
+
+    def check(self, queries: Iterable[SightQuery]) -> List[bool]:
+        """Answers many queries at once. Ground level at the endpoints is evaluated only once per
+        distinct point, so queries sharing an observer are cheaper."""
+
+        # Keeping the queries alive guarantees that the IDs of their points stay unique.
+        queries = list(queries)
+        grounds: Dict[int, Tuple[_Vector, float]] = dict()
+        return [self._check(query, grounds) for query in queries]
+
+    def _check(self, query: SightQuery, grounds: Dict[int, Tuple[_Vector, float]]) -> bool:
+        observer, observer_ground = self._ground(query.observer, grounds)
+        target, target_ground = self._ground(query.target, grounds)
+
+        ar = observer_ground + query.observer_height
+        br = target_ground + query.target_height
+        ax, ay, az = observer[0] * ar, observer[1] * ar, observer[2] * ar
+        dx, dy, dz = target[0] * br - ax, target[1] * br - ay, target[2] * br - az
+
+        if self.ceiling is not None and self._lowest(ax, ay, az, dx, dy, dz) >= self.ceiling:
+            return True
+
+        chord = sqrt(
+            (observer[0] - target[0]) ** 2
+            + (observer[1] - target[1]) ** 2
+            + (observer[2] - target[2]) ** 2
+        )
+        count = int(ceil(chord * self.radius / self.step))
+        if count < 2:
+            return True
+
+        order = self._orders.get(count, None)
+        if order is None:
+            order = _marching_order(count)
+            self._orders[count] = order
+
+        evaluate = self._evaluate
+        radius = self.radius
+        for i in order:
+            s = i / count
+            x, y, z = ax + s * dx, ay + s * dy, az + s * dz
+            xz = sqrt(x * x + z * z)
+            if sqrt(xz * xz + y * y) - radius < evaluate(atan2(xz, y), atan2(x, z)):
+                return False
+
+        return True
+
+    def _ground(
+        self, point: geometry.Point, grounds: Dict[int, Tuple[_Vector, float]]
+    ) -> Tuple[_Vector, float]:
+        ground = grounds.get(id(point), None)
+        if ground is None:
+            vector = geometry.Coordinates.spherical_to_cartesian(1.0, point.theta, point.phi)
+            ground = (vector, self.terrain.evaluate_with_radius(point))
+            grounds[id(point)] = ground
+        return ground
+
+    @staticmethod
+    def _lowest(ax: float, ay: float, az: float, dx: float, dy: float, dz: float) -> float:
+        """Returns the distance from the center of the world to the closest point of the segment
+        starting at `a` with direction `d`."""
+
+        dd = dx * dx + dy * dy + dz * dz
+        s = min(max(-(ax * dx + ay * dy + az * dz) / dd, 0.0), 1.0) if dd > 0.0 else 0.0
+        return sqrt((ax + s * dx) ** 2 + (ay + s * dy) ** 2 + (az + s * dz) ** 2)
@@ -0,0 +1,244 @@
+# This file provides spatial indexing of actors on the surface of the world sphere.
+
+from math import ceil, cos, floor, pi, sin, sqrt
+
+from typing import Dict, Iterable, List, Set, Tuple
+
+from . import defs, geometry
+
+
+_Vector = Tuple[float, float, float]
+_Cell = Tuple[int, int, int]
+
+_NEIGHBOUR_OFFSETS: List[_Cell] = [
+    (dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+]
+
+
+def _to_vector(point: geometry.Point) -> _Vector:
+    return geometry.Coordinates.spherical_to_cartesian(1.0, point.theta, point.phi)
+
+
+def _chord(distance: float, radius: float) -> float:
+    """Converts a great circle distance to a length of a chord on the unit sphere."""
+
+    return 2.0 * sin(0.5 * min(distance / radius, pi))
+
+
+class ActorIndex:
+    """
+    Spatial hash of actor positions keeping track of all pairs of actors closer to each other than
+    `distance`.
+
+    Positions are stored as unit vectors and hashed into a uniform 3D grid with cell size equal to
+    the chord corresponding to `distance`, so every close pair lies in neighbouring cells and the
+    great circle distance can be compared via the squared chord length without any trigonometry.
+    Moving an actor updates only its own cell and its own pairs, so the cost of a tick is
+    proportional to the number of actors that moved.
+    """
+
+    def __init__(self, radius: float, distance: float) -> None:
+        self.radius = radius
+        self.distance = distance
+        self._cell_size = _chord(distance, radius)
+        self._chord_sq = self._cell_size * self._cell_size
+        self._vectors: Dict[defs.ActorId, _Vector] = dict()
+        self._cells: Dict[_Cell, Set[defs.ActorId]] = dict()
+        self._actor_cells: Dict[defs.ActorId, _Cell] = dict()
+        self._neighbours: Dict[defs.ActorId, Set[defs.ActorId]] = dict()
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def __contains__(self, actor_id: defs.ActorId) -> bool:
+        return actor_id in self._vectors
+
+    def insert(self, actor_id: defs.ActorId, position: geometry.Point) -> None:
+        """Adds the actor to the index or updates its position if it is already indexed."""
+
+        if actor_id in self._vectors:
+            self.move(actor_id, position)
+            return
+
+        vector = _to_vector(position)
+        cell = self._cell_of(vector)
+        self._vectors[actor_id] = vector
+        self._actor_cells[actor_id] = cell
+        self._cells.setdefault(cell, set()).add(actor_id)
+        self._neighbours[actor_id] = set()
+        self._connect(actor_id, vector, cell)
+
+    def insert_many(self, positions: Iterable[Tuple[defs.ActorId, geometry.Point]]) -> None:
+        for actor_id, position in positions:
+            self.insert(actor_id, position)
+
+    def move(self, actor_id: defs.ActorId, position: geometry.Point) -> None:
+        """Updates the position of an already indexed actor."""
+
+        vector = _to_vector(position)
+        cell = self._cell_of(vector)
+        old_cell = self._actor_cells[actor_id]
+        if cell != old_cell:
+            self._remove_from_cell(actor_id, old_cell)
+            self._cells.setdefault(cell, set()).add(actor_id)
+            self._actor_cells[actor_id] = cell
+
+        self._vectors[actor_id] = vector
+        self._disconnect(actor_id)
+        self._connect(actor_id, vector, cell)
+
+    def remove(self, actor_id: defs.ActorId) -> None:
+        if actor_id not in self._vectors:
+            return
+
+        self._disconnect(actor_id)
+        self._remove_from_cell(actor_id, self._actor_cells.pop(actor_id))
+        del self._vectors[actor_id]
+        del self._neighbours[actor_id]
+
+    def neighbours(self, actor_id: defs.ActorId) -> Set[defs.ActorId]:
+        """Returns IDs of all actors closer to the given one than `distance`."""
+
+        return set(self._neighbours.get(actor_id, ()))
+
+    def pairs(self) -> List[Tuple[defs.ActorId, defs.ActorId]]:
+        """Returns all pairs of actors closer to each other than `distance`. The smaller ID is
+        always the first in the pair."""
+
+        return [
+            (actor_id, other)
+            for actor_id, others in self._neighbours.items()
+            for other in others
+            if actor_id < other
+        ]
+
+    def within(self, center: geometry.Point, distance: float) -> List[defs.ActorId]:
+        """Returns IDs of all actors not farther from `center` than `distance`."""
+
+        return self.cone(center, 0.0, pi, 0.0, distance)
+
+    def annulus(self, center: geometry.Point, inner: float, outer: float) -> List[defs.ActorId]:
+        """Returns IDs of all actors with distance from `center` between `inner` and `outer`."""
+
+        return self.cone(center, 0.0, pi, inner, outer)
+
+    def sector(
+        self, center: geometry.Point, bearing: float, half_angle: float, distance: float
+    ) -> List[defs.ActorId]:
+        """Returns IDs of all actors not farther from `center` than `distance` and with bearing
+        from `center` differing from `bearing` by at most `half_angle`."""
+
+        return self.cone(center, bearing, half_angle, 0.0, distance)
+
+    def cone(
+        self,
+        center: geometry.Point,
+        bearing: float,
+        half_angle: float,
+        inner: float,
+        outer: float,
+    ) -> List[defs.ActorId]:
+        """
+        Returns IDs of all actors with distance from `center` between `inner` and `outer` and with
+        bearing from `center` differing from `bearing` by at most `half_angle`.
+
+        Candidates are first taken only from cells close enough to `center`, then filtered by the
+        chord length and only then by the bearing. The bearing test compares the direction to the
+        candidate projected on the tangent plane with the requested direction, so it does not need
+        any trigonometry per candidate. An actor exactly at `center` has no bearing and is returned
+        only if `half_angle` is at least `pi`.
+        """
+
+        c = _to_vector(center)
+        low = _chord(inner, self.radius) if inner > 0.0 else 0.0
+        high = _chord(outer, self.radius)
+        low_sq, high_sq = low * low, high * high
+
+        full_circle = half_angle >= pi
+        if not full_circle:
+            # Direction of the bearing in the tangent plane: `cos(bearing) * north +
+            # sin(bearing) * east`
+            sin_theta, cos_theta = sin(center.theta), cos(center.theta)
+            sin_phi, cos_phi = sin(center.phi), cos(center.phi)
+            sin_bearing, cos_bearing = sin(bearing), cos(bearing)
+            fx = -cos_bearing * cos_theta * sin_phi + sin_bearing * cos_phi
+            fy = cos_bearing * sin_theta
+            fz = -cos_bearing * cos_theta * cos_phi - sin_bearing * sin_phi
+            cos_half_angle = cos(half_angle)
+
+        result: List[defs.ActorId] = list()
+        for members in self._cells_near(c, high):
+            for actor_id in members:
+                x, y, z = self._vectors[actor_id]
+                chord_sq = (x - c[0]) ** 2 + (y - c[1]) ** 2 + (z - c[2]) ** 2
+                if chord_sq < low_sq or chord_sq > high_sq:
+                    continue
+
+                if not full_circle:
+                    dot = x * c[0] + y * c[1] + z * c[2]
+                    tx, ty, tz = x - dot * c[0], y - dot * c[1], z - dot * c[2]
+                    length = sqrt(tx * tx + ty * ty + tz * tz)
+                    if length == 0.0 or tx * fx + ty * fy + tz * fz < length * cos_half_angle:
+                        continue
+
+                result.append(actor_id)
+        return result
+
+    def _cells_near(self, vector: _Vector, chord: float) -> List[Set[defs.ActorId]]:
+        """Returns members of all the cells that may contain actors closer to `vector` than
+        `chord`."""
+
+        size = self._cell_size
+        cx, cy, cz = self._cell_of(vector)
+        reach = int(ceil(chord / size))
+        if (2 * reach + 1) ** 3 <= len(self._cells):
+            cells = self._cells
+            result: List[Set[defs.ActorId]] = list()
+            for dx in range(-reach, reach + 1):
+                for dy in range(-reach, reach + 1):
+                    for dz in range(-reach, reach + 1):
+                        members = cells.get((cx + dx, cy + dy, cz + dz), None)
+                        if members is not None:
+                            result.append(members)
+            return result
+        else:
+            return [
+                members
+                for (x, y, z), members in self._cells.items()
+                if abs(x - cx) <= reach and abs(y - cy) <= reach and abs(z - cz) <= reach
+            ]
+
+    def _cell_of(self, vector: _Vector) -> _Cell:
+        size = self._cell_size
+        return (floor(vector[0] / size), floor(vector[1] / size), floor(vector[2] / size))
+
+    def _remove_from_cell(self, actor_id: defs.ActorId, cell: _Cell) -> None:
+        members = self._cells[cell]
+        members.discard(actor_id)
+        if len(members) == 0:
+            del self._cells[cell]
+
+    def _connect(self, actor_id: defs.ActorId, vector: _Vector, cell: _Cell) -> None:
+        x, y, z = vector
+        cx, cy, cz = cell
+        chord_sq = self._chord_sq
+        neighbours = self._neighbours[actor_id]
+        for dx, dy, dz in _NEIGHBOUR_OFFSETS:
+            members = self._cells.get((cx + dx, cy + dy, cz + dz), None)
+            if members is None:
+                continue
+
+            for other in members:
+                if other == actor_id:
+                    continue
+
+                ox, oy, oz = self._vectors[other]
+                if (x - ox) ** 2 + (y - oy) ** 2 + (z - oz) ** 2 <= chord_sq:
+                    neighbours.add(other)
+                    self._neighbours[other].add(actor_id)
+
+    def _disconnect(self, actor_id: defs.ActorId) -> None:
+        neighbours = self._neighbours[actor_id]
+        for other in neighbours:
+            self._neighbours[other].discard(actor_id)
+        neighbours.clear()
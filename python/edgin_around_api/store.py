@@ -0,0 +1,264 @@
+# This file provides compact storage of inventories of many actors.
+
+from array import array
+
+from typing import Dict, Iterable, List, Optional, Set
+
+from . import craft, defs, inventory
+
+
+# Both hands followed by the pockets.
+SLOTS_PER_OWNER = defs.INVENTORY_SIZE + 2
+
+_ESSENCES = list(craft.Essence)
+_ESSENCE_CODES = {essence: code for code, essence in enumerate(_ESSENCES)}
+_EMPTY = defs.UNASSIGNED_ACTOR_ID
+
+
+def _column(typecode: str, size: int, value: int = 0) -> array:
+    return array(typecode, [value]) * size
+
+
+def _slot_offset(slot: inventory.Slot) -> int:
+    if slot == defs.Hand.LEFT:
+        return 0
+    elif slot == defs.Hand.RIGHT:
+        return 1
+    else:
+        assert isinstance(slot, int)
+        return slot + 2
+
+
+class StaleViewError(Exception):
+    """Raised when an `InventoryView` is used after its owner was removed from the store."""
+
+
+class InventoryStore:
+    """
+    Inventories of many owners kept as a struct of arrays instead of `EntityInfo` objects.
+
+    Every field of the entries is stored in its own typed array, indexed by
+    `row * SLOTS_PER_OWNER + slot`, where every owner gets a row. Codenames are interned in a table.
+    An entry of a few dozen bytes replaces a dataclass instance with its dictionary. Entries are
+    turned into `EntityInfo`s only when read through an `InventoryView`.
+
+    Rows of removed owners are reused. Every row has a generation incremented on removal, so views
+    of removed owners raise `StaleViewError` instead of accessing the inventory of the next owner.
+    """
+
+    def __init__(self) -> None:
+        self.ids = array("q")
+        self.essences = array("B")
+        self.quantities = array("i")
+        self.item_volumes = array("i")
+        self.max_volumes = array("i")
+        self.codenames = array("I")
+        self._codename_table: List[str] = list()
+        self._codename_codes: Dict[str, int] = dict()
+        self._rows: Dict[defs.ActorId, int] = dict()
+        self._free_rows: List[int] = list()
+        self._generations: List[int] = list()
+
+    def get_owner_count(self) -> int:
+        return len(self._rows)
+
+    def add_owner(self, owner_id: defs.ActorId) -> "InventoryView":
+        """Returns the view of the owner's inventory, adding an empty one if needed."""
+
+        row = self._rows.get(owner_id, None)
+        if row is None:
+            if len(self._free_rows) > 0:
+                row = self._free_rows.pop()
+            else:
+                row = len(self.ids) // SLOTS_PER_OWNER
+                self.ids.extend(_column("q", SLOTS_PER_OWNER, _EMPTY))
+                self.essences.extend(_column("B", SLOTS_PER_OWNER))
+                self.quantities.extend(_column("i", SLOTS_PER_OWNER))
+                self.item_volumes.extend(_column("i", SLOTS_PER_OWNER))
+                self.max_volumes.extend(_column("i", SLOTS_PER_OWNER))
+                self.codenames.extend(_column("I", SLOTS_PER_OWNER))
+                self._generations.append(0)
+            self._rows[owner_id] = row
+        return InventoryView(self, row)
+
+    def remove_owner(self, owner_id: defs.ActorId) -> None:
+        row = self._rows.pop(owner_id, None)
+        if row is not None:
+            for offset in range(SLOTS_PER_OWNER):
+                self.ids[row * SLOTS_PER_OWNER + offset] = _EMPTY
+            self._generations[row] += 1
+            self._free_rows.append(row)
+
+    def get(self, owner_id: defs.ActorId) -> Optional["InventoryView"]:
+        row = self._rows.get(owner_id, None)
+        return InventoryView(self, row) if row is not None else None
+
+    def load(self, owner_id: defs.ActorId, inv: inventory.Inventory) -> "InventoryView":
+        """Copies the inventory into the store."""
+
+        view = self.add_owner(owner_id)
+        view.store_entry(defs.Hand.LEFT, inv.left_hand)
+        view.store_entry(defs.Hand.RIGHT, inv.right_hand)
+        for index, entry in enumerate(inv.entries):
+            view.insert_entry(index, entry)
+        return view
+
+    def aggregate_essences(self, owner_ids: Iterable[defs.ActorId]) -> Dict[craft.Essence, int]:
+        """Same as `inventory.aggregate_essences`, read directly from the columns."""
+
+        rows = (self._rows.get(owner_id, None) for owner_id in owner_ids)
+        return self._aggregate_rows(row for row in rows if row is not None)
+
+    def _aggregate_rows(self, rows: Iterable[int]) -> Dict[craft.Essence, int]:
+        totals = [0 for _ in _ESSENCES]
+        ids, essences, quantities = self.ids, self.essences, self.quantities
+        for row in rows:
+            for position in range(row * SLOTS_PER_OWNER, (row + 1) * SLOTS_PER_OWNER):
+                if ids[position] != _EMPTY:
+                    totals[essences[position]] += quantities[position]
+        return {_ESSENCES[code]: total for code, total in enumerate(totals) if total != 0}
+
+    def read(self, position: int) -> Optional[inventory.EntityInfo]:
+        id = self.ids[position]
+        if id == _EMPTY:
+            return None
+        return inventory.EntityInfo(
+            id,
+            _ESSENCES[self.essences[position]],
+            self.quantities[position],
+            self.item_volumes[position],
+            self.max_volumes[position],
+            self._codename_table[self.codenames[position]],
+        )
+
+    def write(self, position: int, entry: Optional[inventory.EntityInfo]) -> None:
+        if entry is None:
+            self.ids[position] = _EMPTY
+            return
+
+        code = self._codename_codes.get(entry.codename, None)
+        if code is None:
+            code = len(self._codename_table)
+            self._codename_table.append(entry.codename)
+            self._codename_codes[entry.codename] = code
+
+        self.ids[position] = entry.id
+        self.essences[position] = _ESSENCE_CODES[entry.essence]
+        self.quantities[position] = entry.current_quantity
+        self.item_volumes[position] = entry.item_volume
+        self.max_volumes[position] = entry.max_volume
+        self.codenames[position] = code
+
+
+class InventoryView:
+    """
+    Projection of the inventory of a single owner in an `InventoryStore`.
+
+    It is not a full replacement of `Inventory`. It supports reading the entries (including
+    serialisation with `Inventory.Schema`), the item sources of the crafting queries in `craft`
+    (`craft.ItemSource`) and only the modifications defined here. It has no fingerprint, version,
+    listeners, cached views or stack operations, so e.g. `crafting.CraftableCache` or
+    `transactions.Transaction` require converting it with `to_inventory` first.
+
+    A view must not outlive its owner. After `InventoryStore.remove_owner` every access raises
+    `StaleViewError`, even if the row was given to another owner.
+    """
+
+    def __init__(self, store: InventoryStore, row: int) -> None:
+        self.store = store
+        self.row = row
+        self.generation = store._generations[row]
+
+    @property
+    def _base(self) -> int:
+        if self.store._generations[self.row] != self.generation:
+            raise StaleViewError(f"The owner of row {self.row} was removed from the store")
+        return self.row * SLOTS_PER_OWNER
+
+    @property
+    def left_hand(self) -> Optional[inventory.EntityInfo]:
+        return self.store.read(self._base)
+
+    @property
+    def right_hand(self) -> Optional[inventory.EntityInfo]:
+        return self.store.read(self._base + 1)
+
+    @property
+    def entries(self) -> List[Optional[inventory.EntityInfo]]:
+        return [self.store.read(self._base + 2 + i) for i in range(defs.INVENTORY_SIZE)]
+
+    def get_hand(self, hand: defs.Hand) -> Optional[defs.ActorId]:
+        id = self.store.ids[self._base + _slot_offset(hand)]
+        return id if id != _EMPTY else None
+
+    def get_hand_entry(self, hand: defs.Hand) -> Optional[inventory.EntityInfo]:
+        return self.store.read(self._base + _slot_offset(hand))
+
+    def get_pocket(self, index: int) -> Optional[defs.ActorId]:
+        if not self.is_index_valid(index):
+            return None
+        id = self.store.ids[self._base + 2 + index]
+        return id if id != _EMPTY else None
+
+    def get_pocket_entry(self, index: int) -> Optional[inventory.EntityInfo]:
+        return self.store.read(self._base + 2 + index) if self.is_index_valid(index) else None
+
+    def get_all_ids(self) -> List[defs.ActorId]:
+        ids = self.store.ids[self._base : self._base + SLOTS_PER_OWNER]
+        return [id for id in ids if id != _EMPTY]
+
+    def store_entry(self, hand: defs.Hand, entry: Optional[inventory.EntityInfo]) -> None:
+        if hand == defs.Hand.LEFT or hand == defs.Hand.RIGHT:
+            self.store.write(self._base + _slot_offset(hand), entry)
+
+    def insert_entry(self, index: int, entry: Optional[inventory.EntityInfo]) -> None:
+        if self.is_index_valid(index):
+            self.store.write(self._base + 2 + index, entry)
+
+    def swap(self, hand: defs.Hand, index: int) -> None:
+        if self.is_index_valid(index) and (hand == defs.Hand.LEFT or hand == defs.Hand.RIGHT):
+            pocket = self.get_pocket_entry(index)
+            self.insert_entry(index, self.get_hand_entry(hand))
+            self.store_entry(hand, pocket)
+
+    def find_entity_with_entity_id(self, entity_id: defs.ActorId) -> Optional[inventory.EntityInfo]:
+        position = self._find(entity_id)
+        return self.store.read(position) if position is not None else None
+
+    def remove_with_entity_id(self, entity_id: defs.ActorId) -> None:
+        position = self._find(entity_id)
+        if position is not None:
+            self.store.write(position, None)
+
+    def to_items(self) -> Set[craft.Item]:
+        store = self.store
+        result: Set[craft.Item] = set()
+        for position in range(self._base, self._base + SLOTS_PER_OWNER):
+            id = store.ids[position]
+            if id != _EMPTY:
+                essence = _ESSENCES[store.essences[position]]
+                result.add(craft.Item(id, essence, store.quantities[position]))
+        return result
+
+    def get_essence_histogram(self) -> Dict[craft.Essence, int]:
+        return self.store._aggregate_rows([self._base // SLOTS_PER_OWNER])
+
+    def to_inventory(self) -> inventory.Inventory:
+        """Returns a standalone copy of the inventory."""
+
+        result = inventory.Inventory()
+        result.store_entry(defs.Hand.LEFT, self.left_hand)
+        result.store_entry(defs.Hand.RIGHT, self.right_hand)
+        for index, entry in enumerate(self.entries):
+            result.insert_entry(index, entry)
+        return result
+
+    def is_index_valid(self, index: int) -> bool:
+        return -1 < index and index < defs.INVENTORY_SIZE
+
+    def _find(self, entity_id: defs.ActorId) -> Optional[int]:
+        ids = self.store.ids
+        for position in range(self._base, self._base + SLOTS_PER_OWNER):
+            if ids[position] == entity_id:
+                return position
+        return None
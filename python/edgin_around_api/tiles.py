@@ -0,0 +1,227 @@
+# This file provides generation of terrain heightfield tiles so that clients do not need to
+# evaluate the elevation function themselves.
+#
+# The sphere is covered by the six faces of a cube-sphere. On level of detail `L` every face is
+# split into `2^L x 2^L` tiles and every tile holds `(size + 1) x (size + 1)` heights sampled on a
+# regular grid of the face, so neighbouring tiles share their edge samples.
+
+import hashlib, json
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import dataclass
+
+import marshmallow
+from marshmallow import fields as mf
+
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from . import geometry
+
+
+# Identifies a tile by its face, level of detail and column and row on the face.
+TileKey = Tuple[int, int, int, int]
+
+
+@dataclass
+class Tile:
+    """Heights (without the radius) of the terrain in one tile, stored row by row."""
+
+    fingerprint: str
+    face: int
+    level: int
+    x: int
+    y: int
+    size: int
+    heights: List[float]
+
+    class Schema(marshmallow.Schema):
+        fingerprint = mf.Str()
+        face = mf.Integer()
+        level = mf.Integer()
+        x = mf.Integer()
+        y = mf.Integer()
+        size = mf.Integer()
+        heights = mf.List(mf.Float())
+
+        @marshmallow.post_load
+        def make(self, data, **kwargs):
+            return Tile(**data)
+
+    def get_key(self) -> TileKey:
+        return (self.face, self.level, self.x, self.y)
+
+    def get_height(self, column: int, row: int) -> float:
+        return self.heights[row * (self.size + 1) + column]
+
+
+def terrain_fingerprint(elevation: geometry.Elevation) -> str:
+    """Returns a digest of the elevation function. Equal terrains have equal fingerprints."""
+
+    data = geometry.Elevation.Schema().dump(elevation)
+    string = json.dumps(data, sort_keys=True)
+    return hashlib.sha1(string.encode()).hexdigest()
+
+
+def tile_keys(level: int) -> List[TileKey]:
+    """Returns keys of all the tiles on the given level of detail."""
+
+    count = 1 << level
+    return [
+        (face, level, x, y)
+        for face in range(geometry.CUBE_FACE_COUNT)
+        for y in range(count)
+        for x in range(count)
+    ]
+
+
+def tile_center(key: TileKey) -> geometry.Point:
+    face, level, x, y = key
+    step = 2.0 / (1 << level)
+    vector = geometry.Coordinates.cube_to_cartesian(
+        face, -1.0 + (x + 0.5) * step, -1.0 + (y + 0.5) * step
+    )
+    r, theta, phi = geometry.Coordinates.cartesian_to_spherical(*vector)
+    return geometry.Point(theta, phi)
+
+
+def generate_tile(elevation: geometry.Elevation, fingerprint: str, key: TileKey, size: int) -> Tile:
+    """Samples the elevation function over the given tile."""
+
+    face, level, x, y = key
+    step = 2.0 / (1 << level)
+    u0 = -1.0 + x * step
+    v0 = -1.0 + y * step
+
+    heights: List[float] = list()
+    for row in range(size + 1):
+        v = v0 + step * row / size
+        for column in range(size + 1):
+            u = u0 + step * column / size
+            vector = geometry.Coordinates.cube_to_cartesian(face, u, v)
+            r, theta, phi = geometry.Coordinates.cartesian_to_spherical(*vector)
+            heights.append(elevation.evaluate_without_radius(geometry.Point(theta, phi)))
+
+    return Tile(fingerprint, face, level, x, y, size, heights)
+
+
+_worker_elevation: Optional[geometry.Elevation] = None
+
+
+def _init_worker(elevation: geometry.Elevation) -> None:
+    global _worker_elevation
+    _worker_elevation = elevation
+
+
+def _generate_in_worker(fingerprint: str, key: TileKey, size: int) -> Tile:
+    assert _worker_elevation is not None
+    return generate_tile(_worker_elevation, fingerprint, key, size)
+
+
+class TileCache:
+    """Stores generated tiles by terrain fingerprint. May be shared by many `TileGenerator`s so
+    worlds with identical terrain reuse each others tiles."""
+
+    def __init__(self) -> None:
+        self.tiles: Dict[Tuple[str, int, TileKey], Tile] = dict()
+
+    def get(self, fingerprint: str, size: int, key: TileKey) -> Optional[Tile]:
+        return self.tiles.get((fingerprint, size, key), None)
+
+    def put(self, tile: Tile) -> None:
+        self.tiles[(tile.fingerprint, tile.size, tile.get_key())] = tile
+
+    def drop(self, fingerprint: str) -> None:
+        """Removes all the tiles of the given terrain."""
+
+        self.tiles = {k: v for k, v in self.tiles.items() if k[0] != fingerprint}
+
+
+class TileGenerator:
+    """
+    Generates terrain tiles for the given elevation function.
+
+    Missing tiles are generated in parallel in a process pool. If `workers` is zero tiles are
+    generated in the calling process. The generator should be closed after use to shut down the
+    pool.
+    """
+
+    def __init__(
+        self,
+        elevation: geometry.Elevation,
+        size: int = 16,
+        workers: Optional[int] = None,
+        cache: Optional[TileCache] = None,
+    ) -> None:
+        self.elevation = elevation
+        self.size = size
+        self.workers = workers
+        self.cache = cache if cache is not None else TileCache()
+        self.fingerprint = terrain_fingerprint(elevation)
+        self._executor: Optional[Executor] = None
+
+    def __enter__(self) -> "TileGenerator":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def get_tile(self, key: TileKey) -> Tile:
+        """Returns the tile from the cache, generating it in place if needed."""
+
+        tile = self.cache.get(self.fingerprint, self.size, key)
+        if tile is None:
+            tile = generate_tile(self.elevation, self.fingerprint, key, self.size)
+            self.cache.put(tile)
+        return tile
+
+    def stream(
+        self,
+        viewpoint: geometry.Point,
+        level: int,
+        max_distance: Optional[float] = None,
+    ) -> Iterator[Tile]:
+        """
+        Yields tiles of the given level of detail ordered by the distance of their centers from
+        the viewpoint. If `max_distance` (in radians) is given farther tiles are skipped. Cached
+        tiles are yielded right away while missing ones are being generated.
+        """
+
+        ordered: List[Tuple[float, TileKey]] = list()
+        for key in tile_keys(level):
+            distance = viewpoint.great_circle_distance_to(tile_center(key), 1.0)
+            if max_distance is None or distance <= max_distance:
+                ordered.append((distance, key))
+        ordered.sort()
+
+        missing = [
+            key for _, key in ordered if self.cache.get(self.fingerprint, self.size, key) is None
+        ]
+        futures = self._submit(missing)
+
+        for _, key in ordered:
+            future = futures.get(key, None)
+            if future is not None:
+                tile = future.result()
+                self.cache.put(tile)
+                yield tile
+            else:
+                yield self.get_tile(key)
+
+    def _submit(self, keys: List[TileKey]) -> Dict[TileKey, "Future[Tile]"]:
+        if self.workers == 0 or len(keys) == 0:
+            return dict()
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.workers, initializer=_init_worker, initargs=(self.elevation,)
+            )
+
+        executor = self._executor
+        return {
+            key: executor.submit(_generate_in_worker, self.fingerprint, key, self.size)
+            for key in keys
+        }
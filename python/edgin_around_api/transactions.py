@@ -0,0 +1,211 @@
+# This file provides atomic batches of inventory operations and collection of inventory updates
+# sent to the clients.
+
+from dataclasses import dataclass
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from . import actions, defs, inventory
+
+
+@dataclass
+class Swap:
+    """Same as `Inventory.swap`."""
+
+    hand: defs.Hand
+    index: int
+
+
+@dataclass
+class Merge:
+    """Same as `Inventory.merge`. Fails if nothing can be merged."""
+
+    hand: defs.Hand
+    index: int
+
+
+@dataclass
+class Insert:
+    """Puts the entry into an empty slot. Fails if the slot is taken or the entity is already held."""
+
+    slot: inventory.Slot
+    entry: inventory.EntityInfo
+
+
+@dataclass
+class Remove:
+    """Removes the given quantity (or everything if `None`) of the entity. Fails if the entity is
+    not held in the sufficient quantity."""
+
+    entity_id: defs.ActorId
+    quantity: Optional[int] = None
+
+
+Operation = Union[Swap, Merge, Insert, Remove]
+
+
+class Transaction:
+    """
+    Applies a list of operations to an inventory atomically: if any of them fails all the changes
+    are rolled back.
+    """
+
+    def __init__(self, inv: inventory.Inventory, operations: Iterable[Operation] = ()) -> None:
+        self.inventory = inv
+        self.operations: List[Operation] = list(operations)
+        self.changed_slots: Set[inventory.Slot] = set()
+        self.failed: Optional[Operation] = None
+
+    def add(self, operation: Operation) -> None:
+        self.operations.append(operation)
+
+    def apply(self) -> bool:
+        """
+        Applies the operations in order. On success `changed_slots` holds the slots that were
+        modified. On failure the inventory is restored, the failing operation is stored in `failed`
+        and `False` is returned. If an operation raises an exception the inventory is restored
+        before it is propagated. The transaction may be applied again.
+        """
+
+        self.changed_slots = set()
+        self.failed = None
+
+        # The previous entry of every slot, in the order of changes. Entries are immutable, so
+        # keeping references is enough to restore them.
+        journal: List[Tuple[inventory.Slot, Optional[inventory.EntityInfo]]] = list()
+
+        def record(
+            slot: inventory.Slot,
+            previous: Optional[inventory.EntityInfo],
+            entry: Optional[inventory.EntityInfo],
+        ) -> None:
+            journal.append((slot, previous))
+
+        self.inventory.add_listener(record)
+        try:
+            for operation in self.operations:
+                if not self._apply(operation):
+                    self.failed = operation
+                    break
+        except Exception:
+            self.failed = operation
+            self.inventory.remove_listener(record)
+            self._rollback(journal)
+            raise
+
+        self.inventory.remove_listener(record)
+        if self.failed is not None:
+            self._rollback(journal)
+            return False
+
+        self.changed_slots = {slot for slot, _ in journal}
+        return True
+
+    def _rollback(
+        self, journal: List[Tuple[inventory.Slot, Optional[inventory.EntityInfo]]]
+    ) -> None:
+        for slot, previous in reversed(journal):
+            _set_entry(self.inventory, slot, previous)
+
+    def _apply(self, operation: Operation) -> bool:
+        inv = self.inventory
+        if isinstance(operation, Swap):
+            if not inv.is_index_valid(operation.index):
+                return False
+            inv.swap(operation.hand, operation.index)
+            return True
+
+        elif isinstance(operation, Merge):
+            return inv.merge(operation.hand, operation.index)
+
+        elif isinstance(operation, Insert):
+            slot = operation.slot
+            if isinstance(slot, int) and not inv.is_index_valid(slot):
+                return False
+            if _get_entry(inv, slot) is not None or inv.get_slot(operation.entry.id) is not None:
+                return False
+            _set_entry(inv, slot, operation.entry)
+            return True
+
+        elif isinstance(operation, Remove):
+            entry = inv.find_entity_with_entity_id(operation.entity_id)
+            if entry is None:
+                return False
+            quantity = operation.quantity
+            if quantity is None or quantity == entry.current_quantity:
+                inv.remove_with_entity_id(operation.entity_id)
+                return True
+            if quantity < 0 or entry.current_quantity < quantity:
+                return False
+            return inv.update_quantity(operation.entity_id, entry.current_quantity - quantity)
+
+        else:
+            return False
+
+
+def _get_entry(inv: inventory.Inventory, slot: inventory.Slot) -> Optional[inventory.EntityInfo]:
+    if isinstance(slot, defs.Hand):
+        return inv.get_hand_entry(slot)
+    else:
+        return inv.get_pocket_entry(slot)
+
+
+def _set_entry(
+    inv: inventory.Inventory, slot: inventory.Slot, entry: Optional[inventory.EntityInfo]
+) -> None:
+    if isinstance(slot, defs.Hand):
+        inv.store_entry(slot, entry)
+    else:
+        inv.insert_entry(slot, entry)
+
+
+class UpdateBatcher:
+    """
+    Collects changes of inventories during a tick so that exactly one `InventoryUpdateAction` is
+    sent per changed inventory.
+    """
+
+    def __init__(self) -> None:
+        self._inventories: Dict[defs.ActorId, inventory.Inventory] = dict()
+        self._slots: Dict[defs.ActorId, Set[inventory.Slot]] = dict()
+
+    def apply(
+        self,
+        owner_id: defs.ActorId,
+        inv: inventory.Inventory,
+        operations: Iterable[Operation],
+    ) -> bool:
+        """Applies the operations as one `Transaction` and marks the inventory as changed if it
+        succeeds."""
+
+        transaction = Transaction(inv, operations)
+        if not transaction.apply():
+            return False
+
+        self.mark(owner_id, inv, transaction.changed_slots)
+        return True
+
+    def mark(
+        self,
+        owner_id: defs.ActorId,
+        inv: inventory.Inventory,
+        slots: Iterable[inventory.Slot] = (),
+    ) -> None:
+        """Marks the inventory as changed, e.g. after it was modified without a transaction."""
+
+        self._inventories[owner_id] = inv
+        self._slots.setdefault(owner_id, set()).update(slots)
+
+    def get_changed_slots(self, owner_id: defs.ActorId) -> Set[inventory.Slot]:
+        return set(self._slots.get(owner_id, set()))
+
+    def flush(self) -> List[actions.InventoryUpdateAction]:
+        """Returns the updates for all the changed inventories and starts a new tick."""
+
+        result = [
+            actions.InventoryUpdateAction(owner_id, inv)
+            for owner_id, inv in self._inventories.items()
+        ]
+        self._inventories.clear()
+        self._slots.clear()
+        return result
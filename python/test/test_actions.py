@@ -1,10 +1,11 @@
 import unittest
 
 from typing import Any, Dict
+from unittest import mock
 
 from . import common
 
-from edgin_around_api import actions
+from edgin_around_api import actions, inventory
 
 
 class ActionsTest(common.SerdeTest):
@@ -47,6 +48,43 @@ class ActionsTest(common.SerdeTest):
 
         d = '{"actor_id": 0, "stats": {"hunger": 0.0, "max_hunger": 100.0}, "type": "stat_update"}'
 
+    def test_serde_compact_inventory_update(self) -> None:
+        """Prototypes should be defined before the compact inventory update referencing them."""
+
+        definition: Dict[str, Any] = {
+            "type": "prototype_definition",
+            "prototypes": [
+                {
+                    "id": 1000,
+                    "essence": "GOLD",
+                    "item_volume": 5,
+                    "max_volume": 100,
+                    "codename": "gold",
+                },
+            ],
+        }
+
+        update: Dict[str, Any] = {
+            "type": "compact_inventory_update",
+            "owner_id": 3,
+            "inventory": {
+                "left_hand": {"id": 7, "prototype_id": 1000, "current_quantity": 4},
+                "right_hand": None,
+                "entries": 19 * [None] + [{"id": 8, "prototype_id": 1000, "current_quantity": 1}],
+            },
+        }
+
+        table = inventory.PrototypeTable()
+        with mock.patch.object(inventory, "PROTOTYPES", table):
+            self.assert_serde(definition, actions.ActionSchema(), actions.PrototypeDefinitionAction)
+            self.assertIsNone(table.get(1000))
+
+            actions.ActionSchema().load(definition).register()
+            self.assert_serde(update, actions.ActionSchema(), actions.CompactInventoryUpdateAction)
+
+            action = actions.ActionSchema().load(update)
+            self.assertEqual(action.inventory.left_hand.codename, "gold")
+
     def test_serde_to_string(self) -> None:
         """Test if `Action.to_string` works correctly."""
 
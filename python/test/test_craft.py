@@ -4,7 +4,7 @@ from typing import Any, Dict
 
 from . import common
 
-from edgin_around_api import craft
+from edgin_around_api import craft, defs, inventory
 
 
 class CraftTest(common.SerdeTest):
@@ -141,3 +141,367 @@ class CraftTest(common.SerdeTest):
         }
 
         self.assert_serde(original, craft.Assembly.Schema(), craft.Assembly)
+
+    def test_material_masks(self) -> None:
+        """Compiled masks should agree with the table of matches."""
+
+        for material in craft.Material:
+            ingredient = craft.Ingredient(material, 1)
+            for essence in craft.Essence:
+                expected = craft.Match(material, essence) in craft._MATCHES
+                self.assertEqual(ingredient.match_essence(essence), expected)
+                self.assertEqual(ingredient.match_mask(essence.get_bit()), expected)
+
+        mask = craft.essence_mask([craft.Essence.STICKS, craft.Essence.GOLD])
+        self.assertTrue(craft.Ingredient(craft.Material.MINERAL, 1).match_mask(mask))
+        self.assertFalse(craft.Ingredient(craft.Material.WOOD, 1).match_mask(mask))
+
+    def test_recipe_filter_items(self) -> None:
+        """Bulk filtering should return matching items for every ingredient."""
+
+        recipe = craft.Recipe(
+            "test_recipe",
+            "Test recipe",
+            [
+                craft.Ingredient(craft.Material.MINERAL, 2),
+                craft.Ingredient(craft.Material.WOOD, 1),
+                craft.Ingredient(craft.Material.MINERAL, 1, optional=True),
+            ],
+        )
+
+        rocks = craft.Item(0, craft.Essence.ROCKS, 1)
+        gold = craft.Item(1, craft.Essence.GOLD, 1)
+        logs = craft.Item(2, craft.Essence.LOGS, 1)
+        sticks = craft.Item(3, craft.Essence.STICKS, 1)
+
+        result = recipe.filter_items([rocks, gold, logs, sticks])
+        self.assertEqual(result, [{rocks, gold}, {logs}, {rocks, gold}])
+        for ingredient, items in zip(recipe.get_ingredients(), result):
+            self.assertEqual(ingredient.filter_items([rocks, gold, logs, sticks]), items)
+
+    def test_recipe_optional_ingredients(self) -> None:
+        """Optional ingredients have to be filled like the other ones."""
+
+        recipe = craft.Recipe(
+            "test_recipe",
+            "Test recipe",
+            [
+                craft.Ingredient(craft.Material.WOOD, 2),
+                craft.Ingredient(craft.Material.MINERAL, 1, optional=True),
+            ],
+        )
+
+        logs = craft.Item(0, craft.Essence.LOGS, 2)
+        gold = craft.Item(1, craft.Essence.GOLD, 1)
+        self.assertFalse(recipe.validate_assembly(craft.Assembly("test_recipe", [[logs], []])))
+        self.assertTrue(recipe.validate_assembly(craft.Assembly("test_recipe", [[logs], [gold]])))
+        self.assertFalse(recipe.validate_assembly(craft.Assembly("test_recipe", [[], [gold]])))
+
+        materials = {craft.Material.WOOD, craft.Material.MINERAL}
+        self.assertEqual(recipe.get_required_materials(), materials)
+        self.assertFalse(recipe.is_satisfiable({craft.Essence.LOGS: 2}))
+        self.assertTrue(recipe.is_satisfiable({craft.Essence.LOGS: 2, craft.Essence.GOLD: 1}))
+
+    def test_recipe_book_find_craftable(self) -> None:
+        """Recipes should be found craftable only if all the required ingredients can be filled at
+        once."""
+
+        hammer = craft.Recipe(
+            "hammer",
+            "Hammer",
+            [craft.Ingredient(craft.Material.MINERAL, 2), craft.Ingredient(craft.Material.WOOD, 1)],
+        )
+        axe = craft.Recipe(
+            "axe",
+            "Axe",
+            [craft.Ingredient(craft.Material.MINERAL, 3), craft.Ingredient(craft.Material.WOOD, 2)],
+        )
+        raft = craft.Recipe("raft", "Raft", [craft.Ingredient(craft.Material.WOOD, 4)])
+        book = craft.RecipeBook([hammer, axe, raft])
+
+        self.assertEqual(book.get_recipe("axe"), axe)
+        self.assertEqual(book.get_recipes_using(craft.Material.MINERAL), [hammer, axe])
+
+        items = {
+            craft.Item(0, craft.Essence.ROCKS, 1),
+            craft.Item(1, craft.Essence.GOLD, 1),
+            craft.Item(2, craft.Essence.LOGS, 2),
+        }
+        self.assertEqual(book.find_craftable(items), [hammer])
+        self.assertEqual(book.find_craftable(craft.essence_histogram(items)), [hammer])
+
+        items.add(craft.Item(3, craft.Essence.LOGS, 2))
+        self.assertEqual(set(book.find_craftable(items)), {hammer, raft})
+
+        inv = inventory.Inventory()
+        inv.store(defs.Hand.LEFT, 0, craft.Essence.ROCKS, 2, 1, 1, "rocks")
+        inv.insert(3, 1, craft.Essence.LOGS, 4, 1, 1, "logs")
+        self.assertEqual(set(book.find_craftable(inv)), {hammer, raft})
+
+        book.remove("raft")
+        self.assertEqual(book.find_craftable(items), [hammer])
+        self.assertEqual(book.find_craftable({craft.Essence.STICKS: 10}), [])
+
+    def test_solve_assembly(self) -> None:
+        """Solved assemblies should be valid and use no more than the available quantities."""
+
+        recipe = craft.Recipe(
+            "test_recipe",
+            "Test recipe",
+            [
+                craft.Ingredient(craft.Material.MINERAL, 3),
+                craft.Ingredient(craft.Material.WOOD, 1),
+                craft.Ingredient(craft.Material.MINERAL, 2),
+                craft.Ingredient(craft.Material.WOOD, 2, optional=True),
+                craft.Ingredient(craft.Material.MINERAL, 1, optional=True),
+            ],
+        )
+
+        items = [
+            craft.Item(0, craft.Essence.ROCKS, 2),
+            craft.Item(1, craft.Essence.GOLD, 4),
+            craft.Item(2, craft.Essence.LOGS, 3),
+            craft.Item(3, craft.Essence.STICKS, 9),
+        ]
+
+        assembly = craft.solve_assembly(recipe, items)
+        assert assembly is not None
+        self.assertTrue(recipe.validate_assembly(assembly))
+        self.assertEqual(sum(item.quantity for item in assembly.sources[3]), 2)
+        self.assertEqual(sum(item.quantity for item in assembly.sources[4]), 1)
+
+        used: Dict[int, int] = dict()
+        for sources in assembly.sources:
+            for item in sources:
+                used[item.actor_id] = used.get(item.actor_id, 0) + item.quantity
+        self.assertEqual(used, {0: 2, 1: 4, 2: 3})
+
+        items[2] = craft.Item(2, craft.Essence.LOGS, 2)
+        self.assertIsNone(craft.solve_assembly(recipe, items))
+
+    def test_solve_assembly_impossible(self) -> None:
+        """`None` should be returned if the required ingredients can not be filled together."""
+
+        recipe = craft.Recipe(
+            "test_recipe",
+            "Test recipe",
+            [
+                craft.Ingredient(craft.Material.MINERAL, 2),
+                craft.Ingredient(craft.Material.MINERAL, 2),
+            ],
+        )
+
+        items = [craft.Item(0, craft.Essence.ROCKS, 1), craft.Item(1, craft.Essence.GOLD, 2)]
+        self.assertIsNone(craft.solve_assembly(recipe, items))
+
+        items.append(craft.Item(2, craft.Essence.ROCKS, 1))
+        assembly = craft.solve_assembly(recipe, items)
+        assert assembly is not None
+        self.assertTrue(recipe.validate_assembly(assembly))
+
+    def test_solve_assembly_zero_quantity(self) -> None:
+        """Ingredients with zero value should need no items."""
+
+        recipe = craft.Recipe(
+            "test_recipe",
+            "Test recipe",
+            [craft.Ingredient(craft.Material.WOOD, 0), craft.Ingredient(craft.Material.MINERAL, 1)],
+        )
+
+        items = [craft.Item(0, craft.Essence.ROCKS, 1)]
+        self.assertEqual(recipe.get_required_materials(), {craft.Material.MINERAL})
+        self.assertEqual(craft.RecipeBook([recipe]).find_craftable(items), [recipe])
+        assembly = craft.solve_assembly(recipe, items)
+        assert assembly is not None
+        self.assertEqual(assembly.sources, [[], [craft.Item(0, craft.Essence.ROCKS, 1)]])
+        self.assertTrue(recipe.validate_assembly(assembly))
+
+    def test_indexed_assembly_update_item(self) -> None:
+        """Updates of the indexed assembly should behave like the ones of `Assembly`."""
+
+        sources = [
+            [
+                craft.Item(1, craft.Essence.GOLD, 3),
+                craft.Item(2, craft.Essence.LOGS, 3),
+                craft.Item(3, craft.Essence.STICKS, 3),
+            ],
+            [],
+        ]
+        assembly = craft.Assembly("test_recipe", [list(items) for items in sources])
+        indexed = craft.IndexedAssembly("test_recipe", sources)
+
+        updates = [
+            (1, craft.Item(3, craft.Essence.STICKS, 0), -1),
+            (0, craft.Item(3, craft.Essence.STICKS, 0), -5),
+            (0, craft.Item(4, craft.Essence.ROCKS, 0), 2),
+            (0, craft.Item(2, craft.Essence.LOGS, 0), 2),
+            (0, craft.Item(1, craft.Essence.GOLD, 0), -1),
+            (0, craft.Item(3, craft.Essence.STICKS, 0), -3),
+            (1, craft.Item(3, craft.Essence.STICKS, 0), 1),
+        ]
+        for index, template, change in updates:
+            expected = assembly.update_item(index, template, change)
+            self.assertEqual(indexed.update_item(index, template, change), expected)
+
+        self.assertEqual(indexed.to_assembly(), assembly)
+        self.assertEqual(indexed.find_item(2, None), assembly.find_item(2, None))
+        self.assertEqual(indexed.find_item(3, 0), None)
+        self.assertEqual(indexed.find_item(3, 1), craft.Item(3, craft.Essence.STICKS, 1))
+        self.assertEqual(indexed.get_total(0), 9)
+
+    def test_indexed_assembly_is_complete(self) -> None:
+        """Completeness should follow the totals of the ingredients and mismatched items should be
+        rejected."""
+
+        recipe = craft.Recipe(
+            "test_recipe",
+            "Test recipe",
+            [
+                craft.Ingredient(craft.Material.MINERAL, 3),
+                craft.Ingredient(craft.Material.WOOD, 1, optional=True),
+            ],
+        )
+
+        rocks = craft.Item(0, craft.Essence.ROCKS, 5)
+        logs = craft.Item(1, craft.Essence.LOGS, 5)
+        assembly = craft.IndexedAssembly.from_recipe(recipe)
+        self.assertFalse(assembly.is_complete())
+        self.assertFalse(assembly.update_item(0, logs, 1))
+        self.assertTrue(assembly.update_item(0, rocks, 3))
+        self.assertFalse(assembly.is_complete())
+        self.assertTrue(assembly.update_item(1, logs, 2))
+        self.assertFalse(assembly.is_complete())
+        self.assertTrue(assembly.update_item(1, logs, -1))
+        self.assertTrue(assembly.is_complete())
+        self.assertTrue(recipe.validate_assembly(assembly.to_assembly()))
+
+        items = {rocks, logs}
+        self.assertEqual(
+            assembly.filter_items(items),
+            {craft.Item(0, craft.Essence.ROCKS, 2), craft.Item(1, craft.Essence.LOGS, 4)},
+        )
+        self.assertEqual(items, {craft.Item(0, craft.Essence.ROCKS, 5), logs})
+
+    def test_indexed_assembly_bind_mismatch(self) -> None:
+        """Items added before binding should be checked against the recipe like in
+        `Recipe.validate_assembly`."""
+
+        recipe = craft.Recipe(
+            "test_recipe", "Test recipe", [craft.Ingredient(craft.Material.MINERAL, 3)]
+        )
+        sticks = craft.Item(1, craft.Essence.STICKS, 3)
+        assembly = craft.Assembly("test_recipe", [[sticks]])
+
+        indexed = craft.IndexedAssembly.from_assembly(assembly, recipe)
+        self.assertFalse(recipe.validate_assembly(assembly))
+        self.assertFalse(indexed.is_complete())
+
+        self.assertTrue(indexed.update_item(0, sticks, -2))
+        self.assertFalse(indexed.is_complete())
+        self.assertTrue(indexed.update_item(0, sticks, -1))
+        self.assertTrue(indexed.update_item(0, craft.Item(2, craft.Essence.ROCKS, 0), 3))
+        self.assertTrue(indexed.is_complete())
+        self.assertTrue(recipe.validate_assembly(indexed.to_assembly()))
+
+        loaded = craft.IndexedAssembly.Schema().load(craft.Assembly.Schema().dump(assembly))
+        loaded.bind(recipe)
+        self.assertFalse(loaded.is_complete())
+
+    def test_serde_indexed_assembly(self) -> None:
+        original: Dict[str, Any] = {
+            "recipe_codename": "my_recipe",
+            "sources": [
+                [
+                    {
+                        "actor_id": 4,
+                        "essence": "GOLD",
+                        "quantity": 6,
+                    },
+                    {
+                        "actor_id": 7,
+                        "essence": "ROCKS",
+                        "quantity": 5,
+                    },
+                ]
+            ],
+        }
+
+        self.assert_serde(original, craft.IndexedAssembly.Schema(), craft.IndexedAssembly)
+        self.assert_serde(original, craft.Assembly.Schema(), craft.Assembly)
+
+    def test_recipe_graph(self) -> None:
+        """Raw totals should include intermediate products and cycles should be rejected."""
+
+        logs = craft.Recipe("logs", "Logs", [craft.Ingredient(craft.Material.MINERAL, 1)])
+        hammer = craft.Recipe(
+            "hammer",
+            "Hammer",
+            [
+                craft.Ingredient(craft.Material.MINERAL, 2),
+                craft.Ingredient(craft.Material.WOOD, 3),
+                craft.Ingredient(craft.Material.WOOD, 1, optional=True),
+            ],
+        )
+
+        graph = craft.RecipeGraph()
+        graph.add(hammer, craft.Essence.TOOL)
+        self.assertEqual(
+            graph.get_raw_totals("hammer"), {craft.Material.MINERAL: 2, craft.Material.WOOD: 4}
+        )
+
+        graph.add(logs, craft.Essence.LOGS, 2)
+        self.assertFalse(graph.is_raw(craft.Material.WOOD))
+        self.assertEqual(graph.get_raw_totals("hammer"), {craft.Material.MINERAL: 5})
+
+        items = [craft.Item(0, craft.Essence.ROCKS, 5), craft.Item(1, craft.Essence.GOLD, 4)]
+        # Two hammers need 8 minerals, since the logs left from one craft are used for the other.
+        self.assertEqual(graph.how_many("hammer", items), 2)
+        self.assertEqual(graph.how_many("logs", items), 9)
+
+        rocks = craft.Recipe("rocks", "Rocks", [craft.Ingredient(craft.Material.WOOD, 1)])
+        gold = craft.Recipe("gold", "Gold", [craft.Ingredient(craft.Material.WOOD, 1)])
+        graph.add(rocks, craft.Essence.ROCKS)
+        with self.assertRaises(craft.RecipeCycleError):
+            graph.add(gold, craft.Essence.GOLD)
+        self.assertIsNone(graph.get_recipe("gold"))
+        self.assertEqual(graph.get_raw_totals("hammer"), {craft.Material.MINERAL: 5})
+
+    def test_recipe_graph_held_products(self) -> None:
+        """Held intermediate products should be used before crafting them from raw materials."""
+
+        axe = craft.Recipe("axe", "Axe", [craft.Ingredient(craft.Material.WOOD, 2)])
+        logs = craft.Recipe("logs_from_rocks", "Logs", [craft.Ingredient(craft.Material.MINERAL, 1)])
+        graph = craft.RecipeGraph()
+        graph.add(axe, craft.Essence.TOOL)
+        graph.add(logs, craft.Essence.LOGS)
+
+        self.assertEqual(graph.how_many("axe", {craft.Essence.LOGS: 10}), 5)
+        self.assertEqual(graph.how_many("axe", {craft.Essence.LOGS: 1, craft.Essence.ROCKS: 3}), 2)
+        self.assertEqual(graph.how_many("axe", {craft.Essence.LOGS: 1}), 0)
+        self.assertEqual(graph.how_many("axe", dict()), 0)
+
+    def test_recipe_graph_rejected_replacement(self) -> None:
+        """A replacement introducing a cycle should leave the previous recipe in place."""
+
+        a = craft.Recipe("a", "A", [craft.Ingredient(craft.Material.MINERAL, 1)])
+        b = craft.Recipe("b", "B", [craft.Ingredient(craft.Material.WOOD, 1)])
+        graph = craft.RecipeGraph()
+        graph.add(a, craft.Essence.LOGS)
+        graph.add(b, craft.Essence.TOOL)
+        self.assertEqual(graph.get_raw_totals("b"), {craft.Material.MINERAL: 1})
+
+        empty = craft.Recipe("c", "C", [craft.Ingredient(craft.Material.MINERAL, 1)])
+        with self.assertRaises(ValueError):
+            graph.add(empty, craft.Essence.GOLD, 0)
+        self.assertIsNone(graph.get_recipe("c"))
+        self.assertIsNone(graph.get_product("c"))
+        self.assertTrue(graph.is_raw(craft.Material.MINERAL))
+        self.assertEqual(graph.get_raw_totals("b"), {craft.Material.MINERAL: 1})
+
+        cyclic = craft.Recipe("a", "A", [craft.Ingredient(craft.Material.WOOD, 1)])
+        with self.assertRaises(craft.RecipeCycleError):
+            graph.add(cyclic, craft.Essence.LOGS)
+        self.assertIs(graph.get_recipe("a"), a)
+        self.assertEqual(graph.get_product("a"), (craft.Essence.LOGS, 1))
+        self.assertFalse(graph.is_raw(craft.Material.WOOD))
+        self.assertEqual(graph.get_raw_totals("b"), {craft.Material.MINERAL: 1})
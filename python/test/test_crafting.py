@@ -0,0 +1,132 @@
+import unittest
+
+from edgin_around_api import craft, crafting, defs, inventory
+
+
+class CraftingTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.recipe = craft.Recipe(
+            "hammer",
+            "Hammer",
+            [craft.Ingredient(craft.Material.MINERAL, 2), craft.Ingredient(craft.Material.WOOD, 1)],
+        )
+
+        self.inventory = inventory.Inventory()
+        self.inventory.store(defs.Hand.LEFT, 1, craft.Essence.ROCKS, 3, 1, 100, "rocks")
+        self.inventory.insert(0, 2, craft.Essence.LOGS, 1, 1, 100, "logs")
+        self.inventory.insert(5, 3, craft.Essence.GOLD, 1, 1, 100, "gold")
+
+    def test_validate_single(self) -> None:
+        """Every kind of problem with a request should be reported."""
+
+        rocks = craft.Item(1, craft.Essence.ROCKS, 2)
+        logs = craft.Item(2, craft.Essence.LOGS, 1)
+        cases = [
+            (craft.Assembly("axe", [[rocks], [logs]]), crafting.Verdict.RECIPE_MISMATCH),
+            (craft.Assembly("hammer", [[rocks]]), crafting.Verdict.INGREDIENT_COUNT),
+            (craft.Assembly("hammer", [[logs], [rocks]]), crafting.Verdict.ESSENCE_MISMATCH),
+            (craft.Assembly("hammer", [[rocks], []]), crafting.Verdict.WRONG_QUANTITY),
+            (
+                craft.Assembly("hammer", [[craft.Item(9, craft.Essence.ROCKS, 2)], [logs]]),
+                crafting.Verdict.MISSING_ITEM,
+            ),
+            (
+                craft.Assembly("hammer", [[craft.Item(1, craft.Essence.GOLD, 2)], [logs]]),
+                crafting.Verdict.FORGED_ESSENCE,
+            ),
+            (
+                craft.Assembly("hammer", [[craft.Item(3, craft.Essence.GOLD, 2)], [logs]]),
+                crafting.Verdict.INSUFFICIENT_QUANTITY,
+            ),
+            (craft.Assembly("hammer", [[rocks], [logs]]), crafting.Verdict.VALID),
+        ]
+
+        verdicts = crafting.validate_crafts(
+            (self.recipe, assembly, self.inventory) for assembly, _ in cases
+        )
+        self.assertEqual(verdicts, [verdict for _, verdict in cases])
+
+    def test_validate_reservations(self) -> None:
+        """Items used by a valid request should not be available to later requests of the same
+        owner, but should stay available to other owners."""
+
+        other = inventory.Inventory()
+        other.store(defs.Hand.RIGHT, 1, craft.Essence.ROCKS, 2, 1, 100, "rocks")
+        other.insert(3, 2, craft.Essence.LOGS, 1, 1, 100, "logs")
+
+        rocks = craft.Item(1, craft.Essence.ROCKS, 2)
+        gold = craft.Item(3, craft.Essence.GOLD, 1)
+        logs = craft.Item(2, craft.Essence.LOGS, 1)
+        requests = [
+            (self.recipe, craft.Assembly("hammer", [[rocks], [logs]]), self.inventory),
+            (self.recipe, craft.Assembly("hammer", [[rocks], [logs]]), other),
+            (self.recipe, craft.Assembly("hammer", [[gold, rocks], [logs]]), self.inventory),
+            (
+                self.recipe,
+                craft.Assembly("hammer", [[craft.Item(1, craft.Essence.ROCKS, 1), gold], []]),
+                self.inventory,
+            ),
+        ]
+
+        verdicts = crafting.validate_crafts(requests)
+        self.assertEqual(
+            verdicts,
+            [
+                crafting.Verdict.VALID,
+                crafting.Verdict.VALID,
+                crafting.Verdict.INSUFFICIENT_QUANTITY,
+                crafting.Verdict.WRONG_QUANTITY,
+            ],
+        )
+
+    def test_craftable_cache(self) -> None:
+        """Cached results should follow changes of the inventory."""
+
+        book = craft.RecipeBook([self.recipe])
+        cache = crafting.CraftableCache(book, size=2)
+
+        self.assertEqual(cache.find_craftable(self.inventory), [self.recipe])
+        assembly = cache.suggest_assembly(self.inventory, self.recipe)
+        assert assembly is not None
+        self.assertTrue(self.recipe.validate_assembly(assembly))
+
+        expected = craft.solve_assembly(self.recipe, self.inventory.to_items())
+        assembly.sources.clear()
+        self.assertEqual(cache.suggest_assembly(self.inventory, self.recipe), expected)
+
+        self.inventory.remove_with_entity_id(2)
+        self.assertEqual(cache.find_craftable(self.inventory), [])
+        self.assertIsNone(cache.suggest_assembly(self.inventory, self.recipe))
+
+        self.inventory.insert(7, 2, craft.Essence.LOGS, 1, 1, 100, "logs")
+        self.assertEqual(cache.find_craftable(self.inventory), [self.recipe])
+
+    def test_assembly_candidates(self) -> None:
+        """Candidates should follow both the assembly and the inventory."""
+
+        candidates = crafting.AssemblyCandidates(self.recipe, self.inventory)
+        self.assertEqual(candidates.get_remaining(0), {1: 3, 3: 1})
+        self.assertEqual(candidates.get_remaining(1), {2: 1})
+
+        rocks = craft.Item(1, craft.Essence.ROCKS, 0)
+        self.assertFalse(candidates.update_item(0, rocks, 4))
+        self.assertTrue(candidates.update_item(0, rocks, 2))
+        self.assertEqual(candidates.get_remaining(0), {1: 1, 3: 1})
+        self.assertEqual(
+            candidates.get_items(0),
+            {craft.Item(1, craft.Essence.ROCKS, 1), craft.Item(3, craft.Essence.GOLD, 1)},
+        )
+
+        self.inventory.remove_with_entity_id(3)
+        self.inventory.insert(9, 4, craft.Essence.LOGS, 7, 1, 100, "logs")
+        self.inventory.swap(defs.Hand.LEFT, 9)
+        self.assertEqual(candidates.get_remaining(0), {1: 1})
+        self.assertEqual(candidates.get_remaining(1), {2: 1, 4: 7})
+
+        self.assertTrue(candidates.update_item(1, craft.Item(4, craft.Essence.LOGS, 0), 1))
+        self.assertTrue(candidates.assembly.is_complete())
+        self.assertTrue(self.recipe.validate_assembly(candidates.assembly.to_assembly()))
+
+        candidates.detach()
+        self.inventory.update_quantity(4, 3)
+        self.assertEqual(candidates.get_remaining(1), {2: 1, 4: 6})
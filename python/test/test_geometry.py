@@ -32,7 +32,111 @@ class GeometryTest(common.SerdeTest):
                     "type": "continents",
                     "origin": {"theta": 8.0, "phi": 9.0},
                 },
+                {
+                    "type": "peak",
+                    "origin": {"theta": 2.0, "phi": 3.0},
+                    "extent": 50.0,
+                    "height": 7.0,
+                },
             ],
         }
 
         self.assert_serde(original, geometry.Elevation.Schema(), geometry.Elevation)
+
+    def test_elevation_gradient(self) -> None:
+        """Analytic gradients should agree with finite differences of the elevation."""
+
+        elevation = geometry.Elevation(999)
+        elevation.add(geometry.Hills(geometry.Point(0.0, 0.0)))
+        elevation.add(geometry.Ranges(geometry.Point(0.0, 0.0)))
+        elevation.add(geometry.Continents(geometry.Point(0.0, 0.0)))
+        elevation.add(geometry.Peak(geometry.Point(1.5, 4.0), 300.0, 20.0))
+
+        h = 1e-6
+        for theta, phi in ((0.3, 0.2), (1.5, 4.0), (2.8, 1.1)):
+            value, d_theta, d_phi = elevation.evaluate_with_gradient(geometry.Point(theta, phi))
+            self.assertAlmostEqual(
+                value, elevation.evaluate_without_radius(geometry.Point(theta, phi))
+            )
+
+            up = elevation.evaluate_without_radius(geometry.Point(theta + h, phi))
+            down = elevation.evaluate_without_radius(geometry.Point(theta - h, phi))
+            self.assertAlmostEqual(d_theta, (up - down) / (2 * h), places=3)
+
+            up = elevation.evaluate_without_radius(geometry.Point(theta, phi + h))
+            down = elevation.evaluate_without_radius(geometry.Point(theta, phi - h))
+            self.assertAlmostEqual(d_phi, (up - down) / (2 * h), places=3)
+
+    def test_elevation_normals(self) -> None:
+        """Normals of a flat terrain should point away from the center and normals of a sloped
+        terrain should be perpendicular to the surface."""
+
+        flat = geometry.Elevation(10)
+        point = geometry.Point(1.0, 2.0)
+        normal = flat.evaluate_normals([point])[0]
+        expected = geometry.Coordinates.spherical_to_cartesian(1.0, point.theta, point.phi)
+        for n, e in zip(normal, expected):
+            self.assertAlmostEqual(n, e)
+
+        elevation = geometry.Elevation(10)
+        elevation.add(geometry.Continents(geometry.Point(0.0, 0.0)))
+        normal = elevation.evaluate_normal(point)
+
+        h = 1e-6
+        center = geometry.Coordinates.spherical_to_cartesian(
+            elevation.evaluate_with_radius(point), point.theta, point.phi
+        )
+        for moved in (geometry.Point(1.0 + h, 2.0), geometry.Point(1.0, 2.0 + h)):
+            tangent = geometry.Coordinates.spherical_to_cartesian(
+                elevation.evaluate_with_radius(moved), moved.theta, moved.phi
+            )
+            dot = sum(n * (t - c) for n, t, c in zip(normal, tangent, center))
+            self.assertAlmostEqual(dot / h, 0.0, places=4)
+
+    def test_bounded_terrain(self) -> None:
+        """Bounded terrains should influence only the area within their extent and evaluation
+        with the index should give the same results as evaluating all the terrains."""
+
+        elevation = geometry.Elevation(100)
+        elevation.add(geometry.Continents(geometry.Point(0.0, 0.0)))
+        for i in range(200):
+            origin = geometry.Point(0.1 + 0.0145 * i, 0.031 * i)
+            elevation.add(geometry.Peak(origin, 3.0 + i % 5, 1.0 + i % 3))
+
+        peak = geometry.Peak(geometry.Point(1.0, 1.0), 10.0, 5.0)
+        self.assertEqual(peak.evaluate(geometry.Point(1.0, 1.0), 100), 5.0)
+        self.assertEqual(peak.evaluate(geometry.Point(1.0, 1.2), 100), 0.0)
+
+        for i in range(100):
+            point = geometry.Point(0.1 + 0.029 * i, 0.063 * i)
+            candidates = elevation.get_terrain_at(point)
+            self.assertTrue(len(candidates) < len(elevation.terrain))
+            expected = sum(terrain.evaluate(point, 100) for terrain in elevation.terrain)
+            self.assertAlmostEqual(elevation.evaluate_without_radius(point), expected)
+
+    def test_terrain_index_updates(self) -> None:
+        """Replacing a terrain should rebuild the index and a single large terrain should not make
+        the index cells large."""
+
+        elevation = geometry.Elevation(100)
+        for i in range(100):
+            origin = geometry.Point(0.1 + 0.029 * i, 0.063 * i)
+            elevation.add(geometry.Peak(origin, 3.0, 1.0))
+        elevation.add(geometry.Peak(geometry.Point(1.0, 1.0), 300.0, 1.0))
+
+        point = geometry.Point(0.1, 0.0)
+        self.assertTrue(len(elevation.get_terrain_at(point)) < 10)
+        expected = sum(terrain.evaluate(point, 100) for terrain in elevation.terrain)
+        self.assertAlmostEqual(elevation.evaluate_without_radius(point), expected)
+
+        elevation.replace(0, geometry.Peak(geometry.Point(0.1, 0.0), 3.0, 4.0))
+        expected = sum(terrain.evaluate(point, 100) for terrain in elevation.terrain)
+        self.assertAlmostEqual(elevation.evaluate_without_radius(point), expected)
+        self.assertTrue(len(elevation.get_terrain_at(point)) < 10)
+
+        elevation.terrain = []
+        self.assertEqual(elevation.evaluate_without_radius(point), 0.0)
+        elevation.terrain = [geometry.Peak(geometry.Point(0.1, 0.0), 3.0, 4.0)]
+        self.assertAlmostEqual(elevation.evaluate_without_radius(point), 4.0)
+        with self.assertRaises(AttributeError):
+            elevation.terrain.append(geometry.Continents(point))  # type: ignore
@@ -1,4 +1,4 @@
-import unittest
+import copy, pickle, unittest
 
 from typing import Any, Dict, Final
 
@@ -78,6 +78,70 @@ class InventoryTest(unittest.TestCase):
         self.assertEqual(inv.get_hand(defs.Hand.RIGHT), 2)
         self.assertEqual(inv.get_pocket(INDEX), 1)
 
+    def test_merge(self) -> None:
+        """Merging should move as many items as fit into the pocket."""
+
+        inv = inventory.Inventory()
+        inv.store(defs.Hand.LEFT, 1, craft.Essence.ROCKS, 5, 2, 16, "rocks")
+        inv.store(defs.Hand.RIGHT, 2, craft.Essence.LOGS, 1, 2, 16, "logs")
+        inv.insert(0, 3, craft.Essence.ROCKS, 6, 2, 16, "rocks")
+
+        self.assertFalse(inv.merge(defs.Hand.RIGHT, 0))
+        self.assertTrue(inv.merge(defs.Hand.LEFT, 0))
+        self.assertEqual(inv.get_pocket_entry(0).current_quantity, 8)  # type: ignore
+        self.assertEqual(inv.get_hand_entry(defs.Hand.LEFT).current_quantity, 3)  # type: ignore
+        self.assertFalse(inv.merge(defs.Hand.LEFT, 0))
+
+        self.assertTrue(inv.merge(defs.Hand.LEFT, 1))
+        self.assertIsNone(inv.get_hand(defs.Hand.LEFT))
+        self.assertEqual(inv.get_slot(1), 1)
+
+    def test_merge_into_hand(self) -> None:
+        inv = inventory.Inventory()
+        inv.store(defs.Hand.RIGHT, 1, craft.Essence.LOGS, 2, 1, 4, "logs")
+        inv.insert(2, 2, craft.Essence.LOGS, 3, 1, 4, "logs")
+
+        self.assertTrue(inv.apply_update(defs.Hand.RIGHT, 2, defs.UpdateVariant.MERGE))
+        self.assertEqual(inv.get_pocket_entry(2).current_quantity, 4)  # type: ignore
+        self.assertTrue(inv.merge_into_hand(defs.Hand.LEFT, 2))
+        self.assertEqual(inv.get_slot(2), defs.Hand.LEFT)
+        self.assertTrue(inv.merge_into_hand(defs.Hand.LEFT, 2) is False)
+
+    def test_compact(self) -> None:
+        """Compaction should fill the earlier stacks, including the hands, first and report all the
+        changes."""
+
+        inv = inventory.Inventory()
+        inv.insert(0, 1, craft.Essence.ROCKS, 3, 2, 10, "rocks")
+        inv.insert(2, 2, craft.Essence.LOGS, 1, 1, 10, "logs")
+        inv.insert(3, 3, craft.Essence.ROCKS, 1, 2, 10, "rocks")
+        inv.insert(5, 4, craft.Essence.ROCKS, 4, 2, 10, "rocks")
+        inv.insert(7, 5, craft.Essence.ROCKS, 5, 2, 10, "rocks")
+        inv.insert(8, 6, craft.Essence.LOGS, 10, 1, 10, "logs")
+        inv.insert(9, 7, craft.Essence.GOLD, 1, 1, 10, "gold")
+
+        changed, removed = inv.compact()
+        self.assertEqual(changed, {0, 2, 3, 5, 7, 8})
+        self.assertEqual(removed, [3])
+        self.assertEqual(
+            [(e.id, e.current_quantity) if e else None for e in inv.entries[:10]],
+            [(1, 5), None, (2, 10), None, None, (4, 5), None, (5, 3), (6, 1), (7, 1)],
+        )
+        self.assertEqual(inv.compact(), (set(), []))
+
+        inv.store(defs.Hand.RIGHT, 8, craft.Essence.ROCKS, 2, 2, 10, "rocks")
+        changed, removed = inv.compact()
+        self.assertEqual(changed, {defs.Hand.RIGHT, 0, 5, 7})
+        self.assertEqual(removed, [5])
+        self.assertEqual(
+            inv.get_hand_entry(defs.Hand.RIGHT),
+            inventory.EntityInfo(8, craft.Essence.ROCKS, 5, 2, 10, "rocks"),
+        )
+        self.assertEqual(
+            [(e.id, e.current_quantity) if e else None for e in inv.entries[:10]],
+            [(1, 5), None, (2, 10), None, None, (4, 5), None, None, (6, 1), (7, 1)],
+        )
+
     def test_remove_with_entity_id(self) -> None:
         inv = inventory.Inventory()
         inv.store(
@@ -107,6 +171,261 @@ class InventoryTest(unittest.TestCase):
         result = inv.to_items()
         self.assertEqual(result, expected)
 
+    def test_fingerprint(self) -> None:
+        """The fingerprint should depend only on the content and the version should change with
+        every modification."""
+
+        inv = inventory.Inventory()
+        empty = inv.get_fingerprint()
+        inv.store(defs.Hand.LEFT, 1, craft.Essence.ROCKS, 1, 1, 100, "rocks")
+        inv.insert(4, 2, craft.Essence.LOGS, 2, 1, 100, "logs")
+        filled = inv.get_fingerprint()
+        self.assertNotEqual(filled, empty)
+
+        version = inv.get_version()
+        inv.swap(defs.Hand.LEFT, 4)
+        inv.swap(defs.Hand.RIGHT, 7)
+        self.assertEqual(inv.get_fingerprint(), filled)
+        self.assertGreater(inv.get_version(), version)
+
+        self.assertTrue(inv.update_quantity(2, 5))
+        self.assertFalse(inv.update_quantity(3, 5))
+        self.assertNotEqual(inv.get_fingerprint(), filled)
+        self.assertEqual(inv.find_entity_with_entity_id(2).current_quantity, 5)  # type: ignore
+        self.assertTrue(inv.update_quantity(2, 2))
+        self.assertEqual(inv.get_fingerprint(), filled)
+
+        other = inventory.Inventory()
+        other.insert(0, 2, craft.Essence.LOGS, 2, 1, 100, "logs")
+        other.right_hand = inventory.EntityInfo(1, craft.Essence.ROCKS, 1, 1, 100, "rocks")
+        self.assertEqual(other.get_fingerprint(), filled)
+
+        inv.remove_with_entity_id(1)
+        inv.remove_with_entity_id(2)
+        self.assertEqual(inv.get_fingerprint(), empty)
+
+    def test_immutable_entries(self) -> None:
+        """Entries and the list of pockets should not be modifiable behind the inventory's back."""
+
+        inv = inventory.Inventory()
+        inv.insert(0, 1, craft.Essence.ROCKS, 3, 1, 100, "rocks")
+        entry = inv.find_entity_with_entity_id(1)
+        assert entry is not None
+
+        with self.assertRaises(AttributeError):
+            entry.current_quantity = 10  # type: ignore
+        with self.assertRaises(TypeError):
+            inv.entries[0] = None  # type: ignore
+        with self.assertRaises(AttributeError):
+            entry.set_quantity(10)
+        self.assertEqual(inv.get_pocket_entry(0), entry)
+        self.assertEqual(inv.get_essence_histogram(), {craft.Essence.ROCKS: 3})
+
+    def test_copy_and_pickle(self) -> None:
+        """Entries and inventories holding them should be copyable and picklable."""
+
+        inv = inventory.Inventory()
+        inv.store(defs.Hand.LEFT, 1, craft.Essence.ROCKS, 3, 1, 100, "rocks")
+        inv.insert(2, 2, craft.Essence.LOGS, 1, 1, 100, "logs")
+        entry = inv.left_hand
+        assert entry is not None
+
+        self.assertEqual(copy.copy(entry), entry)
+        self.assertEqual(copy.deepcopy(entry), entry)
+        self.assertEqual(pickle.loads(pickle.dumps(entry)), entry)
+
+        schema = inventory.Inventory.Schema()
+        for other in (copy.deepcopy(inv), pickle.loads(pickle.dumps(inv))):
+            self.assertEqual(schema.dump(other), schema.dump(inv))
+            self.assertEqual(other.get_fingerprint(), inv.get_fingerprint())
+
+    def test_entity_index(self) -> None:
+        """Slots of the entities should be tracked through all the changes."""
+
+        inv = inventory.Inventory()
+        inv.store(defs.Hand.LEFT, 1, craft.Essence.ROCKS, 1, 1, 100, "rocks")
+        inv.insert(4, 2, craft.Essence.LOGS, 2, 1, 100, "logs")
+        inv.insert(6, 3, craft.Essence.GOLD, 2, 1, 100, "gold")
+        self.assertEqual(inv.get_slot(1), defs.Hand.LEFT)
+        self.assertEqual(set(inv.get_all_ids()), {1, 2, 3})
+
+        inv.swap(defs.Hand.LEFT, 4)
+        inv.swap(defs.Hand.RIGHT, 6)
+        self.assertEqual(inv.get_slot(1), 4)
+        self.assertEqual(inv.get_slot(2), defs.Hand.LEFT)
+        self.assertEqual(inv.get_slot(3), defs.Hand.RIGHT)
+        self.assertEqual(inv.find_entity_with_entity_id(3), inv.right_hand)
+
+        inv.remove_with_entity_id(2)
+        inv.insert_entry(4, None)
+        self.assertIsNone(inv.find_entity_with_entity_id(1))
+        self.assertIsNone(inv.get_slot(2))
+        self.assertEqual(inv.get_all_ids(), [3])
+
+        schema = inventory.Inventory.Schema()
+        loaded = schema.load(schema.dump(inv))
+        self.assertEqual(loaded.get_slot(3), defs.Hand.RIGHT)
+
+    def test_registry(self) -> None:
+        """Owners of the entities should be found across inventories."""
+
+        first = inventory.Inventory()
+        first.store(defs.Hand.LEFT, 1, craft.Essence.ROCKS, 1, 1, 100, "rocks")
+        second = inventory.Inventory()
+
+        registry = inventory.InventoryRegistry()
+        registry.register(10, first)
+        registry.register(20, second)
+        self.assertEqual(registry.find_owner(1), 10)
+
+        entry = first.left_hand
+        first.remove_with_entity_id(1)
+        second.insert_entry(3, entry)
+        self.assertEqual(registry.find_owner(1), 20)
+        self.assertEqual(registry.find_entity(1), entry)
+
+        second.swap(defs.Hand.RIGHT, 3)
+        self.assertEqual(registry.find_owner(1), 20)
+
+        registry.unregister(20)
+        self.assertIsNone(registry.find_owner(1))
+        second.remove_with_entity_id(1)
+        first.insert(0, 1, craft.Essence.ROCKS, 1, 1, 100, "rocks")
+        self.assertEqual(registry.find_owner(1), 10)
+
+    def test_prototypes(self) -> None:
+        """Entities of the same kind should share a prototype."""
+
+        first = inventory.EntityInfo(1, craft.Essence.ROCKS, 3, 2, 100, "rocks")
+        second = inventory.EntityInfo(2, craft.Essence.ROCKS, 1, 2, 100, "rocks")
+        third = inventory.EntityInfo(3, craft.Essence.ROCKS, 1, 2, 50, "rocks")
+        self.assertIs(first.prototype, second.prototype)
+        self.assertIsNot(first.prototype, third.prototype)
+        self.assertEqual(inventory.PROTOTYPES.get(first.prototype_id), first.prototype)
+        self.assertEqual(second.max_volume, 100)
+        self.assertEqual(first, inventory.EntityInfo(1, craft.Essence.ROCKS, 3, 2, 100, "rocks"))
+        self.assertNotEqual(first, second)
+
+        inv = inventory.Inventory()
+        inv.insert_entry(0, first)
+        inv.insert_entry(1, second)
+        inv.store_entry(defs.Hand.LEFT, third)
+        self.assertEqual(inv.get_prototypes(), {first.prototype, third.prototype})
+
+        schema = inventory.Inventory.CompactSchema()
+        loaded = schema.load(schema.dump(inv))
+        self.assertEqual(
+            inventory.Inventory.Schema().dump(loaded), inventory.Inventory.Schema().dump(inv)
+        )
+
+    def test_prototype_table_define(self) -> None:
+        """Every ID and every kind of entities should map to exactly one prototype."""
+
+        table = inventory.PrototypeTable()
+        rocks = table.intern(craft.Essence.ROCKS, 2, 100, "rocks")
+        gold = table.intern(craft.Essence.GOLD, 1, 100, "gold")
+        self.assertEqual((rocks.id, gold.id), (0, 1))
+
+        # The kind of rocks moves to a new ID and the ID of gold is reused by the rocks.
+        moved = table.define(inventory.Prototype(5, craft.Essence.ROCKS, 2, 100, "rocks"))
+        self.assertIsNone(table.get(0))
+        self.assertIs(table.intern(craft.Essence.ROCKS, 2, 100, "rocks"), moved)
+        table.define(inventory.Prototype(1, craft.Essence.ROCKS, 2, 100, "rocks"))
+        self.assertIsNone(table.get(5))
+        self.assertEqual(table.intern(craft.Essence.GOLD, 1, 100, "gold").id, 2)
+        self.assertEqual(len(table.get_all()), 2)
+
+    def test_public(self) -> None:
+        """Public views should contain both hands and be rebuilt only after the hands change."""
+
+        inv = inventory.Inventory()
+        inv.store(defs.Hand.LEFT, 1, craft.Essence.ROCKS, 1, 1, 100, "rocks")
+        inv.store(defs.Hand.RIGHT, 2, craft.Essence.LOGS, 2, 1, 100, "logs")
+        inv.insert(3, 3, craft.Essence.GOLD, 1, 1, 100, "gold")
+
+        public = inv.public()
+        self.assertEqual(public.get_all_ids(), [1, 2])
+        self.assertEqual(public.right_hand, inv.right_hand)
+
+        inv.insert(4, 4, craft.Essence.GOLD, 1, 1, 100, "gold")
+        self.assertIs(inv.public(), public)
+        inv.swap(defs.Hand.LEFT, 4)
+        self.assertIsNot(inv.public(), public)
+        self.assertEqual(inv.public().get_hand(defs.Hand.LEFT), 4)
+
+        public = inv.public()
+        public.remove_with_entity_id(4)
+        self.assertEqual(inv.public().get_hand(defs.Hand.LEFT), 4)
+
+    def test_private_and_payload(self) -> None:
+        """Private views and payloads should be cached until any change."""
+
+        inv = inventory.Inventory()
+        inv.store(defs.Hand.LEFT, 1, craft.Essence.ROCKS, 1, 1, 100, "rocks")
+        inv.insert(3, 3, craft.Essence.GOLD, 1, 1, 100, "gold")
+
+        schema = inventory.Inventory.Schema()
+        private = inv.private()
+        self.assertIs(inv.private(), private)
+        self.assertEqual(schema.dump(private), schema.dump(inv))
+
+        payload = inv.get_payload(schema)
+        self.assertIs(inv.get_payload(schema), payload)
+        self.assertEqual(payload, schema.dump(inv))
+
+        hands = inventory.Inventory.Schema(only=("left_hand",))
+        self.assertEqual(inv.get_payload(hands), hands.dump(inv))
+        self.assertIs(inv.get_payload(inventory.Inventory.Schema()), payload)
+
+        inv.remove_with_entity_id(3)
+        self.assertIsNot(inv.private(), private)
+        self.assertIsNot(inv.get_payload(schema), payload)
+        self.assertEqual(inv.get_payload(schema), schema.dump(inv))
+
+    def test_essence_histogram(self) -> None:
+        """The histogram should follow all the changes and aggregate over inventories."""
+
+        inv = inventory.Inventory()
+        inv.store(defs.Hand.LEFT, 1, craft.Essence.ROCKS, 2, 1, 100, "rocks")
+        inv.insert(3, 2, craft.Essence.ROCKS, 5, 1, 100, "rocks")
+        inv.insert(4, 3, craft.Essence.LOGS, 1, 1, 100, "logs")
+        self.assertEqual(inv.get_essence_quantity(craft.Essence.ROCKS), 7)
+        self.assertEqual(inv.get_essence_histogram(), craft.essence_histogram(inv.to_items()))
+
+        inv.swap(defs.Hand.LEFT, 4)
+        inv.update_quantity(2, 1)
+        inv.remove_with_entity_id(3)
+        self.assertEqual(inv.get_essence_histogram(), {craft.Essence.ROCKS: 3})
+        self.assertEqual(inv.get_essence_quantity(craft.Essence.LOGS), 0)
+
+        inv.insert(5, 4, craft.Essence.GOLD, 3, 1, 100, "gold")
+        inv.update_quantity(4, 10)
+        self.assertEqual(inv.get_essence_quantity(craft.Essence.GOLD), 10)
+        inv.remove_with_entity_id(4)
+        self.assertEqual(inv.get_essence_histogram(), {craft.Essence.ROCKS: 3})
+
+        other = inventory.Inventory()
+        other.insert(0, 5, craft.Essence.LOGS, 4, 1, 100, "logs")
+        self.assertEqual(
+            inventory.aggregate_essences([inv, other]),
+            {craft.Essence.ROCKS: 3, craft.Essence.LOGS: 4},
+        )
+
+    def test_essence_histogram_empty_stacks(self) -> None:
+        """Entries with zero quantity should not break the histogram."""
+
+        inv = inventory.Inventory()
+        inv.insert(0, 1, craft.Essence.ROCKS, 0, 1, 100, "rocks")
+        inv.insert(1, 2, craft.Essence.ROCKS, 2, 1, 100, "rocks")
+        self.assertEqual(inv.get_essence_histogram(), {craft.Essence.ROCKS: 2})
+
+        inv.remove_with_entity_id(2)
+        inv.swap(defs.Hand.LEFT, 0)
+        self.assertTrue(inv.update_quantity(1, 0))
+        inv.remove_with_entity_id(1)
+        self.assertEqual(inv.get_essence_histogram(), {})
+        self.assertEqual(inv.get_all_ids(), [])
+
     def test_serialization_empty(self) -> None:
         """
         Checks if the inventory is serialized and deserialized properly when the inventory is
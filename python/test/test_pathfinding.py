@@ -0,0 +1,81 @@
+import unittest
+
+from math import pi
+
+from edgin_around_api import geometry, pathfinding
+
+
+class PathfindingTest(unittest.TestCase):
+    RADIUS = 100.0
+
+    def test_grid_adjacency(self) -> None:
+        """Every node should have eight neighbours (seven at cube corners), also across edges of
+        the faces, and the adjacency should be symmetric."""
+
+        grid = pathfinding.TerrainGrid(geometry.Elevation(self.RADIUS), resolution=4)
+        for face in range(geometry.CUBE_FACE_COUNT):
+            for i in range(4):
+                for j in range(4):
+                    node = (face, i, j)
+                    neighbours = [n for n, _ in grid.neighbours(node)]
+                    corner = i in (0, 3) and j in (0, 3)
+                    self.assertEqual(len(neighbours), 7 if corner else 8)
+                    for neighbour in neighbours:
+                        self.assertIn(node, [n for n, _ in grid.neighbours(neighbour)])
+
+    def test_straight_path(self) -> None:
+        """On a flat world the path should follow the great circle with few waypoints."""
+
+        grid = pathfinding.TerrainGrid(geometry.Elevation(self.RADIUS), resolution=32)
+        pathfinder = pathfinding.Pathfinder(grid)
+        start = geometry.Point(0.5 * pi, 0.0)
+        goal = geometry.Point(0.5 * pi, 1.0)
+
+        path = pathfinder.find_path(start, goal)
+        assert path is not None
+        self.assertIs(path[0], start)
+        self.assertIs(path[-1], goal)
+        self.assertTrue(len(path) <= 4)
+
+        length = sum(a.great_circle_distance_to(b, self.RADIUS) for a, b in zip(path, path[1:]))
+        self.assertTrue(length < 1.05 * start.great_circle_distance_to(goal, self.RADIUS))
+
+    def test_obstacle_and_cache(self) -> None:
+        """Paths should avoid impassable terrain and paths towards popular destinations read from
+        the cache should be as cheap as the searched ones."""
+
+        elevation = geometry.Elevation(self.RADIUS)
+        elevation.add(geometry.Peak(geometry.Point(0.5 * pi, 0.5), 20.0, 100.0))
+        grid = pathfinding.TerrainGrid(elevation, resolution=32, max_slope=1.0)
+        pathfinder = pathfinding.Pathfinder(grid, cache_threshold=2)
+
+        start = grid.node_at(geometry.Point(0.5 * pi, 0.0))
+        goal = grid.node_at(geometry.Point(0.5 * pi, 1.0))
+        summit = grid.node_at(geometry.Point(0.5 * pi, 0.5))
+
+        def cost(nodes):
+            return sum(grid.cost(a, b) for a, b in zip(nodes, nodes[1:]))
+
+        searched = pathfinder.find_nodes(start, goal)
+        assert searched is not None
+        self.assertNotIn(summit, searched)
+
+        cached = pathfinder.find_nodes(start, goal)
+        assert cached is not None
+        self.assertAlmostEqual(cost(cached), cost(searched))
+        self.assertIsNone(pathfinder.find_nodes(summit, goal))
+
+    def test_bounded_cache(self) -> None:
+        """Starts outside of the cached area of a popular destination should still be found."""
+
+        grid = pathfinding.TerrainGrid(geometry.Elevation(self.RADIUS), resolution=32)
+        pathfinder = pathfinding.Pathfinder(grid, cache_threshold=1, cache_radius=10.0)
+        goal = grid.node_at(geometry.Point(0.5 * pi, 1.0))
+        near = grid.node_at(geometry.Point(0.5 * pi, 0.95))
+        far = grid.node_at(geometry.Point(0.5 * pi, 0.0))
+
+        near_path = pathfinder.find_nodes(near, goal)
+        far_path = pathfinder.find_nodes(far, goal)
+        assert near_path is not None and far_path is not None
+        self.assertEqual(far_path[-1], goal)
+        self.assertEqual(near_path[-1], goal)
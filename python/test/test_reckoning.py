@@ -0,0 +1,74 @@
+import unittest
+
+from math import pi
+
+from edgin_around_api import actions, geometry, reckoning
+
+
+class DeadReckoningTest(unittest.TestCase):
+    RADIUS = 1000.0
+
+    def test_first_update_localizes(self) -> None:
+        """The first update of an actor should always be sent, with motion only if it moves."""
+
+        tracker = reckoning.DeadReckoning(self.RADIUS, threshold=1.0)
+        origin = geometry.Point(0.5 * pi, 0.0)
+
+        result = tracker.update(1, 0.0, origin)
+        self.assertEqual(result, [actions.LocalizationAction(1, origin)])
+
+        result = tracker.update(2, 0.0, origin, speed=2.0, bearing=0.5)
+        self.assertEqual(
+            result,
+            [actions.LocalizationAction(2, origin), actions.MotionAction(2, 2.0, 0.5, 1.0)],
+        )
+
+    def test_predictable_motion_is_suppressed(self) -> None:
+        """Nothing should be sent as long as the actor moves as the client predicts."""
+
+        tracker = reckoning.DeadReckoning(self.RADIUS, threshold=1.0, horizon=10.0)
+        position = geometry.Point(0.5 * pi, 0.0)
+        self.assertEqual(len(tracker.update(1, 0.0, position, speed=3.0, bearing=1.0)), 2)
+
+        for tick in range(1, 10):
+            position = position.moved_by(3.0, 1.0, self.RADIUS)
+            self.assertEqual(tracker.update(1, float(tick), position, 3.0, 1.0), [])
+
+    def test_drift_is_corrected(self) -> None:
+        """When the actor turns, the update should be sent only after the error exceeds the
+        threshold and it should contain a fresh motion."""
+
+        tracker = reckoning.DeadReckoning(self.RADIUS, threshold=2.0, horizon=10.0)
+        position = geometry.Point(0.5 * pi, 0.0)
+        tracker.update(1, 0.0, position, speed=1.0, bearing=0.0)
+
+        position = position.moved_by(1.0, 0.5 * pi, self.RADIUS)
+        self.assertEqual(tracker.update(1, 1.0, position, 1.0, 0.5 * pi), [])
+
+        position = position.moved_by(1.0, 0.5 * pi, self.RADIUS)
+        result = tracker.update(1, 2.0, position, 1.0, 0.5 * pi)
+        self.assertEqual(
+            result,
+            [
+                actions.LocalizationAction(1, position),
+                actions.MotionAction(1, 1.0, 0.5 * pi, 10.0),
+            ],
+        )
+
+        predicted = tracker.predict(1, 2.0)
+        assert predicted is not None
+        self.assertAlmostEqual(predicted.great_circle_distance_to(position, self.RADIUS), 0.0)
+
+    def test_stop_is_corrected(self) -> None:
+        """When the actor stops, the client should be told to stop it as well."""
+
+        tracker = reckoning.DeadReckoning(self.RADIUS, threshold=0.5, horizon=10.0)
+        position = geometry.Point(0.5 * pi, 0.0)
+        tracker.update(1, 0.0, position, speed=1.0, bearing=0.0)
+
+        result = tracker.update(1, 1.0, position)
+        self.assertEqual(
+            result,
+            [actions.LocalizationAction(1, position), actions.MotionAction(1, 0.0, 0.0, 0.0)],
+        )
+        self.assertEqual(tracker.update(1, 5.0, position), [])
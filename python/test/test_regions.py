@@ -0,0 +1,50 @@
+import unittest
+
+from math import pi
+
+from edgin_around_api import geometry, pathfinding, regions
+
+
+def _make_heightmap() -> geometry.Heightmap:
+    """Returns a heightmap with land everywhere except of a ring of water along the equator and
+    a lake on the northern hemisphere."""
+
+    rows, columns = 9, 16
+    heights = [1.0] * (rows * columns)
+    for column in range(columns):
+        heights[4 * columns + column] = -1.0
+    heights[2 * columns + 5] = -1.0
+    return geometry.Heightmap(100.0, rows, columns, heights)
+
+
+class RegionMapTest(unittest.TestCase):
+    def test_labels(self) -> None:
+        """Land and water should be split into connected regions."""
+
+        region_map = regions.RegionMap(_make_heightmap(), level=0.0)
+        self.assertEqual(region_map.get_region_count(), 4)
+
+        north = geometry.Point(0.1, 1.0)
+        south = geometry.Point(pi - 0.1, 1.0)
+        equator = geometry.Point(0.5 * pi, 3.0)
+        lake = geometry.Point(0.25 * pi, 5 * 2 * pi / 16)
+
+        self.assertFalse(region_map.is_water(north))
+        self.assertFalse(region_map.is_water(south))
+        self.assertTrue(region_map.is_water(equator))
+        self.assertTrue(region_map.is_water(lake))
+        self.assertFalse(region_map.are_connected(north, south))
+        self.assertFalse(region_map.are_connected(equator, lake))
+        self.assertTrue(region_map.are_connected(north, geometry.Point(0.0, 4.0)))
+        self.assertEqual(region_map.get_region_size(region_map.region_at(lake)), 1)
+
+    def test_pathfinder_rejects_unreachable(self) -> None:
+        """Pathfinder should reject goals from other regions without searching."""
+
+        region_map = regions.RegionMap(_make_heightmap(), level=0.0)
+        grid = pathfinding.TerrainGrid(geometry.Elevation(100.0), resolution=8)
+        pathfinder = pathfinding.Pathfinder(grid, region_map=region_map)
+
+        north = geometry.Point(0.1, 1.0)
+        self.assertIsNone(pathfinder.find_path(north, geometry.Point(pi - 0.1, 1.0)))
+        self.assertIsNotNone(pathfinder.find_path(north, geometry.Point(0.3, 3.0)))
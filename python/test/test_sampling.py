@@ -0,0 +1,52 @@
+import unittest
+
+from math import pi
+
+from edgin_around_api import geometry, sampling
+
+
+class SamplingTest(unittest.TestCase):
+    def test_fibonacci_lattice(self) -> None:
+        """Lattice points should be spread evenly between the hemispheres."""
+
+        points = sampling.fibonacci_lattice(1000, jitter=0.3, seed=1)
+        self.assertEqual(len(points), 1000)
+        northern = sum(1 for point in points if point.theta < 0.5 * pi)
+        self.assertTrue(480 <= northern <= 520)
+
+    def test_spawn_points_constraints(self) -> None:
+        """Sampled points should respect both the separation and the elevation band."""
+
+        elevation = geometry.Elevation(100.0)
+        elevation.add(geometry.Continents(geometry.Point(0.0, 0.0)))
+
+        points = sampling.sample_spawn_points(
+            elevation, count=150, min_separation=5.0, min_height=0.0, seed=3
+        )
+        self.assertEqual(len(points), 150)
+
+        for point in points:
+            self.assertTrue(elevation.evaluate_without_radius(point) >= 0.0)
+
+        for i, point in enumerate(points):
+            for other in points[i + 1 :]:
+                self.assertTrue(point.great_circle_distance_to(other, 100.0) > 5.0)
+
+    def test_spawn_points_impossible(self) -> None:
+        """If constraints can not be satisfied fewer points should be returned."""
+
+        elevation = geometry.Elevation(100.0)
+        points = sampling.sample_spawn_points(elevation, count=50, min_separation=150.0, seed=0)
+        self.assertTrue(0 < len(points) < 50)
+
+        points = sampling.sample_spawn_points(
+            elevation, count=50, min_separation=1.0, min_height=1.0
+        )
+        self.assertEqual(points, [])
+
+    def test_spawn_points_without_separation(self) -> None:
+        """Zero separation should not restrict the points."""
+
+        elevation = geometry.Elevation(100.0)
+        points = sampling.sample_spawn_points(elevation, count=30, min_separation=0.0, seed=1)
+        self.assertEqual(len(points), 30)
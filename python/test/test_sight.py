@@ -0,0 +1,55 @@
+import unittest
+
+from math import pi
+
+from edgin_around_api import geometry, sight
+
+
+class LineOfSightTest(unittest.TestCase):
+    RADIUS = 100.0
+
+    def test_horizon(self) -> None:
+        """On a flat world the curvature alone should hide distant targets."""
+
+        los = sight.LineOfSight(geometry.Elevation(self.RADIUS), step=1.0)
+        observer = geometry.Point(0.5 * pi, 0.0)
+        target = geometry.Point(0.5 * pi, 0.5)
+
+        self.assertFalse(los.is_visible(sight.SightQuery(observer, target)))
+        self.assertTrue(los.is_visible(sight.SightQuery(observer, target, 20.0, 20.0)))
+        self.assertTrue(los.is_visible(sight.SightQuery(observer, observer)))
+
+    def test_heightmap_obstacle(self) -> None:
+        """A ridge in the heightmap should block the view of targets behind it."""
+
+        columns = 64
+        heights = [0.0] * (5 * columns)
+        for row in range(5):
+            heights[row * columns + 2] = 50.0
+        heightmap = geometry.Heightmap(self.RADIUS, 5, columns, heights)
+        los = sight.LineOfSight(geometry.Elevation(self.RADIUS), step=0.5, heightmap=heightmap)
+
+        observer = geometry.Point(0.5 * pi, 0.0)
+        behind = geometry.Point(0.5 * pi, 0.39)
+        before = geometry.Point(0.5 * pi, 0.05)
+        other_side = geometry.Point(0.5 * pi, -0.05)
+
+        queries = [
+            sight.SightQuery(observer, behind, 3.0, 3.0),
+            sight.SightQuery(observer, before, 3.0, 3.0),
+            sight.SightQuery(observer, other_side, 3.0, 3.0),
+            sight.SightQuery(observer, behind, 80.0, 80.0),
+        ]
+        self.assertEqual(los.check(queries), [False, True, True, True])
+
+    def test_heightmap_matches_elevation(self) -> None:
+        """Sampled heightmap should be close to the elevation function it was built from."""
+
+        elevation = geometry.Elevation(self.RADIUS)
+        elevation.add(geometry.Continents(geometry.Point(0.0, 0.0)))
+        heightmap = geometry.Heightmap.from_elevation(elevation, 91, 180)
+
+        point = geometry.Point(1.0, 2.0)
+        self.assertAlmostEqual(
+            heightmap.evaluate_with_radius(point), elevation.evaluate_with_radius(point), places=3
+        )
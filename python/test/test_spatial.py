@@ -0,0 +1,104 @@
+import random, unittest
+
+from math import acos, atan2, cos, pi, sin
+
+from typing import List, Set, Tuple
+
+from edgin_around_api import geometry, spatial
+
+
+def _random_point(rng: random.Random) -> geometry.Point:
+    return geometry.Point(acos(rng.uniform(-1.0, 1.0)), rng.uniform(0.0, 2.0 * pi))
+
+
+def _brute_force_pairs(
+    points: List[geometry.Point], distance: float, radius: float
+) -> Set[Tuple[int, int]]:
+    return {
+        (i, j)
+        for i in range(len(points))
+        for j in range(i + 1, len(points))
+        if points[i].great_circle_distance_to(points[j], radius) <= distance
+    }
+
+
+class ActorIndexTest(unittest.TestCase):
+    RADIUS = 100.0
+    DISTANCE = 10.0
+
+    def test_pairs(self) -> None:
+        """Detected pairs should be the same as found by comparing all actors with each other."""
+
+        rng = random.Random(7)
+        points = [_random_point(rng) for _ in range(300)]
+
+        index = spatial.ActorIndex(self.RADIUS, self.DISTANCE)
+        index.insert_many(enumerate(points))
+
+        expected = _brute_force_pairs(points, self.DISTANCE, self.RADIUS)
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(set(index.pairs()), expected)
+
+    def test_incremental_updates(self) -> None:
+        """Pairs should stay correct when actors move or get removed."""
+
+        rng = random.Random(11)
+        points = [_random_point(rng) for _ in range(200)]
+
+        index = spatial.ActorIndex(self.RADIUS, self.DISTANCE)
+        index.insert_many(enumerate(points))
+
+        for actor_id in range(0, 200, 3):
+            points[actor_id] = points[actor_id].moved_by(
+                rng.uniform(0.0, 20.0), rng.uniform(-pi, pi), self.RADIUS
+            )
+            index.move(actor_id, points[actor_id])
+
+        self.assertEqual(set(index.pairs()), _brute_force_pairs(points, self.DISTANCE, self.RADIUS))
+
+        index.remove(0)
+        self.assertFalse(0 in index)
+        self.assertEqual(len(index), 199)
+        self.assertTrue(all(0 not in pair for pair in index.pairs()))
+
+    def test_neighbours(self) -> None:
+        origin = geometry.Point(0.5 * pi, 0.0)
+        index = spatial.ActorIndex(self.RADIUS, self.DISTANCE)
+        index.insert(1, origin)
+        index.insert(2, origin.moved_by(5.0, 0.0, self.RADIUS))
+        index.insert(3, origin.moved_by(15.0, 0.0, self.RADIUS))
+
+        self.assertEqual(index.neighbours(1), {2})
+        self.assertEqual(index.neighbours(2), {1, 3})
+        self.assertEqual(index.pairs(), [(1, 2), (2, 3)])
+
+    def test_cone_queries(self) -> None:
+        """Sector, annulus and cone queries should return the same actors as checking distances
+        and bearings of all actors."""
+
+        rng = random.Random(5)
+        center = geometry.Point(1.2, 2.5)
+        points = [
+            center.moved_by(rng.uniform(0.0, 30.0), rng.uniform(-pi, pi), self.RADIUS)
+            for _ in range(400)
+        ]
+        index = spatial.ActorIndex(self.RADIUS, self.DISTANCE)
+        index.insert_many(enumerate(points))
+
+        def expected(bearing: float, half_angle: float, inner: float, outer: float) -> Set[int]:
+            result = set()
+            for i, point in enumerate(points):
+                distance = center.great_circle_distance_to(point, self.RADIUS)
+                delta = center.bearing_to(point) - bearing
+                delta = abs(atan2(sin(delta), cos(delta)))
+                if inner <= distance <= outer and (half_angle >= pi or delta <= half_angle):
+                    result.add(i)
+            return result
+
+        self.assertEqual(set(index.within(center, 12.0)), expected(0.0, pi, 0.0, 12.0))
+        self.assertEqual(set(index.annulus(center, 5.0, 20.0)), expected(0.0, pi, 5.0, 20.0))
+        self.assertEqual(set(index.sector(center, 1.0, 0.4, 15.0)), expected(1.0, 0.4, 0.0, 15.0))
+        self.assertEqual(
+            set(index.cone(center, -2.5, 0.8, 4.0, 25.0)), expected(-2.5, 0.8, 4.0, 25.0)
+        )
+        self.assertTrue(len(index.sector(center, 1.0, 0.4, 15.0)) > 0)
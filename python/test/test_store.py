@@ -0,0 +1,100 @@
+import unittest
+
+from edgin_around_api import craft, crafting, defs, inventory, store
+
+
+class StoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.inventory = inventory.Inventory()
+        self.inventory.store(defs.Hand.RIGHT, 1, craft.Essence.ROCKS, 3, 2, 100, "rocks")
+        self.inventory.insert(4, 2, craft.Essence.LOGS, 1, 5, 100, "log")
+        self.inventory.insert(19, 3, craft.Essence.GOLD, 2, 1, 50, "gold")
+
+    def test_load_and_serialise(self) -> None:
+        """Views should serialise exactly like the inventories they were loaded from."""
+
+        inventories = store.InventoryStore()
+        inventories.add_owner(10)
+        view = inventories.load(20, self.inventory)
+
+        schema = inventory.Inventory.Schema()
+        self.assertEqual(schema.dump(view), schema.dump(self.inventory))
+        self.assertEqual(view.to_items(), self.inventory.to_items())
+        self.assertEqual(view.get_all_ids(), [1, 2, 3])
+        self.assertEqual(view.get_hand(defs.Hand.RIGHT), 1)
+        self.assertEqual(view.get_pocket(19), 3)
+        self.assertEqual(inventories.get(10).get_all_ids(), [])  # type: ignore
+
+    def test_modify(self) -> None:
+        """Modifications through views should behave like the ones of `Inventory`."""
+
+        inventories = store.InventoryStore()
+        view = inventories.load(20, self.inventory)
+        for inv in (view, self.inventory):
+            inv.swap(defs.Hand.RIGHT, 4)
+            inv.swap(defs.Hand.LEFT, 19)
+            inv.remove_with_entity_id(1)
+            inv.insert_entry(0, inventory.EntityInfo(5, craft.Essence.STICKS, 7, 1, 10, "sticks"))
+
+        schema = inventory.Inventory.Schema()
+        self.assertEqual(schema.dump(view), schema.dump(self.inventory))
+        self.assertEqual(view.find_entity_with_entity_id(3), self.inventory.left_hand)
+        self.assertEqual(schema.dump(view.to_inventory()), schema.dump(self.inventory))
+
+    def test_owner_rows(self) -> None:
+        """Rows of removed owners should be reused empty."""
+
+        inventories = store.InventoryStore()
+        inventories.load(20, self.inventory)
+        inventories.remove_owner(20)
+        self.assertIsNone(inventories.get(20))
+
+        view = inventories.add_owner(30)
+        self.assertEqual(view.row, 0)
+        self.assertEqual(view.get_all_ids(), [])
+        self.assertEqual(inventories.get_owner_count(), 1)
+
+    def test_stale_view(self) -> None:
+        """Views of removed owners should raise instead of accessing the reused row."""
+
+        inventories = store.InventoryStore()
+        stale = inventories.load(1, self.inventory)
+        inventories.remove_owner(1)
+        view = inventories.add_owner(2)
+        view.store_entry(defs.Hand.LEFT, self.inventory.left_hand)
+        self.assertEqual(stale.row, view.row)
+
+        with self.assertRaises(store.StaleViewError):
+            stale.get_all_ids()
+        with self.assertRaises(store.StaleViewError):
+            stale.get_essence_histogram()
+        with self.assertRaises(store.StaleViewError):
+            stale.insert_entry(0, self.inventory.left_hand)
+
+        inventories.remove_owner(2)
+        inventories.add_owner(1)
+        with self.assertRaises(store.StaleViewError):
+            stale.to_items()
+
+    def test_aggregate_essences(self) -> None:
+        """Aggregation over the columns should match the one over inventories."""
+
+        inventories = store.InventoryStore()
+        view = inventories.load(20, self.inventory)
+        inventories.load(30, self.inventory)
+        inventories.add_owner(40)
+
+        expected = inventory.aggregate_essences([self.inventory, self.inventory])
+        self.assertEqual(inventories.aggregate_essences([20, 30, 40, 50]), expected)
+        self.assertEqual(view.get_essence_histogram(), self.inventory.get_essence_histogram())
+
+    def test_craft_queries(self) -> None:
+        """Views should be accepted as item sources, other crafting code needs an `Inventory`."""
+
+        view = store.InventoryStore().load(20, self.inventory)
+        recipe = craft.Recipe("hammer", "Hammer", [craft.Ingredient(craft.Material.MINERAL, 5)])
+        book = craft.RecipeBook([recipe])
+        self.assertEqual(book.find_craftable(view), [recipe])
+
+        cache = crafting.CraftableCache(book)
+        self.assertEqual(cache.find_craftable(view.to_inventory()), [recipe])
@@ -0,0 +1,76 @@
+import unittest
+
+from math import pi
+
+from edgin_around_api import geometry, tiles
+
+
+def _make_elevation() -> geometry.Elevation:
+    elevation = geometry.Elevation(1000.0)
+    elevation.add(geometry.Hills(geometry.Point(0.0, 0.0)))
+    elevation.add(geometry.Ranges(geometry.Point(1.0, 1.0)))
+    elevation.add(geometry.Continents(geometry.Point(2.0, 2.0)))
+    return elevation
+
+
+class TilesTest(unittest.TestCase):
+    def test_cube_coordinates(self) -> None:
+        """Conversion to the cube-sphere and back should give the original vector."""
+
+        for face in range(geometry.CUBE_FACE_COUNT):
+            vector = geometry.Coordinates.cube_to_cartesian(face, 0.3, -0.7)
+            self.assertEqual(geometry.Coordinates.cartesian_to_cube(*vector)[0], face)
+            self.assertAlmostEqual(geometry.Coordinates.cartesian_to_cube(*vector)[1], 0.3)
+            self.assertAlmostEqual(geometry.Coordinates.cartesian_to_cube(*vector)[2], -0.7)
+
+    def test_tile_heights(self) -> None:
+        """Tile samples should be equal to the elevation at the sampled points and neighbouring
+        tiles should share their edges."""
+
+        elevation = _make_elevation()
+        generator = tiles.TileGenerator(elevation, size=4, workers=0)
+        left = generator.get_tile((4, 1, 0, 0))
+        right = generator.get_tile((4, 1, 1, 0))
+
+        vector = geometry.Coordinates.cube_to_cartesian(4, -1.0, -1.0)
+        r, theta, phi = geometry.Coordinates.cartesian_to_spherical(*vector)
+        expected = elevation.evaluate_without_radius(geometry.Point(theta, phi))
+        self.assertAlmostEqual(left.get_height(0, 0), expected)
+
+        for row in range(5):
+            self.assertAlmostEqual(left.get_height(4, row), right.get_height(0, row))
+
+    def test_cache_by_fingerprint(self) -> None:
+        """Generators of equal terrains should share tiles through a common cache."""
+
+        cache = tiles.TileCache()
+        first = tiles.TileGenerator(_make_elevation(), size=2, workers=0, cache=cache)
+        second = tiles.TileGenerator(_make_elevation(), size=2, workers=0, cache=cache)
+        self.assertEqual(first.fingerprint, second.fingerprint)
+        self.assertIs(first.get_tile((0, 0, 0, 0)), second.get_tile((0, 0, 0, 0)))
+
+        other = geometry.Elevation(1000.0)
+        self.assertNotEqual(tiles.terrain_fingerprint(other), first.fingerprint)
+
+    def test_stream_order(self) -> None:
+        """Tiles should be streamed starting from the closest one and generated in a pool."""
+
+        viewpoint = geometry.Point(0.5 * pi, 0.1)
+        with tiles.TileGenerator(_make_elevation(), size=2, workers=2) as generator:
+            streamed = list(generator.stream(viewpoint, level=1))
+
+        self.assertEqual(len(streamed), 24)
+        distances = [
+            viewpoint.great_circle_distance_to(tiles.tile_center(tile.get_key()), 1.0)
+            for tile in streamed
+        ]
+        self.assertEqual(distances, sorted(distances))
+
+        reference = tiles.TileGenerator(_make_elevation(), size=2, workers=0)
+        self.assertEqual(streamed[0], reference.get_tile(streamed[0].get_key()))
+
+    def test_serde_tile(self) -> None:
+        generator = tiles.TileGenerator(_make_elevation(), size=1, workers=0)
+        tile = generator.get_tile((2, 0, 0, 0))
+        schema = tiles.Tile.Schema()
+        self.assertEqual(schema.load(schema.dump(tile)), tile)
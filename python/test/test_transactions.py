@@ -0,0 +1,103 @@
+import unittest
+
+from typing import List
+
+from edgin_around_api import actions, craft, defs, inventory, transactions
+
+
+def _entry(id: int, quantity: int, codename: str = "rocks") -> inventory.EntityInfo:
+    return inventory.EntityInfo(id, craft.Essence.ROCKS, quantity, 1, 10, codename)
+
+
+class TransactionsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.inventory = inventory.Inventory()
+        self.inventory.store_entry(defs.Hand.LEFT, _entry(1, 4))
+        self.inventory.insert_entry(0, _entry(2, 8))
+        self.inventory.insert_entry(1, _entry(3, 1, "logs"))
+
+    def test_apply(self) -> None:
+        """Successful transactions should apply all the operations and report changed slots."""
+
+        transaction = transactions.Transaction(
+            self.inventory,
+            [
+                transactions.Merge(defs.Hand.LEFT, 0),
+                transactions.Swap(defs.Hand.RIGHT, 1),
+                transactions.Insert(5, _entry(4, 3)),
+                transactions.Remove(2, 3),
+            ],
+        )
+
+        self.assertTrue(transaction.apply())
+        self.assertEqual(transaction.changed_slots, {defs.Hand.LEFT, defs.Hand.RIGHT, 0, 1, 5})
+        self.assertEqual(self.inventory.get_hand_entry(defs.Hand.LEFT), _entry(1, 2))
+        self.assertEqual(self.inventory.get_hand_entry(defs.Hand.RIGHT), _entry(3, 1, "logs"))
+        self.assertEqual(self.inventory.get_pocket_entry(0), _entry(2, 7))
+        self.assertEqual(self.inventory.get_pocket_entry(5), _entry(4, 3))
+
+    def test_rollback(self) -> None:
+        """Failing transactions should leave the inventory intact."""
+
+        schema = inventory.Inventory.Schema()
+        original = schema.dump(self.inventory)
+        fingerprint = self.inventory.get_fingerprint()
+
+        operations: List[transactions.Operation] = [
+            transactions.Swap(defs.Hand.LEFT, 3),
+            transactions.Remove(3),
+            transactions.Insert(6, _entry(5, 1)),
+            transactions.Remove(2, 9),
+        ]
+        transaction = transactions.Transaction(self.inventory, operations)
+
+        self.assertFalse(transaction.apply())
+        self.assertEqual(transaction.failed, operations[-1])
+        self.assertEqual(transaction.changed_slots, set())
+        self.assertEqual(schema.dump(self.inventory), original)
+        self.assertEqual(self.inventory.get_fingerprint(), fingerprint)
+        self.assertEqual(self.inventory.get_slot(3), 1)
+        self.assertIsNone(self.inventory.get_slot(5))
+
+        self.assertFalse(
+            transactions.Transaction(self.inventory, [transactions.Insert(0, _entry(6, 1))]).apply()
+        )
+        self.assertFalse(
+            transactions.Transaction(self.inventory, [transactions.Insert(7, _entry(1, 1))]).apply()
+        )
+
+        # Reused transactions should report the result of the last application.
+        transaction.operations.pop()
+        self.assertTrue(transaction.apply())
+        self.assertIsNone(transaction.failed)
+        self.assertEqual(transaction.changed_slots, {defs.Hand.LEFT, 1, 3, 6})
+
+    def test_rollback_on_exception(self) -> None:
+        """Exceptions raised by an operation should leave the inventory intact."""
+
+        schema = inventory.Inventory.Schema()
+        original = schema.dump(self.inventory)
+        broken = transactions.Insert(6, None)  # type: ignore
+        transaction = transactions.Transaction(
+            self.inventory, [transactions.Swap(defs.Hand.LEFT, 3), transactions.Remove(3), broken]
+        )
+
+        with self.assertRaises(AttributeError):
+            transaction.apply()
+        self.assertEqual(transaction.failed, broken)
+        self.assertEqual(schema.dump(self.inventory), original)
+        self.assertEqual(self.inventory.get_slot(3), 1)
+
+    def test_batcher(self) -> None:
+        """Only one update should be produced per inventory in a tick."""
+
+        other = inventory.Inventory()
+        batcher = transactions.UpdateBatcher()
+        self.assertTrue(batcher.apply(10, self.inventory, [transactions.Swap(defs.Hand.LEFT, 2)]))
+        self.assertTrue(batcher.apply(10, self.inventory, [transactions.Remove(2)]))
+        self.assertFalse(batcher.apply(20, other, [transactions.Remove(2)]))
+        self.assertEqual(batcher.get_changed_slots(10), {defs.Hand.LEFT, 0, 2})
+
+        updates = batcher.flush()
+        self.assertEqual(updates, [actions.InventoryUpdateAction(10, self.inventory)])
+        self.assertEqual(batcher.flush(), [])